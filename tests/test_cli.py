@@ -0,0 +1,257 @@
+# coding=utf-8
+"""Tests of the headless command line interface.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'benjamin.jakimow@geo.hu-berlin.de'
+
+import json
+import os
+import pathlib
+import site
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import xmlrunner
+
+DIR_REPO = pathlib.Path(__file__).parents[1].resolve()
+site.addsitedir(DIR_REPO)
+
+from osgeo import gdal
+from exampledata import Landsat8_West_tif, Landsat8_East_tif
+from vrtbuilder.cli import main
+
+
+class CLITests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # do not read from or write to the persistent source info cache in the user's home directory.
+        # Batch worker processes do not use a cache if the calling process uses an in-memory cache.
+        from unittest import mock
+        from vrtbuilder import core
+        cls.mSourceInfoCachePatch = mock.patch.object(core, '_SOURCE_INFO_CACHE', core.SourceInfoCache(':memory:'))
+        cls.mSourceInfoCachePatch.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.mSourceInfoCachePatch.stop()
+
+    def test_build(self):
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        nb = gdal.Open(files[0]).RasterCount
+        tmpDir = tempfile.mkdtemp()
+
+        pathMosaic = os.path.join(tmpDir, 'mosaic.vrt')
+        self.assertEqual(main(['build', '-q', pathMosaic] + files), 0)
+        ds = gdal.Open(pathMosaic)
+        self.assertIsInstance(ds, gdal.Dataset)
+        self.assertEqual(ds.RasterCount, nb)
+
+        pathStack = os.path.join(tmpDir, 'stack.vrt')
+        self.assertEqual(main(['build', '-q', '--stack', '--resolution', '60', '--nodata', '-9999',
+                               pathStack] + files), 0)
+        ds = gdal.Open(pathStack)
+        self.assertEqual(ds.RasterCount, 2 * nb)
+        self.assertEqual(ds.GetGeoTransform()[1], 60)
+        self.assertEqual(ds.GetRasterBand(1).GetNoDataValue(), -9999)
+
+        pathWarped = os.path.join(tmpDir, 'warped.vrt')
+        self.assertEqual(main(['build', '-q', '--crs', 'EPSG:4326', '--resampling', 'bilinear',
+                               pathWarped] + files), 0)
+        self.assertTrue(gdal.Open(pathWarped).ReadAsArray().max() > 0)
+
+        self.assertEqual(main(['build', '-q', pathMosaic, 'does_not_exist.tif']), 1)
+
+    def test_batch(self):
+        from vrtbuilder.batch import BatchJob, buildVRTs, readManifest
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        tmpDir = tempfile.mkdtemp()
+
+        jobs = [{'output': 'mosaic.vrt', 'sources': files},
+                {'output': 'stack.vrt', 'sources': files, 'stack': True, 'resolution': [60]},
+                {'output': 'failed.vrt', 'sources': ['does_not_exist.tif']}]
+        pathJson = os.path.join(tmpDir, 'manifest.json')
+        with open(pathJson, 'w') as f:
+            json.dump(jobs, f)
+
+        pathCsv = os.path.join(tmpDir, 'manifest.csv')
+        with open(pathCsv, 'w') as f:
+            f.write('output;sources;stack;resolution\n')
+            f.write('csv/mosaic.vrt;{};false;\n'.format('|'.join(files)))
+            f.write('csv/stack.vrt;{};true;60 60\n'.format('|'.join(files)))
+
+        jobsJson = readManifest(pathJson)
+        jobsCsv = readManifest(pathCsv)
+        self.assertEqual(len(jobsJson), 3)
+        self.assertEqual(len(jobsCsv), 2)
+        for job in jobsJson + jobsCsv:
+            self.assertIsInstance(job, BatchJob)
+            self.assertTrue(os.path.isabs(job.output))
+        self.assertEqual(jobsJson[1].resolution, jobsCsv[1].resolution)
+        self.assertEqual(jobsCsv[1].stack, True)
+
+        for processes in [1, 2]:
+            progress = []
+            report = buildVRTs(jobsJson, processes=processes, progress=lambda *args: progress.append(args))
+            self.assertEqual(len(progress), 3)
+            self.assertEqual([r.output for r in report.results], [j.output for j in jobsJson])
+            self.assertEqual(len(report.failed()), 1)
+            self.assertIsInstance(report.failed()[0].error, str)
+            self.assertEqual(gdal.Open(jobsJson[1].output).GetGeoTransform()[1], 60)
+
+        pathReport = os.path.join(tmpDir, 'report.json')
+        self.assertEqual(main(['batch', '-q', '--report', pathReport, pathCsv]), 0)
+        with open(pathReport) as f:
+            self.assertEqual(len(json.load(f)['results']), 2)
+        self.assertEqual(main(['batch', '-q', pathJson]), 1)
+
+    def test_scanFiles(self):
+        import re
+        import shutil
+        from vrtbuilder.scan import scanFiles, expandSources, listingCache, DirectoryListingCache
+
+        tmpDir = pathlib.Path(tempfile.mkdtemp()).as_posix()
+        for name in ['a/b/c/image1.tif', 'a/image2.TIF', 'a/b/image3.bsq', 'a/b/image3.hdr', 'notes.txt']:
+            os.makedirs(os.path.dirname(os.path.join(tmpDir, name)), exist_ok=True)
+            open(os.path.join(tmpDir, name), 'w').close()
+        # recently modified directories are not cached
+        t = time.time() - 60
+        for d in [tmpDir, tmpDir + '/a', tmpDir + '/a/b', tmpDir + '/a/b/c']:
+            os.utime(d, (t, t))
+
+        def names(files):
+            return [os.path.relpath(f, tmpDir).replace(os.sep, '/') for f in files]
+
+        self.assertEqual(names(scanFiles(tmpDir, '*.tif')), ['a/b/c/image1.tif'])
+        self.assertEqual(names(scanFiles(tmpDir, '*.tif', ignoreCase=True)), ['a/b/c/image1.tif', 'a/image2.TIF'])
+        self.assertEqual(names(scanFiles(tmpDir, re.compile(r'image[12]'), maxWorkers=1)),
+                         ['a/b/c/image1.tif', 'a/image2.TIF'])
+        self.assertEqual(names(scanFiles(tmpDir, recursive=False)), ['notes.txt'])
+        self.assertEqual(names(scanFiles(tmpDir, extensions=['.tif', '.bsq'])), ['a/b/c/image1.tif', 'a/b/image3.bsq'])
+
+        # changed directories are listed again
+        self.assertTrue(len(listingCache()) >= 4)
+        open(os.path.join(tmpDir, 'a', 'b', 'image4.tif'), 'w').close()
+        self.assertEqual(names(scanFiles(tmpDir, '*.tif')), ['a/b/c/image1.tif', 'a/b/image4.tif'])
+
+        pathCache = os.path.join(tmpDir, 'listings.json')
+        listingCache().save(pathCache)
+        self.assertEqual(len(DirectoryListingCache(pathCache)), len(listingCache()))
+
+        # directories are replaced by the raster files they contain
+        self.assertEqual(names(expandSources([os.path.join(tmpDir, 'a'), 'x.tif'])[:-1]),
+                         ['a/b/c/image1.tif', 'a/b/image3.bsq', 'a/b/image4.tif', 'a/image2.TIF'])
+
+        shutil.copy(Landsat8_West_tif, os.path.join(tmpDir, 'a'))
+        shutil.copy(Landsat8_East_tif, os.path.join(tmpDir, 'a', 'b'))
+        pathVRT = os.path.join(tmpDir, 'mosaic.vrt')
+        self.assertEqual(main(['build', '-q', '--pattern', 'Landsat*', pathVRT, tmpDir]), 0)
+        self.assertEqual(len(gdal.Open(pathVRT).GetFileList()), 3)
+
+    def test_materialize(self):
+        from vrtbuilder.core import buildVRT
+        from vrtbuilder.materialize import materialize, blockWindows, MaterializeProgress
+
+        windows = blockWindows(100, 50, 100, 1, 4, windowBytes=4000)
+        self.assertEqual(windows[0], (0, 0, 100, 10))
+        self.assertEqual(len(windows), 5)
+        windows = blockWindows(100, 50, 16, 16, 1, windowBytes=512)
+        self.assertEqual(sum(w[2] * w[3] for w in windows), 100 * 50)
+        self.assertTrue(all(w[0] % 16 == 0 and w[1] % 16 == 0 for w in windows))
+
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        tmpDir = tempfile.mkdtemp()
+        pathVRT = os.path.join(tmpDir, 'mosaic.vrt')
+        buildVRT(pathVRT, files, noData=0)
+        expected = gdal.Open(pathVRT).ReadAsArray()
+
+        for name, processes, co in [('threads.tif', False, None),
+                                    ('processes.tif', True, None),
+                                    ('deflate.tif', False, ['COMPRESS=DEFLATE', 'TILED=YES']),
+                                    ('envi.bsq', False, None)]:
+            path = os.path.join(tmpDir, name)
+            progress = []
+            state = materialize(pathVRT, path, creationOptions=co, maxWorkers=2, processes=processes,
+                                windowBytes=2 ** 16, progress=lambda p: progress.append(p.fraction()))
+            self.assertIsInstance(state, MaterializeProgress)
+            self.assertFalse(state.canceled)
+            self.assertTrue(state.windowsTotal > 1)
+            self.assertEqual(progress, sorted(progress))
+            self.assertEqual(progress[-1], 1.0)
+            ds = gdal.Open(path)
+            self.assertEqual(ds.GetGeoTransform(), gdal.Open(pathVRT).GetGeoTransform())
+            self.assertEqual(ds.GetRasterBand(1).GetNoDataValue(), 0)
+            self.assertTrue((ds.ReadAsArray() == expected).all(), msg=name)
+        self.assertEqual(gdal.Open(os.path.join(tmpDir, 'envi.bsq')).GetDriver().ShortName, 'ENVI')
+
+        path = os.path.join(tmpDir, 'canceled.tif')
+        state = materialize(pathVRT, path, windowBytes=2 ** 16, isCanceled=lambda: True)
+        self.assertTrue(state.canceled)
+        self.assertFalse(os.path.exists(path))
+
+        self.assertEqual(main(['materialize', '-q', pathVRT, os.path.join(tmpDir, 'cli.tif')]), 0)
+
+    def test_materializeCOG(self):
+        from vrtbuilder.core import buildVRT
+        from vrtbuilder.materialize import materialize, materializeCOG, overviewFactors
+
+        self.assertEqual(overviewFactors(1000, 300, 512), [2])
+        self.assertEqual(overviewFactors(512, 512, 512), [])
+        self.assertEqual(overviewFactors(2049, 100, 256), [2, 4, 8, 16])
+
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        tmpDir = tempfile.mkdtemp()
+        pathVRT = os.path.join(tmpDir, 'mosaic.vrt')
+        buildVRT(pathVRT, files, noData=0)
+        expected = gdal.Open(pathVRT).ReadAsArray()
+
+        for name, kwds in [('output.tif', dict()),
+                           ('source.tif', dict(overviewsFromSource=True, compress='ZSTD')),
+                           ('nearest.tif', dict(overviewResampling='NEAREST', creationOptions=['PREDICTOR=NO']))]:
+            path = os.path.join(tmpDir, name)
+            progress = []
+            state = materializeCOG(pathVRT, path, blockSize=64, maxWorkers=2, windowBytes=2 ** 16,
+                                   progress=lambda p: progress.append(p.fraction()), **kwds)
+            self.assertFalse(state.canceled)
+            self.assertEqual(progress, sorted(progress))
+            self.assertEqual(progress[-1], 1.0)
+            # temporary full resolution and overview files are removed
+            self.assertEqual([f for f in os.listdir(tmpDir) if '.tmp' in f], [])
+            ds = gdal.Open(path)
+            self.assertEqual(ds.GetMetadataItem('LAYOUT', 'IMAGE_STRUCTURE'), 'COG')
+            band = ds.GetRasterBand(1)
+            self.assertEqual(band.GetBlockSize(), [64, 64])
+            self.assertEqual(band.GetNoDataValue(), 0)
+            self.assertEqual(band.GetOverviewCount(), len(overviewFactors(ds.RasterXSize, ds.RasterYSize, 64)))
+            self.assertTrue(band.GetOverview(0).ReadAsArray().max() > 0)
+            self.assertTrue((ds.ReadAsArray() == expected).all(), msg=name)
+        self.assertEqual(gdal.Open(os.path.join(tmpDir, 'source.tif')).GetMetadataItem(
+            'COMPRESSION', 'IMAGE_STRUCTURE'), 'ZSTD')
+
+        path = os.path.join(tmpDir, 'canceled.tif')
+        state = materialize(pathVRT, path, format='COG', windowBytes=2 ** 16, isCanceled=lambda: True)
+        self.assertTrue(state.canceled)
+        self.assertFalse(os.path.exists(path))
+
+        self.assertEqual(main(['materialize', '-q', '--cog', '--co', 'BLOCKSIZE=128', '--overviews-from-source',
+                               pathVRT, os.path.join(tmpDir, 'cli.tif')]), 0)
+        self.assertEqual(gdal.Open(os.path.join(tmpDir, 'cli.tif')).GetRasterBand(1).GetBlockSize(), [128, 128])
+
+    def test_no_qgis_imports(self):
+        code = 'import sys; import vrtbuilder.cli, vrtbuilder.core, vrtbuilder.batch, vrtbuilder.scan, ' \
+               'vrtbuilder.materialize; ' \
+               'assert "qgis" not in sys.modules and "PyQt5" not in sys.modules'
+        subprocess.run([sys.executable, '-c', code], cwd=DIR_REPO, check=True)
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=xmlrunner.XMLTestRunner(output='test-reports'), buffer=False)
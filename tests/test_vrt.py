@@ -41,6 +41,16 @@ class VRTBuilderTests(TestCase):
 
         resources.append(DIR_UI / 'vrtbuilderresources_rc.py')
         super().setUpClass(resources=resources)
+        # do not read from or write to the persistent source info cache in the user's home directory
+        from unittest import mock
+        from vrtbuilder import core
+        cls.mSourceInfoCachePatch = mock.patch.object(core, '_SOURCE_INFO_CACHE', core.SourceInfoCache(':memory:'))
+        cls.mSourceInfoCachePatch.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.mSourceInfoCachePatch.stop()
+        super().tearDownClass()
 
     def test_subdataset(self):
 
@@ -162,6 +172,696 @@ class VRTBuilderTests(TestCase):
         self.assertEqual(VRT, VRT2)
         s = ""
 
+    def test_writeVRT(self):
+        from vrtbuilder.core import sourceWindow
+
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        VRT = VRTRaster()
+        VRT.addFilesAsMosaic(files)
+        dsVRT = VRT.saveVRT('/vsimem/mosaic.vrt')
+        self.assertIsInstance(dsVRT, gdal.Dataset)
+
+        res = VRT.resolution()
+        options = gdal.BuildVRTOptions(outputBounds=VRT.outputBounds(), xRes=res.width(), yRes=res.height())
+        dsRef = gdal.BuildVRT('/vsimem/reference.vrt', files, options=options)
+        self.assertEqual(dsRef.RasterXSize, dsVRT.RasterXSize)
+        self.assertEqual(dsRef.RasterYSize, dsVRT.RasterYSize)
+        self.assertEqual(dsRef.RasterCount, dsVRT.RasterCount)
+        self.assertEqual(dsRef.GetGeoTransform(), dsVRT.GetGeoTransform())
+        self.assertTrue(np.array_equal(dsRef.ReadAsArray(), dsVRT.ReadAsArray()))
+
+        # sources outside the destination grid are skipped
+        gt = (0, 1, 0, 10, 0, -1)
+        self.assertIsNone(sourceWindow((20, 1, 0, 10, 0, -1), 5, 5, gt, 10, 10))
+        srcWin, dstWin = sourceWindow((5, 1, 0, 12, 0, -1), 10, 10, gt, 10, 10)
+        self.assertEqual(srcWin, (0, 2, 5, 8))
+        self.assertEqual(dstWin, (5, 0, 5, 8))
+
+        gdal.Unlink('/vsimem/mosaic.vrt')
+        gdal.Unlink('/vsimem/reference.vrt')
+
+    def test_readSourceInfos(self):
+        from vrtbuilder.core import readSourceInfos, RasterSourceInfo
+
+        files = [Landsat8_West_tif, Landsat8_East_tif, Sentinel2_West_tif, Sentinel2_East_tif]
+        for maxWorkers in [1, 4]:
+            infos = readSourceInfos(files, maxWorkers=maxWorkers)
+            self.assertEqual(len(infos), len(files))
+            for file, info in zip(files, infos):
+                self.assertIsInstance(info, RasterSourceInfo)
+                self.assertEqual(info.path, file.as_posix())
+                ds = gdal.Open(file.as_posix())
+                self.assertEqual(info.bandCount(), ds.RasterCount)
+                self.assertEqual(info.geoTransform, ds.GetGeoTransform())
+
+        infos = readSourceInfos(['not_existing.tif'], raiseErrors=False)
+        self.assertEqual(infos, [None])
+        self.assertRaises(Exception, readSourceInfos, ['not_existing.tif'])
+
+    def test_sourceInfoCache(self):
+        from vrtbuilder.core import SourceInfoCache, RasterSourceInfo, fileSignature, readSourceInfos, \
+            sourceInfoCache, setSourceInfoCache
+
+        TMP_DIR = self.createTestOutputDirectory()
+        os.makedirs(TMP_DIR, exist_ok=True)
+        pathCache = TMP_DIR / 'sourceinfo.sqlite'
+        if pathCache.is_file():
+            os.remove(pathCache)
+
+        cache = SourceInfoCache(pathCache, maxEntries=2)
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix(), Sentinel2_West_tif.as_posix()]
+        for file in files:
+            info = RasterSourceInfo.fromPath(file)
+            cache.put(info)
+            self.assertEqual(cache.get(file), info)
+
+        # least recently used entries are removed
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(files[0]))
+
+        # changed files are not returned
+        size, mtime = fileSignature(files[2])
+        self.assertIsNone(cache.get(files[2], signature=(size, mtime + 1)))
+        self.assertIsInstance(cache.get(files[2], signature=(size, mtime)), RasterSourceInfo)
+
+        # cache is persistent
+        cache2 = SourceInfoCache(pathCache)
+        self.assertEqual(len(cache2), 2)
+
+        oldCache = sourceInfoCache()
+        setSourceInfoCache(cache2)
+        infos1 = readSourceInfos(files)
+        infos2 = readSourceInfos(files, useCache=False)
+        self.assertEqual(infos1, infos2)
+        self.assertEqual(len(cache2), 3)
+        setSourceInfoCache(oldCache)
+
+    def test_virtualRaster(self):
+        import pickle
+        from vrtbuilder.core import VirtualRaster, VirtualBand, geo2px, px2geo, alignRectangleToGrid
+
+        gt = (100, 30, 0, 500, 0, -30)
+        self.assertEqual(px2geo((2, 3), gt), (160, 410))
+        self.assertEqual(geo2px((160, 410), gt), (2, 3))
+        self.assertEqual(alignRectangleToGrid((30, 30), (10, 10), (30, 210, 300, 600)),
+                         ((40, 220, 310, 610), (9, 13)))
+
+        TMP_DIR = self.createTestOutputDirectory()
+        os.makedirs(TMP_DIR, exist_ok=True)
+
+        vrt = VirtualRaster()
+        vrt.addFilesAsMosaic([Landsat8_West_tif, Landsat8_East_tif])
+        self.assertTrue(vrt.isGridDefined())
+        self.assertTrue(vrt.setExtent(vrt.fullSourceRasterExtent()))
+        self.assertIsInstance(vrt[0], VirtualBand)
+
+        vrt2 = pickle.loads(pickle.dumps(vrt))
+        self.assertEqual(vrt, vrt2)
+        self.assertIs(vrt2[0][0].virtualBand(), vrt2[0])
+
+        pathVRT = (TMP_DIR / 'virtualRaster.vrt').as_posix()
+        vrt2.saveVRT(pathVRT)
+        ds = gdal.Open(pathVRT)
+        self.assertEqual(ds.RasterCount, len(vrt))
+        self.assertEqual(ds.GetGeoTransform(), vrt.geoTransform())
+        self.assertEqual((ds.RasterXSize, ds.RasterYSize), vrt.size())
+
+        # the Qt adapter uses the same definition
+        VRT = VRTRaster()
+        VRT.addFilesAsMosaic([Landsat8_West_tif, Landsat8_East_tif])
+        VRT.setExtent(VRT.fullSourceRasterExtent())
+        self.assertEqual(VRT.virtualRaster(), vrt)
+
+    def test_gridArrays(self):
+        from vrtbuilder.core import px2geo, geo2px, geo2pxF, alignPointToGrid, alignRectangleToGrid, sourceWindow, \
+            transformBounds, px2geoArray, geo2pxArray, geo2pxFArray, alignPointsToGrid, alignRectanglesToGrid, \
+            sourceWindows, transformBoundsArray
+
+        gt = (100, 30, 0, 500, 0, -30)
+        points = np.random.uniform(-1000, 1000, (100, 2))
+        bounds = np.column_stack((points, points + np.random.uniform(0, 500, (100, 2))))
+
+        self.assertEqual(px2geoArray(points, gt).tolist(), [px2geo(p, gt) for p in points.tolist()])
+        self.assertEqual(geo2pxFArray(points, gt).tolist(), [geo2pxF(p, gt) for p in points.tolist()])
+        self.assertEqual(geo2pxArray(points, gt).tolist(), [geo2px(p, gt) for p in points.tolist()])
+        self.assertEqual(alignPointsToGrid((30, 30), (10, 10), points).tolist(),
+                         [alignPointToGrid((30, 30), (10, 10), p) for p in points.tolist()])
+        aligned, sizes = alignRectanglesToGrid((30, 30), (10, 10), bounds)
+        self.assertEqual(list(zip(aligned.tolist(), sizes.tolist())),
+                         [alignRectangleToGrid((30, 30), (10, 10), b) for b in bounds.tolist()])
+
+        # one geo-transformation per point
+        gts = [(0, 1, 0, 10, 0, -1), gt]
+        self.assertEqual(px2geoArray([(2, 3), (2, 3)], gts).tolist(), [[2, 7], [160, 410]])
+
+        dstGT = (0, 1, 0, 10, 0, -1)
+        srcGTs = [(20, 1, 0, 10, 0, -1), (5, 1, 0, 12, 0, -1), (-2.5, 0.5, 0, 11, 0, -0.5)]
+        srcSizes = [(5, 5), (10, 10), (12, 30)]
+        srcWindows, dstWindows, valid = sourceWindows(srcGTs, srcSizes, dstGT, 10, 10)
+        self.assertEqual(valid.tolist(), [False, True, True])
+        for i, (srcGT, size) in enumerate(zip(srcGTs, srcSizes)):
+            windows = sourceWindow(srcGT, size[0], size[1], dstGT, 10, 10)
+            if valid[i]:
+                self.assertEqual(windows, (tuple(srcWindows[i].tolist()), tuple(dstWindows[i].tolist())))
+            else:
+                self.assertIsNone(windows)
+
+        ds = gdal.Open(Landsat8_West_tif.as_posix())
+        gt = ds.GetGeoTransform()
+        b = (gt[0], gt[3] + ds.RasterYSize * gt[5], gt[0] + ds.RasterXSize * gt[1], gt[3])
+        transformed = transformBoundsArray([b, b], ds.GetProjection(), 'EPSG:4326')
+        self.assertEqual(transformed.shape, (2, 4))
+        self.assertEqual(tuple(transformed[1].tolist()), transformBounds(b, ds.GetProjection(), 'EPSG:4326'))
+
+    def test_sourceFootprints(self):
+        from vrtbuilder.core import VirtualRaster, SourceFootprints, sourceInfo, transformFootprints, transformBounds
+
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        wkt = vrt.wkt()
+        footprints = vrt.sourceFootprints()
+        self.assertIsInstance(footprints, SourceFootprints)
+        self.assertEqual(footprints.paths(), files)
+        self.assertEqual(footprints.union(), vrt.fullSourceRasterExtent())
+        self.assertEqual(footprints.footprint(files[0]).shape, (4, 2))
+
+        # densified footprints contain the transformed corners
+        vrt.setWkt('EPSG:4326')
+        footprints = vrt.sourceFootprints()
+        self.assertEqual(footprints.footprint(files[0]).shape, (4 * 21, 2))
+        for path in files:
+            fp = footprints.bounds(path)
+            corners = transformBounds(sourceInfo(path).bounds(), wkt, 'EPSG:4326')
+            self.assertTrue(fp[0] <= corners[0] and fp[1] <= corners[1] and
+                            fp[2] >= corners[2] and fp[3] >= corners[3])
+        self.assertEqual(vrt.fullSourceRasterExtent(), footprints.union())
+
+        # a footprint around the south pole covers all longitudes
+        rings, bounds = transformFootprints([(-1e6, -1e6, 1e6, 1e6)], 'EPSG:3031', 'EPSG:4326', densify=5)
+        self.assertEqual(rings.shape, (1, 20, 2))
+        self.assertEqual(bounds[0, [0, 1, 2]].tolist(), [-180, -90, 180])
+
+    def test_crsCache(self):
+        from vrtbuilder.core import crsCache, isSameCrs, coordinateTransformation
+        from vrtbuilder.virtualrasters import qgsCrsCache
+
+        wkt = gdal.Open(Landsat8_West_tif.as_posix()).GetProjection()
+        cache = crsCache()
+        cache.clear()
+        for _ in range(3):
+            self.assertFalse(isSameCrs(wkt, 'EPSG:4326'))
+            self.assertTrue(isSameCrs('EPSG:4326', 'EPSG:4326'))
+            trans = coordinateTransformation(wkt, 'EPSG:4326')
+        self.assertIs(trans, coordinateTransformation(wkt, 'EPSG:4326'))
+        stats = cache.statistics()
+        self.assertEqual(stats['same'], (2, 1))
+        self.assertEqual(stats['transform'], (3, 1))
+
+        qgsCache = qgsCrsCache()
+        qgsCache.clear()
+        crs1 = qgsCache.crs(wkt)
+        crs2 = qgsCache.crs(wkt)
+        self.assertTrue(crs1.isValid())
+        self.assertEqual(crs1, crs2)
+        crsWGS84 = qgsCache.crs('EPSG:4326')
+        ext = QgsRectangle(*sourceInfo(Landsat8_West_tif).bounds())
+        ext1 = qgsCache.transformRectangle(ext, crs1, crsWGS84)
+        ext2 = qgsCache.transformRectangle(ext, crs1, crsWGS84)
+        self.assertEqual(ext1, ext2)
+        self.assertEqual(qgsCache.statistics(), {'crs': (1, 2), 'transform': (1, 1)})
+
+    def test_groupSourcesByCrs(self):
+        import dataclasses
+        from vrtbuilder.core import groupSourcesByCrs, sourceInfo, spatialReference, crsKey
+
+        info = sourceInfo(Landsat8_West_tif)
+        srs = spatialReference(info.wkt)
+        # different WKT strings of the same CRS
+        infoPretty = dataclasses.replace(info, path='/vsimem/pretty.tif', wkt=srs.ExportToPrettyWkt())
+        infoWKT2 = dataclasses.replace(info, path='/vsimem/wkt2.tif', wkt=srs.ExportToWkt(['FORMAT=WKT2']))
+        infoWGS84 = dataclasses.replace(info, path='/vsimem/wgs84.tif', wkt=spatialReference('EPSG:4326').ExportToWkt())
+        infoNoCrs = dataclasses.replace(info, path='/vsimem/nocrs.tif', wkt='')
+        self.assertEqual(crsKey(info.wkt), crsKey(infoWKT2.wkt))
+
+        infos = [info, infoWGS84, infoPretty, infoNoCrs, infoWKT2]
+        groups = groupSourcesByCrs(infos, info.wkt)
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(groups[0].paths(), [info.path, infoPretty.path, infoWKT2.path])
+        self.assertEqual(groups[1].paths(), [infoWGS84.path])
+        self.assertEqual([g.sameCrs for g in groups], [True, False, True])
+
+        groups = groupSourcesByCrs(infos, 'EPSG:4326')
+        self.assertEqual([g.sameCrs for g in groups], [False, True, True])
+
+    def test_spatialIndex(self):
+        from vrtbuilder.core import SpatialIndex, VirtualRaster
+
+        items = []
+        for i in range(1000):
+            x, y = random.uniform(0, 1000), random.uniform(0, 1000)
+            items.append((i, (x, y, x + random.uniform(0, 20), y + random.uniform(0, 20))))
+        index = SpatialIndex(items, nodeCapacity=8)
+        self.assertEqual(len(index), len(items))
+        for _ in range(100):
+            x, y = random.uniform(0, 1000), random.uniform(0, 1000)
+            q = (x, y, x + 50, y + 50)
+            expected = [i for i, b in items if b[0] <= q[2] and b[2] >= q[0] and b[1] <= q[3] and b[3] >= q[1]]
+            self.assertEqual(index.intersects(q), expected)
+        self.assertIsNone(SpatialIndex([]).bounds())
+
+        TMP_DIR = self.createTestOutputDirectory()
+        os.makedirs(TMP_DIR, exist_ok=True)
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        fullExtent = vrt.fullSourceRasterExtent()
+        self.assertEqual(vrt.sourceRaster(fullExtent), files)
+
+        # a small AOI within the western image
+        west = gdal.Open(files[0])
+        gt = west.GetGeoTransform()
+        aoi = (gt[0] + 10 * gt[1], gt[3] + 20 * gt[5], gt[0] + 20 * gt[1], gt[3] + 10 * gt[5])
+        self.assertTrue(vrt.setExtent(aoi))
+        self.assertEqual(vrt.sourceRaster(vrt.bounds()), files[0:1])
+
+        pathVRT = (TMP_DIR / 'aoi.vrt').as_posix()
+        vrt.saveVRT(pathVRT)
+        ds = gdal.Open(pathVRT)
+        self.assertEqual(len(ds.GetFileList()), 2)
+        self.assertEqual(ds.GetRasterBand(1).DataType, west.GetRasterBand(1).DataType)
+        self.assertTrue(np.array_equal(ds.ReadAsArray(), west.ReadAsArray(10, 10, 10, 10)))
+
+    def test_incrementalSave(self):
+        import pickle
+        from vrtbuilder.core import VirtualRaster, spatialReference
+
+        TMP_DIR = self.createTestOutputDirectory() / 'incremental'
+        os.makedirs(TMP_DIR, exist_ok=True)
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        vrt.setWkt(spatialReference('EPSG:4326').ExportToWkt())
+        vrt.setExtent(vrt.fullSourceRasterExtent())
+
+        pathVRT = (TMP_DIR / 'mosaic.vrt').as_posix()
+        dirWarped = TMP_DIR / 'mosaic.WarpedImages'
+
+        def warpedFiles():
+            return sorted(os.listdir(dirWarped))
+
+        self.assertTrue(vrt.isDirty())
+        vrt.saveVRT(pathVRT)
+        self.assertFalse(vrt.isDirty())
+        warped = warpedFiles()
+        self.assertEqual(len(warped), 2)
+
+        # nothing changed, nothing to warp
+        with open(pathVRT) as f:
+            xml1 = f.read()
+        vrt.saveVRT(pathVRT)
+        with open(pathVRT) as f:
+            self.assertEqual(xml1, f.read())
+        self.assertEqual(warpedFiles(), warped)
+
+        # change a single band
+        vrt[0].removeSource(files[1])
+        self.assertTrue(vrt[0].isDirty())
+        self.assertFalse(vrt[1].isDirty())
+        self.assertTrue(vrt.isDirty())
+        vrt.saveVRT(pathVRT)
+        self.assertEqual(warpedFiles(), warped)
+
+        pathFull = (TMP_DIR / 'full.vrt').as_posix()
+        vrt.saveVRT(pathFull, incremental=False)
+        dsA = gdal.Open(pathVRT)
+        dsB = gdal.Open(pathFull)
+        self.assertEqual(dsA.RasterCount, dsB.RasterCount)
+        for b in range(dsA.RasterCount):
+            self.assertTrue(np.array_equal(dsA.GetRasterBand(b + 1).ReadAsArray(),
+                                           dsB.GetRasterBand(b + 1).ReadAsArray()))
+
+        # warped sources are reused by other VirtualRasters with the same grid
+        mtimes = [os.path.getmtime(dirWarped / n) for n in warped]
+        vrt2 = pickle.loads(pickle.dumps(vrt))
+        vrt2.saveVRT(pathVRT, incremental=False)
+        self.assertEqual(warpedFiles(), warped)
+        self.assertEqual([os.path.getmtime(dirWarped / n) for n in warped], mtimes)
+
+        # a new grid requires new warped sources, the unused ones are removed
+        res = vrt.resolution()
+        vrt.setResolution((res[0] * 2, res[1] * 2))
+        self.assertTrue(vrt.isDirty())
+        vrt.saveVRT(pathVRT)
+        self.assertEqual(len(warpedFiles()), 2)
+        self.assertTrue(set(warpedFiles()).isdisjoint(warped))
+
+    def test_vrtOverviews(self):
+        from vrtbuilder.core import VirtualRaster, VRT_OVERVIEWS_SOURCES, VRT_OVERVIEWS_BUILD, VRT_OVERVIEW_MIN_SIZE
+        from vrtbuilder.materialize import overviewFactors
+
+        TMP_DIR = self.createTestOutputDirectory() / 'vrtOverviews'
+        os.makedirs(TMP_DIR, exist_ok=True)
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        vrt.initGrid()
+        res = vrt.resolution()
+        vrt.setResolution((res[0] / 4, res[1] / 4))
+        vrt.setExtent(vrt.fullSourceRasterExtent())
+        factors = overviewFactors(*vrt.size(), minSize=VRT_OVERVIEW_MIN_SIZE)
+        self.assertTrue(len(factors) > 0)
+
+        pathVRT = (TMP_DIR / 'mosaic.vrt').as_posix()
+        vrt.saveVRT(pathVRT, overviews=VRT_OVERVIEWS_SOURCES)
+        with open(pathVRT) as f:
+            self.assertTrue('<OverviewList resampling="average">{}</OverviewList>'.format(
+                ' '.join(str(f) for f in factors)) in f.read())
+
+        vrt.saveVRT(pathVRT, overviews=VRT_OVERVIEWS_BUILD, overviewResampling='NEAREST')
+        self.assertTrue(os.path.isfile(pathVRT + '.ovr'))
+        # temporary overview levels are removed
+        self.assertEqual(sorted(os.listdir(TMP_DIR)), ['mosaic.vrt', 'mosaic.vrt.ovr'])
+        ds = gdal.Open(pathVRT)
+        band = ds.GetRasterBand(1)
+        self.assertEqual(band.GetOverviewCount(), len(factors))
+        for i, f in enumerate(factors):
+            ovr = band.GetOverview(i)
+            self.assertEqual((ovr.XSize, ovr.YSize), (-(-ds.RasterXSize // f), -(-ds.RasterYSize // f)))
+        self.assertTrue(band.GetOverview(0).ReadAsArray().max() > 0)
+        ds = None
+
+        # outdated overview files are removed
+        vrt.saveVRT(pathVRT)
+        self.assertFalse(os.path.exists(pathVRT + '.ovr'))
+
+    def test_hierarchicalVRT(self):
+        from vrtbuilder.core import VirtualRaster, childVRTDirectory
+
+        TMP_DIR = self.createTestOutputDirectory() / 'hierarchicalVRT'
+        os.makedirs(TMP_DIR, exist_ok=True)
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        vrt.setNoDataValue(0)
+        pathFlat = (TMP_DIR / 'flat.vrt').as_posix()
+        pathTree = (TMP_DIR / 'tree.vrt').as_posix()
+        vrt.saveVRT(pathFlat)
+        self.assertFalse(os.path.exists(childVRTDirectory(pathFlat)))
+
+        # each VRT references at most four child VRTs or a single source
+        vrt.saveVRT(pathTree, maxSourcesPerVRT=1)
+        children = sorted(os.listdir(childVRTDirectory(pathTree)))
+        self.assertTrue(len(children) >= 2)
+        ds = gdal.Open(pathTree)
+        self.assertTrue(len(ds.GetFileList()) <= 5)
+        self.assertTrue(np.array_equal(ds.ReadAsArray(), gdal.Open(pathFlat).ReadAsArray()))
+        for name in children:
+            dsChild = gdal.Open(os.path.join(childVRTDirectory(pathTree), name))
+            self.assertEqual(dsChild.RasterCount, ds.RasterCount)
+            self.assertTrue(len(dsChild.GetFileList()) <= 5)
+        ds = None
+
+        # saving a single VRT removes the child VRTs
+        vrt.saveVRT(pathTree)
+        self.assertFalse(os.path.exists(childVRTDirectory(pathTree)))
+        self.assertTrue(np.array_equal(gdal.Open(pathTree).ReadAsArray(), gdal.Open(pathFlat).ReadAsArray()))
+
+    def test_tileIndex(self):
+        from osgeo import ogr
+        from vrtbuilder.core import VirtualRaster, GTI_LAYER_NAME, GTI_LOCATION_FIELD, GTI_SORT_FIELD
+
+        TMP_DIR = self.createTestOutputDirectory() / 'tileIndex'
+        os.makedirs(TMP_DIR, exist_ok=True)
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        vrt = VirtualRaster().addFilesAsMosaic(files[0:1])
+        vrt.setNoDataValue(0)
+        pathIndex = (TMP_DIR / 'mosaic.gti.gpkg').as_posix()
+        if os.path.exists(pathIndex):
+            os.remove(pathIndex)
+
+        def features():
+            ds = ogr.Open(pathIndex)
+            layer = ds.GetLayerByName(GTI_LAYER_NAME)
+            self.assertEqual(layer.GetMetadataItem('BAND_COUNT'), str(len(vrt)))
+            self.assertEqual(layer.GetMetadataItem('NODATA'), '0')
+            return {f.GetField(GTI_LOCATION_FIELD): (f.GetFID(), f.GetField(GTI_SORT_FIELD)) for f in layer}
+
+        vrt.saveTileIndex(pathIndex)
+        first = features()
+        self.assertEqual(len(first), 1)
+
+        # adding a source only inserts a tile
+        vrt.addFilesAsMosaic(files[1:])
+        vrt.setExtent(vrt.fullSourceRasterExtent())
+        vrt.saveTileIndex(pathIndex)
+        second = features()
+        self.assertEqual(len(second), 2)
+        for location, values in first.items():
+            self.assertEqual(second[location], values)
+        self.assertEqual(sorted(p for _, p in second.values()), [0, 1])
+
+        if isinstance(gdal.GetDriverByName('GTI'), gdal.Driver):
+            pathVRT = (TMP_DIR / 'mosaic.vrt').as_posix()
+            vrt.saveVRT(pathVRT)
+            ds = gdal.Open(pathIndex)
+            self.assertEqual(ds.GetDriver().ShortName, 'GTI')
+            self.assertEqual(ds.GetGeoTransform(), gdal.Open(pathVRT).GetGeoTransform())
+            self.assertTrue(np.array_equal(ds.ReadAsArray(), gdal.Open(pathVRT).ReadAsArray()))
+
+        # sources that use bands in another order are referenced as vrt:// connection strings
+        vrt[0].removeSource(files[1])
+        self.assertRaises(Exception, vrt.saveTileIndex, pathIndex)
+        vrt.removeInputSource(files[1])
+        vrt.removeBands([0])
+        vrt.saveTileIndex(pathIndex)
+        third = features()
+        self.assertEqual(list(third.keys()), ['vrt://{}?bands={}'.format(
+            files[0], ','.join(str(b + 2) for b in range(len(vrt))))])
+
+    def test_tileIndexRewrittenTile(self):
+        from osgeo import ogr
+        from vrtbuilder.core import VirtualRaster, GTI_LAYER_NAME, GTI_LOCATION_FIELD
+
+        TMP_DIR = self.createTestOutputDirectory() / 'tileIndexRewrittenTile'
+        os.makedirs(TMP_DIR, exist_ok=True)
+        pathTile = (TMP_DIR / 'tile.tif').as_posix()
+        pathIndex = (TMP_DIR / 'mosaic.gti.gpkg').as_posix()
+        if os.path.exists(pathIndex):
+            os.remove(pathIndex)
+        gdal.Translate(pathTile, Landsat8_West_tif.as_posix())
+
+        vrt = VirtualRaster().addFilesAsMosaic([pathTile])
+
+        def envelopes():
+            ds = ogr.Open(pathIndex)
+            layer = ds.GetLayerByName(GTI_LAYER_NAME)
+            return {f.GetField(GTI_LOCATION_FIELD): f.GetGeometryRef().GetEnvelope() for f in layer}
+
+        def bounds(path):
+            ds = gdal.Open(path)
+            gt = ds.GetGeoTransform()
+            return gt[0], gt[0] + ds.RasterXSize * gt[1], gt[3] + ds.RasterYSize * gt[5], gt[3]
+
+        vrt.saveTileIndex(pathIndex)
+        self.assertEqual(list(envelopes().values()), [bounds(pathTile)])
+
+        # the tile is rewritten in place with another extent
+        ds = gdal.Open(pathTile)
+        srcWin = [0, 0, ds.RasterXSize // 2, ds.RasterYSize // 2]
+        ds = None
+        gdal.Translate(pathTile, Landsat8_West_tif.as_posix(), srcWin=srcWin)
+        vrt.saveTileIndex(pathIndex)
+        self.assertEqual(list(envelopes().values()), [bounds(pathTile)])
+
+    def test_readVRTBands(self):
+        import shutil
+        from vrtbuilder.core import VirtualRaster, readVRTBands
+
+        TMP_DIR = self.createTestOutputDirectory() / 'readVRTBands'
+        os.makedirs(TMP_DIR / 'sources', exist_ok=True)
+        # a source below the VRT directory is written with a relative path
+        pathLocal = (TMP_DIR / 'sources' / Landsat8_East_tif.name).as_posix()
+        shutil.copy(Landsat8_East_tif, pathLocal)
+        files = [Landsat8_West_tif.as_posix(), pathLocal]
+
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        vrt.setExtent(vrt.fullSourceRasterExtent())
+        vrt.setNoDataValue(-9999)
+        for path in [(TMP_DIR / 'mosaic.vrt').as_posix(), '/vsimem/readVRTBands/mosaic.vrt']:
+            vrt.saveVRT(path)
+            bands, noData = readVRTBands(path)
+            self.assertEqual(noData, -9999)
+            self.assertEqual(bands, vrt[:])
+            self.assertEqual([b.name() for b in bands], [b.name() for b in vrt])
+
+            vrt2 = VirtualRaster().loadVRT(path)
+            self.assertEqual(vrt2, vrt)
+
+        # the Qt adapter inserts the loaded bands
+        VRT = VRTRaster()
+        VRT.loadVRT(TMP_DIR / 'mosaic.vrt')
+        self.assertEqual(len(VRT), len(vrt))
+        self.assertEqual(VRT.sourceRaster(), files)
+        self.assertIs(VRT[0][0].virtualBand(), VRT[0])
+
+    def test_sourceRegistry(self):
+        import pickle
+        from vrtbuilder.core import VirtualRaster, VirtualBand, VRTRasterInputSourceBand
+
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix()]
+        nb = gdal.Open(files[0]).RasterCount
+        vrt = VirtualRaster().addFilesAsMosaic(files)
+        self.assertEqual(vrt.sourceRaster(), files)
+        self.assertEqual(vrt.sourceCount(), 2)
+        self.assertEqual(vrt.sourceRefCount(files[0]), nb)
+        self.assertEqual(vrt.sourcePositions(files[1]), [(b, 1) for b in range(nb)])
+
+        # a source file can be used only once per band
+        self.assertIsNone(vrt[0].insertSource(0, VRTRasterInputSourceBand(files[0], 1)))
+        self.assertEqual(vrt.sourceRefCount(files[0]), nb)
+
+        removed = vrt.removeBands([0])
+        self.assertEqual(vrt.sourceRefCount(files[0]), nb - 1)
+        self.assertIsNone(removed[0][1].mRaster)
+        vrt.insertBand(0, removed[0][1])
+        self.assertEqual(vrt.sourceRefCount(files[0]), nb)
+
+        vrt2 = pickle.loads(pickle.dumps(vrt))
+        self.assertEqual(vrt2.sourcePositions(files[0]), vrt.sourcePositions(files[0]))
+
+        self.assertEqual(len(vrt.removeInputSource(files[0])), nb)
+        self.assertFalse(vrt.hasSource(files[0]))
+        self.assertEqual(vrt.sourceRaster(), files[1:])
+        self.assertEqual(vrt.sourcePositions(files[1]), [(b, 0) for b in range(nb)])
+        self.assertEqual(vrt2.sourceCount(), 2)
+
+        band = vrt.addBand(VirtualBand())
+        band.addSource(VRTRasterInputSourceBand(files[0], 0))
+        self.assertEqual(vrt.sourceRaster(), files[::-1])
+        self.assertIsNotNone(band.removeSource(files[0]))
+        self.assertEqual(vrt.sourceCount(), 1)
+
+        VRT = VRTRaster()
+        VRT.addFilesAsMosaic(files)
+        VRT.removeInputSource(files[0])
+        self.assertEqual(VRT.sourceRaster(), files[1:])
+        self.assertEqual([len(band) for band in VRT], [1] * nb)
+
+    def test_blockUpdates(self):
+        files = [Landsat8_West_tif.as_posix(), Landsat8_East_tif.as_posix(), RapidEye_tif.as_posix()]
+        VRT = VRTRaster()
+        model = VRTRasterTreeModel(VRT)
+        VRT.addVirtualBand(VRTRasterBand())
+        VRT[0].addSource(VRTRasterInputSourceBand(files[0], 0))
+
+        bandsInserted = []
+        sourcesInserted = []
+        rowsInserted = []
+        VRT.sigBandsInserted.connect(lambda i, bands: bandsInserted.append((i, len(bands))))
+        VRT.sigSourceBandsInserted.connect(lambda band, i, sources: sourcesInserted.append((band, i, len(sources))))
+        model.rowsInserted.connect(lambda parent, first, last: rowsInserted.append((first, last)))
+
+        with VRT.blockUpdates():
+            VRT.insertSources(0, [[VRTRasterInputSourceBand(f, b) for f in files] for b in range(3)])
+            VRT.insertVirtualBand(0, VRTRasterBand())
+            VRT[1].insertSource(0, VRTRasterInputSourceBand(files[1], 1))
+            # removing a band that was inserted meanwhile is not announced at all
+            VRT.removeVirtualBand(3)
+            self.assertEqual(len(bandsInserted) + len(sourcesInserted) + len(rowsInserted), 0)
+
+        self.assertEqual(len(VRT), 3)
+        self.assertEqual(bandsInserted, [(0, 1), (2, 1)])
+        self.assertEqual(sourcesInserted, [(VRT[1], 0, 1), (VRT[1], 2, 2), (VRT[2], 0, 3)])
+        self.assertEqual(len(rowsInserted), 4)
+        self.assertEqual([model.rowCount(model.node2idx(n)) for n in model.rootNode().childNodes()],
+                         [len(band) for band in VRT])
+        for node, band in zip(model.rootNode().childNodes(), VRT):
+            self.assertEqual([n.sourceBand() for n in node.childNodes()], band[:])
+
+        VRT2 = VRTRaster()
+        VRT2.addFilesAsStack(files)
+        self.assertEqual(len(VRT2), sum(gdal.Open(f).RasterCount for f in files))
+        self.assertEqual(VRT2.sourceRaster(), files)
+
+    def test_checkBasicParameters(self):
+        from vrtbuilder.core import sourceInfo
+
+        VRT = VRTRaster()
+        crsChanged = []
+        VRT.sigCrsChanged.connect(crsChanged.append)
+        for b in range(3):
+            VRT.insertSourceBand(b, Landsat8_West_tif.as_posix(), b)
+        VRT.insertSourceBand(0, Landsat8_East_tif.as_posix(), 0)
+
+        info = sourceInfo(Landsat8_West_tif)
+        self.assertEqual(len(crsChanged), 1)
+        self.assertEqual(VRT.virtualRaster().wkt(), info.wkt)
+        self.assertEqual(VRT.virtualRaster().geoTransform(), tuple(info.geoTransform))
+        self.assertEqual(VRT.virtualRaster().size(), (info.rasterXSize, info.rasterYSize))
+
+    def test_sourceRasterModel(self):
+        files = [Landsat8_West_tif, Landsat8_East_tif, RapidEye_tif]
+        model = SourceRasterModel()
+        model.addSources(files + [Landsat8_West_tif.as_posix(), 'does_not_exist.tif'])
+        self.assertEqual(len(model), len(files))
+        self.assertEqual(model.rasterSources(), [f.as_posix() for f in files])
+        self.assertEqual(len(model.mLayerCache), 0)
+
+        node = model.file2node(RapidEye_tif.as_posix())
+        self.assertIsInstance(node, SourceRasterFileNode)
+        idx = model.node2idx(node)
+        self.assertTrue(model.hasChildren(idx))
+        self.assertTrue(model.canFetchMore(idx))
+        self.assertEqual(model.rowCount(idx), 0)
+        self.assertEqual(len(node.sourceBands()), gdal.Open(RapidEye_tif.as_posix()).RasterCount)
+        model.fetchMore(idx)
+        self.assertFalse(model.canFetchMore(idx))
+        self.assertEqual(model.rowCount(idx), 3)
+        self.assertEqual([n.sourceBand() for n in node.bandNode.childNodes()], node.sourceBands())
+
+        model.mLayerCache = RasterLayerCache(maxSize=2)
+        for n in model.rootNode().childNodes():
+            n.mLayerCache = model.mLayerCache
+            self.assertIsInstance(n.rasterLayer(), QgsRasterLayer)
+        self.assertEqual(len(model.mLayerCache), 2)
+        self.assertFalse(Landsat8_West_tif.as_posix() in model.mLayerCache)
+        self.assertIs(model.file2layer(RapidEye_tif.as_posix()), model.file2layer(RapidEye_tif.as_posix()))
+
+        model.removeFiles([RapidEye_tif.as_posix()])
+        self.assertEqual(len(model), 2)
+        self.assertIsNone(model.file2node(RapidEye_tif.as_posix()))
+
+        model = SourceRasterModel(lazy=False)
+        model.addSources(files)
+        node = model.rootNode().childNodes()[0]
+        self.assertFalse(node.canFetchMore())
+        self.assertIsInstance(node.mRasterLayer, QgsRasterLayer)
+
+    def test_sourceRasterLoadingTask(self):
+        import time
+        files = [Landsat8_West_tif, Landsat8_East_tif, RapidEye_tif, Sentinel2_West_tif, 'does_not_exist.tif']
+
+        blocks = []
+        messages = []
+        task = SourceRasterLoadingTask(files, block_size=2)
+        task.sigSourcesLoaded.connect(blocks.append)
+        task.sigMessage.connect(lambda msg, isError: messages.append(msg))
+        self.assertTrue(task.run())
+        self.assertEqual([len(b) for b in blocks], [2, 2])
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(task.mNumProcessed, len(files))
+        self.assertTrue(task.throughput() > 0)
+
+        model = SourceRasterModel()
+        for block in blocks:
+            model.addSourceInfos(block)
+        self.assertEqual(len(model), 4)
+
+        GUI = VRTBuilderWidget()
+        task = GUI.addSourceFiles(files, background=True)
+        self.assertIsInstance(task, SourceRasterLoadingTask)
+        t0 = time.time()
+        while len(GUI.mSourceImportTasks) > 0 and time.time() - t0 < 60:
+            QgsApplication.processEvents()
+        self.assertEqual(len(GUI.mSourceImportTasks), 0)
+        self.assertEqual(len(GUI.mSourceFileModel), 4)
+
     def test_vrtRasterMetadata(self):
         ds = gdal.Open(Landsat8_East_tif.as_posix())
         self.assertIsInstance(ds, gdal.Dataset)
@@ -338,6 +1038,8 @@ class VRTBuilderTests(TestCase):
         for b in child1.sourceBands():
             self.assertIsInstance(b, VRTRasterInputSourceBand)
 
+        # band nodes are created on demand
+        GUI.mSourceFileModel.fetchMore(GUI.mSourceFileModel.node2idx(child1))
         sourceBandIndices = []
         for node in child1.childNodes()[-1].childNodes():
             self.assertIsInstance(node, SourceRasterBandNode)
@@ -21,13 +21,8 @@ import os
 import sys
 import pathlib
 
-# skip imports when on RTD, as we can not install the full QGIS environment as required
-# https://docs.readthedocs.io/en/stable/builds.html
-if not os.environ.get('READTHEDOCS') in ['True', 'TRUE', True]:
-    from osgeo import gdal, ogr
-    from qgis.core import *
-    from qgis.PyQt.QtCore import *
-    from qgis.core import QgsProject, QgsVectorLayer, QgsRasterLayer, QgsMapLayer, QgsMapLayerStore
+# QGIS is not imported here, so that the command line interface (python -m vrtbuilder build ...)
+# and the GDAL-only vrtbuilder.core module can be used without initializing QGIS.
 
 __version__ = '0.9'  # subversion will be set automatically
 VERSION = __version__
@@ -66,4 +61,12 @@ URL_HOMEPAGE = 'https://virtual-raster-builder.readthedocs.io'
 URL_ISSUETRACKER = 'https://bitbucket.org/jakimowb/virtual-raster-builder/issues'
 URL_REPOSITORY = 'https://bitbucket.org/jakimowb/virtual-raster-builder'
 
-MAPLAYER_STORES = [QgsProject.instance()]
+
+def __getattr__(name: str):
+    # MAPLAYER_STORES is created on first access, as it requires QGIS
+    if name == 'MAPLAYER_STORES':
+        from qgis.core import QgsProject
+        global MAPLAYER_STORES
+        MAPLAYER_STORES = [QgsProject.instance()]
+        return MAPLAYER_STORES
+    raise AttributeError('module {} has no attribute {}'.format(__name__, name))
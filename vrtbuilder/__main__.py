@@ -18,7 +18,13 @@
 """
 
 
-class run():
+import sys
+
+
+def run():
+    """
+    Starts the Virtual Raster Builder GUI
+    """
     # add site-packages to sys.path as done by enmapboxplugin.py
 
     from vrtbuilder.externals.qps.testing import start_app
@@ -31,5 +37,19 @@ class run():
     qgsApp.exitQgis()
 
 
+def main(argv=None) -> int:
+    """
+    Starts the GUI if called without arguments, otherwise the command line interface,
+    e.g. "python -m vrtbuilder build output.vrt image1.tif image2.tif", which does not start QGIS.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) == 0:
+        run()
+        return 0
+    from vrtbuilder.cli import main as cliMain
+    return cliMain(argv)
+
+
 if __name__ == '__main__':
-    run()
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# noinspection PyPep8Naming
+"""
+***************************************************************************
+    batch
+    ---------------------
+    Copyright            : (C) 2017 by Benjamin Jakimow
+    Email                : benjamin.jakimow@geo.hu-berlin.de
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 3 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Builds many VRTs in a process pool. The VRTs are described in a manifest, either a JSON file like
+
+    [{"output": "tile1.vrt", "sources": ["a.tif", "b.tif"], "crs": "EPSG:32633", "resolution": [30, 30]}, ...]
+
+or a CSV file with the columns output, sources, stack, crs, resolution, bounds, resampling and nodata, e.g.
+
+    output;sources;resolution
+    tile1.vrt;a.tif|b.tif;30
+
+Relative paths are relative to the manifest directory. This module must not import PyQt or QGIS.
+"""
+import csv
+import json
+import os
+import pathlib
+import time
+import traceback
+import typing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+
+from vrtbuilder.core import buildVRT, readSourceInfos, sourceInfoCache, setSourceInfoCache, SourceInfoCache
+
+# CSV manifests separate multiple sources in the "sources" column by this character
+CSV_SOURCE_SEPARATOR = '|'
+
+# number of threads each worker process uses to read source properties
+BATCH_THREADS_PER_JOB = 4
+
+
+@dataclass
+class BatchJob:
+    """
+    The description of a single VRT, see buildVRT for the meaning of each field
+    """
+    output: str
+    sources: typing.List[str]
+    stack: bool = False
+    crs: typing.Optional[str] = None
+    resolution: typing.Optional[typing.Tuple[float, float]] = None
+    bounds: typing.Optional[typing.Tuple[float, float, float, float]] = None
+    resampling: typing.Optional[str] = None
+    nodata: typing.Optional[float] = None
+
+    @staticmethod
+    def fromDict(values: dict, root: str = None) -> 'BatchJob':
+        """
+        Creates a BatchJob from a manifest entry
+        :param values: dict
+        :param root: str, directory that relative paths refer to
+        :return: BatchJob
+        """
+        def resolve(path: str) -> str:
+            path = str(path).strip()
+            if root is None or path.startswith('/vsi') or os.path.isabs(path):
+                return path
+            return os.path.join(root, path)
+
+        def floats(value) -> typing.Optional[typing.List[float]]:
+            if value in [None, '']:
+                return None
+            if isinstance(value, str):
+                value = value.replace(',', ' ').split()
+            elif isinstance(value, (int, float)):
+                value = [value]
+            return [float(v) for v in value]
+
+        assert values.get('output'), 'Manifest entry without output: {}'.format(values)
+        sources = values.get('sources', [])
+        if isinstance(sources, str):
+            sources = sources.split(CSV_SOURCE_SEPARATOR)
+        sources = [resolve(s) for s in sources if len(str(s).strip()) > 0]
+
+        stack = values.get('stack', False)
+        if isinstance(stack, str):
+            stack = stack.strip().lower() in ['1', 'true', 'yes', 'stack']
+
+        resolution = floats(values.get('resolution'))
+        if resolution is not None:
+            assert len(resolution) in [1, 2], 'resolution expects one or two values'
+            resolution = (resolution[0], resolution[-1])
+
+        bounds = floats(values.get('bounds'))
+        if bounds is not None:
+            assert len(bounds) == 4, 'bounds expects four values: xmin ymin xmax ymax'
+            bounds = tuple(bounds)
+
+        nodata = values.get('nodata')
+        nodata = None if nodata in [None, ''] else float(nodata)
+
+        return BatchJob(output=resolve(values['output']),
+                        sources=sources,
+                        stack=bool(stack),
+                        crs=values.get('crs') or None,
+                        resolution=resolution,
+                        bounds=bounds,
+                        resampling=values.get('resampling') or None,
+                        nodata=nodata)
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of a BatchJob
+    """
+    output: str
+    success: bool
+    duration: float = 0.0
+    error: typing.Optional[str] = None
+    traceback: typing.Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    """
+    The outcome of all BatchJobs
+    """
+    results: typing.List[BatchResult] = field(default_factory=list)
+    duration: float = 0.0
+
+    def succeeded(self) -> typing.List[BatchResult]:
+        return [r for r in self.results if r.success]
+
+    def failed(self) -> typing.List[BatchResult]:
+        return [r for r in self.results if not r.success]
+
+    def summary(self) -> str:
+        """
+        Returns a human-readable summary of timings and failures
+        :return: str
+        """
+        n = len(self.results)
+        durations = [r.duration for r in self.results]
+        lines = ['Built {} of {} VRTs in {:0.2f}s'.format(len(self.succeeded()), n, self.duration)]
+        if n > 0:
+            lines.append('Job duration: mean {:0.3f}s, max {:0.3f}s'.format(sum(durations) / n, max(durations)))
+        failed = self.failed()
+        if len(failed) > 0:
+            lines.append('{} failed:'.format(len(failed)))
+            for r in failed:
+                lines.append('  {}: {}'.format(r.output, r.error))
+        return '\n'.join(lines)
+
+    def writeJson(self, path: typing.Union[str, pathlib.Path]):
+        """
+        Writes the report as JSON
+        :param path: str
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+def readManifest(path: typing.Union[str, pathlib.Path]) -> typing.List[BatchJob]:
+    """
+    Reads the BatchJobs of a JSON or CSV manifest. The CSV delimiter is detected automatically.
+    :param path: str
+    :return: [list-of-BatchJob]
+    """
+    path = pathlib.Path(path)
+    root = path.resolve().parent.as_posix()
+    if path.suffix.lower() == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries['jobs']
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        try:
+            dialect = csv.Sniffer().sniff(text.splitlines()[0], delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        entries = list(csv.DictReader(text.splitlines(), dialect=dialect))
+        entries = [{k.strip().lower(): v for k, v in e.items() if k} for e in entries]
+    return [BatchJob.fromDict(e, root=root) for e in entries]
+
+
+def runJob(job: BatchJob) -> BatchResult:
+    """
+    Builds the VRT of a BatchJob. Exceptions are returned as part of the BatchResult.
+    :param job: BatchJob
+    :return: BatchResult
+    """
+    t0 = time.time()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(job.output)), exist_ok=True)
+        buildVRT(job.output, job.sources,
+                 stack=job.stack,
+                 crs=job.crs,
+                 resolution=job.resolution,
+                 bounds=job.bounds,
+                 resampleAlg=job.resampling,
+                 noData=job.nodata,
+                 maxWorkers=BATCH_THREADS_PER_JOB)
+    except Exception as ex:
+        return BatchResult(job.output, False, time.time() - t0, error=str(ex) or type(ex).__name__,
+                           traceback=traceback.format_exc())
+    return BatchResult(job.output, True, time.time() - t0)
+
+
+def _initWorker(cachePath: typing.Optional[str]):
+    # SQLite connections must not be shared with forked processes
+    setSourceInfoCache(None if cachePath is None else SourceInfoCache(cachePath))
+
+
+def buildVRTs(jobs: typing.List[BatchJob],
+              processes: int = None,
+              progress: typing.Callable[[int, int, BatchResult], None] = None) -> BatchReport:
+    """
+    Builds the VRTs of multiple BatchJobs in a process pool
+    :param jobs: [list-of-BatchJob]
+    :param processes: int, number of worker processes. Defaults to the number of CPUs.
+                      Use 1 to build all VRTs in the calling process.
+    :param progress: callback function(done: int, total: int, result: BatchResult), called for each finished job
+    :return: BatchReport with results in same order as the jobs
+    """
+    t0 = time.time()
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(jobs)))
+    results = [None] * len(jobs)
+    done = 0
+
+    def finished(i: int, result: BatchResult):
+        nonlocal done
+        results[i] = result
+        done += 1
+        if progress:
+            progress(done, len(jobs), result)
+
+    cache = sourceInfoCache()
+    # worker processes can only share a file-based cache
+    cachePath = None if cache is None or cache.path() == ':memory:' else cache.path()
+    if cache is not None and (processes == 1 or cachePath is not None):
+        # sources used by many jobs are read only once
+        allSources = list(dict.fromkeys(s for job in jobs for s in job.sources))
+        readSourceInfos(allSources, raiseErrors=False)
+
+    if processes == 1:
+        for i, job in enumerate(jobs):
+            finished(i, runJob(job))
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initWorker, initargs=(cachePath,)) as pool:
+            futures = {pool.submit(runJob, job): i for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except Exception as ex:
+                    # e.g. a crashed worker process
+                    result = BatchResult(jobs[i].output, False, error=str(ex) or type(ex).__name__,
+                                         traceback=traceback.format_exc())
+                finished(i, result)
+
+    return BatchReport(results=results, duration=time.time() - t0)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# noinspection PyPep8Naming
+"""
+***************************************************************************
+    cli
+    ---------------------
+    Copyright            : (C) 2017 by Benjamin Jakimow
+    Email                : benjamin.jakimow@geo.hu-berlin.de
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 3 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Command line interface of the Virtual Raster Builder, e.g.
+
+    python -m vrtbuilder build --stack --crs EPSG:32633 --resolution 30 output.vrt image1.tif image2.tif
+    python -m vrtbuilder build --pattern "*.tif" mosaic.gti.gpkg /data/tiles
+    python -m vrtbuilder batch --processes 8 --report report.json manifest.csv
+    python -m vrtbuilder materialize --workers 16 --co COMPRESS=DEFLATE mosaic.vrt mosaic.tif
+    python -m vrtbuilder materialize --cog --co COMPRESS=ZSTD --overviews-from-source mosaic.vrt mosaic_cog.tif
+
+Except for the "gui" command, this module must not import PyQt or QGIS.
+"""
+import argparse
+import sys
+import time
+import typing
+
+
+def readFileList(path: str) -> typing.List[str]:
+    """
+    Reads a text file with one source path per line. Empty lines and lines starting with # are ignored.
+    :param path: str
+    :return: [list-of-str]
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f.readlines()]
+    return [line for line in lines if len(line) > 0 and not line.startswith('#')]
+
+
+def build(args: argparse.Namespace) -> int:
+    from vrtbuilder.core import buildVRT
+    from vrtbuilder.scan import expandSources
+
+    files = list(args.sources)
+    if args.file_list:
+        files.extend(readFileList(args.file_list))
+    files = expandSources(files, pattern=args.pattern, recursive=not args.no_recursive)
+    if len(files) == 0:
+        print('No source files defined', file=sys.stderr)
+        return 1
+
+    resolution = None
+    if args.resolution:
+        resolution = (args.resolution[0], args.resolution[-1])
+
+    t0 = time.time()
+    try:
+        buildVRT(args.output, files,
+                 stack=args.stack,
+                 crs=args.crs,
+                 resolution=resolution,
+                 bounds=args.extent,
+                 resampleAlg=args.resampling,
+                 noData=args.nodata,
+                 maxWorkers=args.workers,
+                 overviews=args.overviews,
+                 maxSourcesPerVRT=args.max_sources)
+    except Exception as ex:
+        print('Failed to create {}: {}'.format(args.output, ex), file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print('Created {} from {} sources in {:0.2f}s'.format(args.output, len(files), time.time() - t0))
+    return 0
+
+
+def batch(args: argparse.Namespace) -> int:
+    from vrtbuilder.batch import readManifest, buildVRTs
+
+    try:
+        jobs = readManifest(args.manifest)
+    except Exception as ex:
+        print('Unable to read {}: {}'.format(args.manifest, ex), file=sys.stderr)
+        return 1
+
+    def progress(done, total, result):
+        if not args.quiet:
+            status = 'ok' if result.success else 'FAILED: {}'.format(result.error)
+            print('[{}/{}] {} {} ({:0.2f}s)'.format(done, total, result.output, status, result.duration))
+
+    report = buildVRTs(jobs, processes=args.processes, progress=progress)
+    if args.report:
+        report.writeJson(args.report)
+    if not args.quiet or len(report.failed()) > 0:
+        print(report.summary(), file=sys.stderr if len(report.failed()) > 0 else sys.stdout)
+    return 0 if len(report.failed()) == 0 else 1
+
+
+def materialize(args: argparse.Namespace) -> int:
+    from vrtbuilder.materialize import materialize as materializeRaster, materializeCOG
+
+    def progress(state):
+        if not args.quiet:
+            print('\r{} {}'.format(state.path, state.summary()), end='', flush=True)
+
+    try:
+        if args.cog or args.format == 'COG':
+            state = materializeCOG(args.source, args.output,
+                                   overviewResampling=args.overview_resampling,
+                                   overviewsFromSource=args.overviews_from_source,
+                                   creationOptions=args.co,
+                                   maxWorkers=args.workers,
+                                   processes=args.processes,
+                                   progress=progress)
+        else:
+            state = materializeRaster(args.source, args.output,
+                                      format=args.format,
+                                      creationOptions=args.co,
+                                      maxWorkers=args.workers,
+                                      processes=args.processes,
+                                      progress=progress)
+    except Exception as ex:
+        print('Failed to create {}: {}'.format(args.output, ex), file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print('\nCreated {} in {:0.2f}s'.format(args.output, state.duration))
+    return 0
+
+
+def gui(args: argparse.Namespace) -> int:
+    from vrtbuilder.__main__ import run
+    run()
+    return 0
+
+
+def createParser() -> argparse.ArgumentParser:
+    from vrtbuilder import TITLE, __version__
+    parser = argparse.ArgumentParser(prog='vrtbuilder', description='{} {}'.format(TITLE, __version__))
+    subparsers = parser.add_subparsers(dest='command')
+
+    p = subparsers.add_parser('build', help='Create a VRT without starting QGIS')
+    p.add_argument('output', help='Path of the VRT to create, or of a GDAL raster tile index, '
+                                  'if it ends with ".gpkg", e.g. "mosaic.gti.gpkg"')
+    p.add_argument('sources', nargs='*', help='Raster source files or directories to search for raster files')
+    p.add_argument('--file-list', metavar='PATH', help='Text file with one raster source per line')
+    p.add_argument('--pattern', action='append', metavar='GLOB',
+                   help='Wildcard pattern, e.g. "*_B4.tif", that files found in source directories need to match. '
+                        'Can be used multiple times.')
+    p.add_argument('--no-recursive', action='store_true', help='Do not search sub-directories of source directories')
+    p.add_argument('--stack', action='store_true',
+                   help='Stack all source bands into separate virtual bands. '
+                        'By default, the n-th bands of all sources are mosaiced into the n-th virtual band.')
+    p.add_argument('--crs', help='Output CRS, e.g. "EPSG:32633". Defaults to the CRS of the first source.')
+    p.add_argument('--resolution', type=float, nargs='+', metavar='RES',
+                   help='Output pixel size as "XRES [YRES]" in units of the output CRS. '
+                        'Defaults to the pixel size of the first source.')
+    p.add_argument('--extent', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+                   help='Output extent in the output CRS. Defaults to the union of all sources.')
+    p.add_argument('--resampling', default='NearestNeighbour',
+                   help='Resampling algorithm used to warp sources, e.g. NearestNeighbour, Bilinear, Cubic')
+    p.add_argument('--nodata', type=float, help='No-data value of all virtual bands')
+    p.add_argument('--overviews', choices=['sources', 'build'],
+                   help='Add overviews to the VRT: "sources" lets GDAL read them from the source overviews, '
+                        '"build" computes them into an external .vrt.ovr file')
+    p.add_argument('--max-sources', type=int, metavar='N',
+                   help='Write VRTs with more than N sources as VRT of VRTs that each have at most N sources')
+    p.add_argument('--workers', type=int, help='Number of threads used to read source properties')
+    p.add_argument('-q', '--quiet', action='store_true', help='Do not print a summary')
+    p.set_defaults(func=build)
+
+    p = subparsers.add_parser('batch', help='Create many VRTs described in a manifest file in parallel')
+    p.add_argument('manifest', help='JSON or CSV file that describes the VRTs, see vrtbuilder.batch')
+    p.add_argument('--processes', type=int, help='Number of worker processes. Defaults to the number of CPUs.')
+    p.add_argument('--report', metavar='PATH', help='Write a JSON report with timings and errors of each VRT')
+    p.add_argument('-q', '--quiet', action='store_true', help='Only print failures')
+    p.set_defaults(func=batch)
+
+    p = subparsers.add_parser('materialize', help='Write the pixels of a VRT into a binary raster file')
+    p.add_argument('source', help='VRT or other raster to read from')
+    p.add_argument('output', help='Raster file to create, e.g. mosaic.tif or mosaic.bsq')
+    p.add_argument('--format', help='GDAL driver short name. Defaults to the driver that matches the output extension.')
+    p.add_argument('--co', action='append', metavar='NAME=VALUE',
+                   help='GDAL creation option. Can be used multiple times.')
+    p.add_argument('--workers', type=int, help='Number of threads or processes that read the raster in windows')
+    p.add_argument('--processes', action='store_true', help='Read windows in worker processes instead of threads')
+    p.add_argument('--cog', action='store_true',
+                   help='Write a Cloud-Optimized GeoTIFF with tiles, DEFLATE compression and overviews. '
+                        'Use --co to set other COG creation options, e.g. COMPRESS=ZSTD or PREDICTOR=NO.')
+    p.add_argument('--overview-resampling', default='AVERAGE',
+                   help='Resampling algorithm of COG overviews, e.g. AVERAGE, NEAREST, CUBIC')
+    p.add_argument('--overviews-from-source', action='store_true',
+                   help='Compute COG overviews from the source instead of the written full resolution')
+    p.add_argument('-q', '--quiet', action='store_true', help='Do not print the progress')
+    p.set_defaults(func=materialize)
+
+    p = subparsers.add_parser('gui', help='Start the Virtual Raster Builder GUI')
+    p.set_defaults(func=gui)
+    return parser
+
+
+def main(argv: typing.List[str] = None) -> int:
+    parser = createParser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+    if args.command == 'build' and args.resolution and len(args.resolution) > 2:
+        parser.error('--resolution expects one or two values')
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
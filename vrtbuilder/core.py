@@ -0,0 +1,3028 @@
+# -*- coding: utf-8 -*-
+# noinspection PyPep8Naming
+"""
+***************************************************************************
+    core
+    ---------------------
+    Copyright            : (C) 2017 by Benjamin Jakimow
+    Email                : benjamin.jakimow@geo.hu-berlin.de
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 3 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+GDAL-only functionality of the Virtual Raster Builder. This module must not import PyQt or QGIS.
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+import typing
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+from vrtbuilder.materialize import overviewFactors, buildExternalOverviews
+
+# number of XML lines that are buffered before being written to the VRT file
+VRT_WRITE_BUFFER_LINES = 4096
+
+# default number of threads used to read source properties.
+# Opening files is latency-bound I/O and GDAL releases the GIL, so this can be larger than the number of CPUs
+SOURCE_INFO_WORKERS = min(32, 4 * (os.cpu_count() or 1))
+
+# location and size of the persistent source info cache
+SOURCE_INFO_CACHE_PATH = os.environ.get('VRTBUILDER_SOURCE_INFO_CACHE',
+                                        os.path.join(os.path.expanduser('~'), '.vrtbuilder', 'sourceinfo.sqlite'))
+SOURCE_INFO_CACHE_SIZE = 500000
+# number of cache reads whose access is recorded at once, see SourceInfoCache.getMany
+SOURCE_INFO_CACHE_ACCESS_BATCH = 1000
+
+# number of points per edge used to reproject source footprints
+FOOTPRINT_DENSIFY = 21
+
+# overview modes of VirtualRaster.saveVRT: virtual overviews from source overviews, or an external .ovr file
+VRT_OVERVIEWS_SOURCES = 'sources'
+VRT_OVERVIEWS_BUILD = 'build'
+
+# overview levels of VRTs are added until they fit into this size
+VRT_OVERVIEW_MIN_SIZE = 256
+
+# default max. number of sources per VRT of a hierarchical VRT, see writeHierarchicalVRT
+VRT_MAX_SOURCES = 1000
+
+# layer and field names of GDAL raster tile indices (GTI), see writeTileIndex
+GTI_LAYER_NAME = 'tileindex'
+GTI_LOCATION_FIELD = 'location'
+GTI_SORT_FIELD = 'priority'
+GTI_SIGNATURE_FIELD = 'signature'
+
+
+@dataclass
+class RasterSourceInfo:
+    """
+    Describes the properties of a raster source that are required to reference it in a VRT,
+    so that a source does not need to be opened again to write the VRT.
+    """
+    path: str
+    rasterXSize: int
+    rasterYSize: int
+    geoTransform: tuple
+    wkt: str = ''
+    dataTypes: typing.List[int] = field(default_factory=list)
+    noDataValues: typing.List[float] = field(default_factory=list)
+    bandNames: typing.List[str] = field(default_factory=list)
+    blockSizes: typing.List[typing.Tuple[int, int]] = field(default_factory=list)
+
+    @staticmethod
+    def fromDataset(dataset: gdal.Dataset, path: str = None) -> 'RasterSourceInfo':
+        """
+        Reads the source properties from an opened gdal.Dataset
+        :param dataset: gdal.Dataset
+        :param path: str, optional, the source path. Defaults to the dataset description.
+        :return: RasterSourceInfo
+        """
+        assert isinstance(dataset, gdal.Dataset)
+        if path is None:
+            path = dataset.GetDescription()
+
+        dataTypes = []
+        noDataValues = []
+        bandNames = []
+        blockSizes = []
+        for b in range(dataset.RasterCount):
+            band: gdal.Band = dataset.GetRasterBand(b + 1)
+            dataTypes.append(band.DataType)
+            noDataValues.append(band.GetNoDataValue())
+            bandNames.append(band.GetDescription())
+            blockSizes.append(tuple(band.GetBlockSize()))
+
+        return RasterSourceInfo(path=path,
+                                rasterXSize=dataset.RasterXSize,
+                                rasterYSize=dataset.RasterYSize,
+                                geoTransform=tuple(dataset.GetGeoTransform()),
+                                wkt=dataset.GetProjection(),
+                                dataTypes=dataTypes,
+                                noDataValues=noDataValues,
+                                bandNames=bandNames,
+                                blockSizes=blockSizes)
+
+    @staticmethod
+    def fromPath(path: typing.Union[str, pathlib.Path]) -> 'RasterSourceInfo':
+        """
+        Opens a raster source and reads its properties
+        :param path: str | pathlib.Path
+        :return: RasterSourceInfo
+        """
+        if isinstance(path, pathlib.Path):
+            path = path.as_posix()
+        ds = gdal.Open(path)
+        assert isinstance(ds, gdal.Dataset), 'Can not open {} as gdal.Dataset'.format(path)
+        return RasterSourceInfo.fromDataset(ds, path=path)
+
+    @staticmethod
+    def fromDict(values: dict) -> 'RasterSourceInfo':
+        """
+        Restores a RasterSourceInfo from a dictionary as returned by asdict()
+        :param values: dict
+        :return: RasterSourceInfo
+        """
+        values = dict(values)
+        values['geoTransform'] = tuple(values['geoTransform'])
+        values['blockSizes'] = [tuple(v) for v in values['blockSizes']]
+        return RasterSourceInfo(**values)
+
+    def bandCount(self) -> int:
+        """
+        Returns the number of bands
+        :return: int
+        """
+        return len(self.dataTypes)
+
+    def bounds(self) -> typing.Tuple[float, float, float, float]:
+        """
+        Returns the spatial bounds of a north-up image
+        :return: tuple (xMin, yMin, xMax, yMax)
+        """
+        gt = self.geoTransform
+        x0 = gt[0]
+        x1 = gt[0] + self.rasterXSize * gt[1]
+        y0 = gt[3]
+        y1 = gt[3] + self.rasterYSize * gt[5]
+        return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def fileSignature(path: str) -> typing.Optional[typing.Tuple[int, int]]:
+    """
+    Returns the (size, modification time in ns) of a file, which is used to validate cached source properties
+    :param path: str
+    :return: tuple (size, mtime) or None, if the path can not be used for caching, e.g. in-memory files.
+    """
+    if path.startswith('/vsimem/'):
+        return None
+    if path.startswith('/vsi'):
+        stat = gdal.VSIStatL(path, gdal.VSI_STAT_EXISTS_FLAG | gdal.VSI_STAT_SIZE_FLAG)
+        if stat is None:
+            return None
+        return stat.size, int(stat.mtime * 1e9)
+    try:
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SourceInfoCache(object):
+    """
+    A persistent SQLite cache of RasterSourceInfos, validated by file size and modification time.
+    The least recently used entries are removed if the cache grows larger than maxEntries.
+    Accesses are recorded in batches, so that reading does not need the database write lock each time.
+    """
+
+    def __init__(self, path: typing.Union[str, pathlib.Path] = ':memory:', maxEntries: int = SOURCE_INFO_CACHE_SIZE):
+        if isinstance(path, pathlib.Path):
+            path = path.as_posix()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        assert maxEntries > 0
+        self.mPath = path
+        self.mMaxEntries = maxEntries
+        self.mLock = threading.Lock()
+        # paths of cache hits whose access is not written yet, in order of access
+        self.mAccessed: typing.Dict[str, None] = dict()
+        self.mConnection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if path != ':memory:':
+            # readers do not block each other and the writer, e.g. of parallel batch jobs
+            self.mConnection.execute('PRAGMA journal_mode=WAL')
+        self.mConnection.execute('CREATE TABLE IF NOT EXISTS sources ('
+                                 'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+                                 'accessed REAL, info TEXT)')
+        self.mConnection.execute('CREATE INDEX IF NOT EXISTS sources_accessed ON sources (accessed)')
+        self.mConnection.commit()
+
+    def _accessCounters(self, n: int) -> typing.List[int]:
+        # requires self.mLock. "accessed" is an increasing counter instead of a time stamp, so that the LRU order
+        # does not depend on the clock resolution. It continues from the largest value in the database, which
+        # might have been written by other processes.
+        last = self.mConnection.execute('SELECT MAX(accessed) FROM sources').fetchone()[0] or 0
+        return list(range(int(last) + 1, int(last) + 1 + n))
+
+    def _writeAccesses(self):
+        # requires self.mLock. Writes the pending accesses, the caller commits.
+        if len(self.mAccessed) > 0:
+            paths = list(self.mAccessed.keys())
+            self.mAccessed.clear()
+            self.mConnection.executemany('UPDATE sources SET accessed = ? WHERE path = ?',
+                                         list(zip(self._accessCounters(len(paths)), paths)))
+
+    def path(self) -> str:
+        """
+        Returns the path of the SQLite database
+        :return: str
+        """
+        return self.mPath
+
+    def __len__(self):
+        with self.mLock:
+            return self.mConnection.execute('SELECT COUNT(*) FROM sources').fetchone()[0]
+
+    def get(self, path: str, signature: tuple = None) -> typing.Optional[RasterSourceInfo]:
+        """
+        Returns the cached RasterSourceInfo of a source, if its file size and modification time did not change
+        :param path: str
+        :param signature: tuple (size, mtime), optional, as returned by fileSignature(path)
+        :return: RasterSourceInfo or None
+        """
+        if signature is None:
+            signature = fileSignature(path)
+        return self.getMany([(path, signature)]).get(path)
+
+    def getMany(self, items: typing.List[typing.Tuple[str, tuple]]) -> typing.Dict[str, RasterSourceInfo]:
+        """
+        Returns the valid cached RasterSourceInfos for multiple sources.
+        The accesses are written with the next putMany or every SOURCE_INFO_CACHE_ACCESS_BATCH cache hits.
+        :param items: [list-of-(path, signature)]
+        :return: {path: RasterSourceInfo}
+        """
+        results = dict()
+        signatures = {path: signature for path, signature in items if signature is not None}
+        if len(signatures) == 0:
+            return results
+        paths = list(signatures.keys())
+        with self.mLock:
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                rows = self.mConnection.execute(
+                    'SELECT path, size, mtime, info FROM sources WHERE path IN ({})'.format(
+                        ','.join('?' * len(chunk))), chunk).fetchall()
+                for path, size, mtime, info in rows:
+                    if signatures[path] == (size, mtime):
+                        results[path] = RasterSourceInfo.fromDict(json.loads(info))
+            for path in results.keys():
+                # move to the end, i.e. most recent access
+                self.mAccessed.pop(path, None)
+                self.mAccessed[path] = None
+            if len(self.mAccessed) >= SOURCE_INFO_CACHE_ACCESS_BATCH:
+                self._writeAccesses()
+                self.mConnection.commit()
+        return results
+
+    def put(self, info: RasterSourceInfo, signature: tuple = None):
+        """
+        Adds or updates a RasterSourceInfo
+        :param info: RasterSourceInfo
+        :param signature: tuple (size, mtime), optional, as returned by fileSignature(path)
+        """
+        if signature is None:
+            signature = fileSignature(info.path)
+        self.putMany([(info, signature)])
+
+    def putMany(self, items: typing.List[typing.Tuple[RasterSourceInfo, tuple]]):
+        """
+        Adds or updates multiple RasterSourceInfos
+        :param items: [list-of-(RasterSourceInfo, signature)]
+        """
+        rows = [(info.path, signature[0], signature[1], json.dumps(asdict(info)))
+                for info, signature in items if signature is not None]
+        if len(rows) == 0:
+            return
+        with self.mLock:
+            self._writeAccesses()
+            rows = [(path, size, mtime, accessed, info)
+                    for (path, size, mtime, info), accessed in zip(rows, self._accessCounters(len(rows)))]
+            self.mConnection.executemany('INSERT OR REPLACE INTO sources (path, size, mtime, accessed, info) '
+                                         'VALUES (?, ?, ?, ?, ?)', rows)
+            n = self.mConnection.execute('SELECT COUNT(*) FROM sources').fetchone()[0]
+            if n > self.mMaxEntries:
+                # remove least recently used entries
+                self.mConnection.execute('DELETE FROM sources WHERE path IN '
+                                         '(SELECT path FROM sources ORDER BY accessed ASC LIMIT ?)',
+                                         (n - self.mMaxEntries,))
+            self.mConnection.commit()
+
+    def clear(self):
+        """
+        Removes all cached entries
+        """
+        with self.mLock:
+            self.mAccessed.clear()
+            self.mConnection.execute('DELETE FROM sources')
+            self.mConnection.commit()
+
+
+_SOURCE_INFO_CACHE = ...
+
+
+def sourceInfoCache() -> typing.Optional[SourceInfoCache]:
+    """
+    Returns the SourceInfoCache used by readSourceInfos. By default, this is a persistent cache
+    at SOURCE_INFO_CACHE_PATH, which is created on first use.
+    :return: SourceInfoCache or None, if caching is disabled
+    """
+    global _SOURCE_INFO_CACHE
+    if _SOURCE_INFO_CACHE is ...:
+        try:
+            _SOURCE_INFO_CACHE = SourceInfoCache(SOURCE_INFO_CACHE_PATH)
+        except (OSError, sqlite3.Error) as ex:
+            print('Unable to open source info cache: {}'.format(ex), file=sys.stderr)
+            _SOURCE_INFO_CACHE = None
+    return _SOURCE_INFO_CACHE
+
+
+def setSourceInfoCache(cache: typing.Optional[SourceInfoCache]):
+    """
+    Sets the SourceInfoCache used by readSourceInfos
+    :param cache: SourceInfoCache or None, to disable caching
+    """
+    global _SOURCE_INFO_CACHE
+    assert cache is None or isinstance(cache, SourceInfoCache)
+    _SOURCE_INFO_CACHE = cache
+
+
+def readSourceInfos(paths: typing.List[typing.Union[str, pathlib.Path]],
+                    maxWorkers: int = None,
+                    raiseErrors: bool = True,
+                    useCache: bool = True) -> typing.List[typing.Optional[RasterSourceInfo]]:
+    """
+    Reads the RasterSourceInfos of multiple raster sources concurrently in a thread pool.
+    Sources whose file size and modification time did not change are taken from the sourceInfoCache().
+    :param paths: list of source paths
+    :param maxWorkers: int, number of threads. Defaults to SOURCE_INFO_WORKERS. Use 1 to read sources sequentially.
+    :param raiseErrors: bool, set False to return None for sources that can not be opened.
+    :param useCache: bool, set False to ignore the sourceInfoCache()
+    :return: [list-of-RasterSourceInfo] in same order as the input paths
+    """
+    paths = [p.as_posix() if isinstance(p, pathlib.Path) else p for p in paths]
+    if maxWorkers is None:
+        maxWorkers = SOURCE_INFO_WORKERS
+    maxWorkers = max(1, min(maxWorkers, len(paths)))
+    cache = sourceInfoCache() if useCache else None
+
+    def read(path: str) -> typing.Optional[RasterSourceInfo]:
+        try:
+            return RasterSourceInfo.fromPath(path)
+        except Exception as ex:
+            if raiseErrors:
+                raise ex
+            return None
+
+    def mapPaths(func, values: list) -> list:
+        if maxWorkers == 1 or len(values) < 2:
+            return [func(v) for v in values]
+        with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+            return list(pool.map(func, values))
+
+    if cache is None:
+        return mapPaths(read, paths)
+
+    uniquePaths = list(dict.fromkeys(paths))
+    signatures = dict(zip(uniquePaths, mapPaths(fileSignature, uniquePaths)))
+    infos = cache.getMany(list(signatures.items()))
+    missing = [p for p in uniquePaths if p not in infos]
+    newInfos = mapPaths(read, missing)
+    cache.putMany([(info, signatures[p]) for p, info in zip(missing, newInfos) if info is not None])
+    infos.update(zip(missing, newInfos))
+    return [infos[p] for p in paths]
+
+
+def sourceInfo(path: typing.Union[str, pathlib.Path]) -> RasterSourceInfo:
+    """
+    Returns the RasterSourceInfo of a single raster source, if possible from the sourceInfoCache()
+    :param path: str | pathlib.Path
+    :return: RasterSourceInfo
+    """
+    return readSourceInfos([path], maxWorkers=1)[0]
+
+
+def sourceWindows(srcGTs, srcSizes, dstGT: tuple, dstXSize: int, dstYSize: int) \
+        -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculates the source and destination windows (SrcRect, DstRect) of many north-up source rasters in
+    a north-up destination raster at once. Follows the logic used by gdalbuildvrt.
+    :param srcGTs: array-like of shape (N, 6), source geo-transformation tuples
+    :param srcSizes: array-like of shape (N, 2), source raster sizes (width, height) in pixel
+    :param dstGT: destination geo-transformation tuple
+    :param dstXSize: destination raster width in pixel
+    :param dstYSize: destination raster height in pixel
+    :return: (srcWindows, dstWindows, valid), two (N, 4) arrays of (xOff, yOff, xSize, ySize) windows and a
+             boolean array of length N that is False for sources that do not intersect the destination grid
+    """
+    srcGTs = np.asarray(srcGTs, dtype=np.float64).reshape(-1, 6)
+    srcSizes = np.asarray(srcSizes, dtype=np.float64).reshape(-1, 2)
+    assert np.all(srcGTs[:, 2] == 0) and np.all(srcGTs[:, 4] == 0), \
+        'rotated source geo-transformations are not supported'
+
+    dstXMin = dstGT[0]
+    dstYMax = dstGT[3]
+    dstXMax = dstXMin + dstXSize * dstGT[1]
+    dstYMin = dstYMax + dstYSize * dstGT[5]
+
+    srcXMin = srcGTs[:, 0]
+    srcYMax = srcGTs[:, 3]
+    srcXMax = srcXMin + srcSizes[:, 0] * srcGTs[:, 1]
+    srcYMin = srcYMax + srcSizes[:, 1] * srcGTs[:, 5]
+
+    valid = ~((srcXMax <= dstXMin) | (srcXMin >= dstXMax) | (srcYMin >= dstYMax) | (srcYMax <= dstYMin))
+
+    left = srcXMin < dstXMin
+    srcXOff = np.where(left, (dstXMin - srcXMin) / srcGTs[:, 1], 0.0)
+    dstXOff = np.where(left, 0.0, (srcXMin - dstXMin) / dstGT[1])
+
+    top = dstYMax < srcYMax
+    srcYOff = np.where(top, (srcYMax - dstYMax) / -srcGTs[:, 5], 0.0)
+    dstYOff = np.where(top, 0.0, (dstYMax - srcYMax) / -dstGT[5])
+
+    srcXWin = srcSizes[:, 0] - srcXOff
+    srcYWin = srcSizes[:, 1] - srcYOff
+
+    scaleX = srcGTs[:, 1] / dstGT[1]
+    scaleY = srcGTs[:, 5] / dstGT[5]
+
+    dstXWin = srcXWin * scaleX
+    dstYWin = srcYWin * scaleY
+
+    clipX = dstXOff + dstXWin > dstXSize
+    dstXWin = np.where(clipX, dstXSize - dstXOff, dstXWin)
+    srcXWin = np.where(clipX, dstXWin / scaleX, srcXWin)
+
+    clipY = dstYOff + dstYWin > dstYSize
+    dstYWin = np.where(clipY, dstYSize - dstYOff, dstYWin)
+    srcYWin = np.where(clipY, dstYWin / scaleY, srcYWin)
+
+    valid &= (srcXWin > 0) & (srcYWin > 0) & (dstXWin > 0) & (dstYWin > 0)
+
+    return np.column_stack((srcXOff, srcYOff, srcXWin, srcYWin)), \
+        np.column_stack((dstXOff, dstYOff, dstXWin, dstYWin)), valid
+
+
+def sourceWindow(srcGT: tuple, srcXSize: int, srcYSize: int,
+                 dstGT: tuple, dstXSize: int, dstYSize: int) -> typing.Optional[typing.Tuple[tuple, tuple]]:
+    """
+    Calculates the source and destination windows (SrcRect, DstRect) that describe how a north-up source
+    raster is placed into a north-up destination raster. See sourceWindows to calculate many windows at once.
+    :param srcGT: source geo-transformation tuple
+    :param srcXSize: source raster width in pixel
+    :param srcYSize: source raster height in pixel
+    :param dstGT: destination geo-transformation tuple
+    :param dstXSize: destination raster width in pixel
+    :param dstYSize: destination raster height in pixel
+    :return: ((xOff, yOff, xSize, ySize), (xOff, yOff, xSize, ySize)) or None, if the source does not intersect
+    """
+    srcWin, dstWin, valid = sourceWindows([srcGT], [(srcXSize, srcYSize)], dstGT, dstXSize, dstYSize)
+    if not valid[0]:
+        return None
+    return tuple(srcWin[0].tolist()), tuple(dstWin[0].tolist())
+
+
+def _xmlNumber(value: float) -> str:
+    """
+    Formats a number like GDAL does in VRT XML, i.e. integer values without decimals.
+    """
+    value = float(value)
+    if math.isnan(value):
+        return 'nan'
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return '{:.16g}'.format(value)
+
+
+def _sourceFilename(path: str, dirVRT: str) -> typing.Tuple[str, int]:
+    """
+    Returns the source filename as it should be written into a VRT, and the value of the relativeToVRT attribute.
+    Like gdalbuildvrt, paths are only written relative to the VRT if the source is located below the VRT directory.
+    """
+    if dirVRT and os.path.isabs(path):
+        try:
+            rel = os.path.relpath(path, dirVRT)
+        except ValueError:
+            # e.g. different drives on windows
+            rel = None
+        if rel and not rel.startswith('..'):
+            return pathlib.Path(rel).as_posix(), 1
+    return path, 0
+
+
+def vrtSourceXML(info: RasterSourceInfo, bandIndex: int, dstGT: tuple, dstXSize: int, dstYSize: int,
+                 dirVRT: str = None, indent: str = '    ',
+                 windows: typing.Tuple[tuple, tuple] = None) -> typing.Optional[str]:
+    """
+    Returns the XML of a SimpleSource or ComplexSource element that places the band of a raster source into
+    the destination grid. Sources with a no-data value are described as ComplexSource, as gdalbuildvrt does.
+    :param info: RasterSourceInfo
+    :param bandIndex: band index of the source band, starting at 0
+    :param dstGT: destination geo-transformation
+    :param dstXSize: destination raster width in pixel
+    :param dstYSize: destination raster height in pixel
+    :param dirVRT: directory of the VRT, used to write relative source paths
+    :param indent: indentation of the source element
+    :param windows: (SrcRect, DstRect) tuple as returned by sourceWindow, if already known
+    :return: str or None, if the source is outside the destination grid
+    """
+    if windows is None:
+        windows = sourceWindow(info.geoTransform, info.rasterXSize, info.rasterYSize, dstGT, dstXSize, dstYSize)
+    if windows is None:
+        return None
+    srcWin, dstWin = windows
+
+    noData = info.noDataValues[bandIndex] if bandIndex < len(info.noDataValues) else None
+    tag = 'SimpleSource' if noData is None else 'ComplexSource'
+    filename, relativeToVRT = _sourceFilename(info.path, dirVRT)
+    blockXSize, blockYSize = info.blockSizes[bandIndex] if bandIndex < len(info.blockSizes) else (0, 0)
+    i1 = indent + '  '
+    lines = ['{}<{}>'.format(indent, tag),
+             '{}<SourceFilename relativeToVRT="{}">{}</SourceFilename>'.format(i1, relativeToVRT, escape(filename)),
+             '{}<SourceBand>{}</SourceBand>'.format(i1, bandIndex + 1),
+             '{}<SourceProperties RasterXSize="{}" RasterYSize="{}" DataType="{}" '
+             'BlockXSize="{}" BlockYSize="{}" />'.format(i1, info.rasterXSize, info.rasterYSize,
+                                                        gdal.GetDataTypeName(info.dataTypes[bandIndex]),
+                                                        blockXSize, blockYSize),
+             '{}<SrcRect xOff="{}" yOff="{}" xSize="{}" ySize="{}" />'.format(i1, *[_xmlNumber(v) for v in srcWin]),
+             '{}<DstRect xOff="{}" yOff="{}" xSize="{}" ySize="{}" />'.format(i1, *[_xmlNumber(v) for v in dstWin])]
+    if noData is not None:
+        lines.append('{}<NODATA>{}</NODATA>'.format(i1, _xmlNumber(noData)))
+    lines.append('{}</{}>'.format(indent, tag))
+    return '\n'.join(lines)
+
+
+class _VSIWriter(object):
+    """
+    Buffered writer that writes text to local files as well as GDAL virtual file systems like /vsimem/
+    """
+
+    def __init__(self, path: str, bufferLines: int = VRT_WRITE_BUFFER_LINES):
+        self.mPath = path
+        self.mFile = gdal.VSIFOpenL(path, 'wb')
+        assert self.mFile is not None, 'Unable to open {} for writing'.format(path)
+        self.mBuffer = []
+        self.mBufferLines = bufferLines
+
+    def write(self, line: str):
+        self.mBuffer.append(line)
+        if len(self.mBuffer) >= self.mBufferLines:
+            self.flush()
+
+    def flush(self):
+        if len(self.mBuffer) > 0:
+            data = ('\n'.join(self.mBuffer) + '\n').encode('utf-8')
+            gdal.VSIFWriteL(data, 1, len(data), self.mFile)
+            self.mBuffer.clear()
+
+    def close(self):
+        self.flush()
+        gdal.VSIFCloseL(self.mFile)
+        self.mFile = None
+
+
+def vrtBandSourcesXML(sources: typing.List[typing.Tuple[str, int]],
+                      sourceInfos: typing.Dict[str, RasterSourceInfo],
+                      geoTransform: tuple, rasterXSize: int, rasterYSize: int,
+                      dirVRT: str = None) -> str:
+    """
+    Returns the XML of all sources of a virtual band
+    :param sources: [(source path, source band index), ...]
+    :param sourceInfos: dictionary with a RasterSourceInfo for each source path
+    :param geoTransform: geo-transformation of the VRT
+    :param rasterXSize: VRT width in pixel
+    :param rasterYSize: VRT height in pixel
+    :param dirVRT: directory of the VRT, used to write relative source paths
+    :return: str
+    """
+    if len(sources) == 0:
+        return ''
+    infos = [sourceInfos[path] for path, _ in sources]
+    srcWindows, dstWindows, valid = sourceWindows([info.geoTransform for info in infos],
+                                                  [(info.rasterXSize, info.rasterYSize) for info in infos],
+                                                  geoTransform, rasterXSize, rasterYSize)
+    srcWindows = srcWindows.tolist()
+    dstWindows = dstWindows.tolist()
+    lines = []
+    for i in np.flatnonzero(valid).tolist():
+        lines.append(vrtSourceXML(infos[i], sources[i][1], geoTransform, rasterXSize, rasterYSize, dirVRT=dirVRT,
+                                  windows=(srcWindows[i], dstWindows[i])))
+    return '\n'.join(lines)
+
+
+def vrtDirectory(pathVRT: str) -> typing.Optional[str]:
+    """
+    Returns the directory that relative source paths of a VRT refer to, or None for GDAL virtual file systems
+    :param pathVRT: str
+    :return: str
+    """
+    if pathVRT.startswith('/vsi'):
+        return None
+    return os.path.dirname(os.path.abspath(pathVRT))
+
+
+def _firstDataType(bands: typing.List[typing.Tuple[str, typing.List[typing.Tuple[str, int]]]],
+                   sourceInfos: typing.Dict[str, RasterSourceInfo]) -> int:
+    # the data type of the first source band, or Float32 if there is none
+    for _, sources in bands:
+        if len(sources) > 0:
+            path, bandIndex = sources[0]
+            return sourceInfos[path].dataTypes[bandIndex]
+    return gdal.GDT_Float32
+
+
+def writeVRT(pathVRT: typing.Union[str, pathlib.Path],
+             rasterXSize: int,
+             rasterYSize: int,
+             geoTransform: tuple,
+             bands: typing.List[typing.Tuple[str, typing.List[typing.Tuple[str, int]]]],
+             sourceInfos: typing.Dict[str, RasterSourceInfo],
+             wkt: str = None,
+             dataType: int = None,
+             noData: float = None,
+             bandSourcesXML: typing.List[typing.Optional[str]] = None,
+             overviewList: typing.List[int] = None,
+             overviewResampling: str = 'AVERAGE') -> str:
+    """
+    Writes a VRT in a single pass, without opening the sources again.
+    :param pathVRT: path of the VRT, can be a local file or a GDAL virtual file, like /vsimem/my.vrt
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param geoTransform: geo-transformation tuple
+    :param bands: list of virtual bands, each described as (band name, [(source path, source band index), ...])
+    :param sourceInfos: dictionary with a RasterSourceInfo for each source path
+    :param wkt: str, the spatial reference system as WKT
+    :param dataType: the GDAL data type of all virtual bands. Defaults to the type of the first source band.
+    :param noData: no-data value of all virtual bands
+    :param bandSourcesXML: optional, the source XML of each band, as returned by vrtBandSourcesXML, e.g. from a
+                           previous save. The XML of bands with None is created from the sourceInfos.
+    :param overviewList: decimation factors like [2, 4, 8] of virtual overviews that GDAL creates from the
+                         overviews of the sources
+    :param overviewResampling: resampling algorithm of the virtual overviews
+    :return: str, the VRT path
+    """
+    if isinstance(pathVRT, pathlib.Path):
+        pathVRT = pathVRT.as_posix()
+
+    if dataType is None:
+        dataType = _firstDataType(bands, sourceInfos)
+
+    dirVRT = vrtDirectory(pathVRT)
+    dataTypeName = gdal.GetDataTypeName(dataType)
+    writer = _VSIWriter(pathVRT)
+    try:
+        writer.write('<VRTDataset rasterXSize="{}" rasterYSize="{}">'.format(rasterXSize, rasterYSize))
+        if wkt:
+            writer.write('  <SRS>{}</SRS>'.format(escape(wkt)))
+        writer.write('  <GeoTransform>{}</GeoTransform>'.format(
+            ', '.join('{:.16e}'.format(v) for v in geoTransform)))
+        if overviewList:
+            writer.write('  <OverviewList resampling={}>{}</OverviewList>'.format(
+                quoteattr(overviewResampling.lower()), ' '.join(str(f) for f in overviewList)))
+
+        for b, (name, sources) in enumerate(bands):
+            writer.write('  <VRTRasterBand dataType={} band="{}">'.format(quoteattr(dataTypeName), b + 1))
+            if noData is not None:
+                writer.write('    <NoDataValue>{}</NoDataValue>'.format(_xmlNumber(noData)))
+            if name:
+                writer.write('    <Description>{}</Description>'.format(escape(name)))
+            xml = bandSourcesXML[b] if bandSourcesXML is not None else None
+            if xml is None:
+                xml = vrtBandSourcesXML(sources, sourceInfos, geoTransform, rasterXSize, rasterYSize, dirVRT=dirVRT)
+            if xml:
+                writer.write(xml)
+            writer.write('  </VRTRasterBand>')
+        writer.write('</VRTDataset>')
+    finally:
+        writer.close()
+
+    return pathVRT
+
+
+def childVRTDirectory(pathVRT: str) -> str:
+    """
+    Returns the directory that contains the child VRTs of a hierarchical VRT, i.e. <directory>/<basename>.VRTs
+    :param pathVRT: str
+    :return: str
+    """
+    return os.path.splitext(pathVRT)[0] + '.VRTs'
+
+
+def writeHierarchicalVRT(pathVRT: typing.Union[str, pathlib.Path],
+                         rasterXSize: int,
+                         rasterYSize: int,
+                         geoTransform: tuple,
+                         bands: typing.List[typing.Tuple[str, typing.List[typing.Tuple[str, int]]]],
+                         sourceInfos: typing.Dict[str, RasterSourceInfo],
+                         wkt: str = None,
+                         dataType: int = None,
+                         noData: float = None,
+                         maxSources: int = VRT_MAX_SOURCES,
+                         overviewList: typing.List[int] = None,
+                         overviewResampling: str = 'AVERAGE') -> typing.List[str]:
+    """
+    Writes a VRT of VRTs. The raster grid is split like a quadtree, until each cell intersects with at most
+    maxSources sources. Each leaf cell is written as child VRT that references its sources, each inner cell as
+    child VRT that references the VRTs of its up to four sub-cells. The VRT at pathVRT is the root cell.
+    Child VRTs are written into childVRTDirectory(pathVRT). Like this, GDAL only opens and scans the VRTs of
+    cells that are read, instead of one list with all sources.
+    Cells are not split any further if this does not reduce the number of sources, e.g. of stacked sources.
+    :param pathVRT: path of the VRT
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param geoTransform: geo-transformation tuple
+    :param bands: list of virtual bands, each described as (band name, [(source path, source band index), ...])
+    :param sourceInfos: dictionary with a RasterSourceInfo for each source path
+    :param wkt: str, the spatial reference system as WKT
+    :param dataType: the GDAL data type of all virtual bands. Defaults to the type of the first source band.
+    :param noData: no-data value of all virtual bands
+    :param maxSources: max. number of sources per VRT
+    :param overviewList: decimation factors of virtual overviews of the root VRT, see writeVRT
+    :param overviewResampling: resampling algorithm of the virtual overviews
+    :return: [list-of-str], the paths of the child VRTs
+    """
+    if isinstance(pathVRT, pathlib.Path):
+        pathVRT = pathVRT.as_posix()
+    assert maxSources > 0
+    if dataType is None:
+        dataType = _firstDataType(bands, sourceInfos)
+
+    paths = sorted(set(path for _, sources in bands for path, _ in sources))
+    infos = [sourceInfos[path] for path in paths]
+    if len(paths) > 0:
+        _, dstWindows, valid = sourceWindows([info.geoTransform for info in infos],
+                                             [(info.rasterXSize, info.rasterYSize) for info in infos],
+                                             geoTransform, rasterXSize, rasterYSize)
+    else:
+        dstWindows, valid = np.zeros((0, 4)), np.zeros(0, dtype=bool)
+    xMin, yMin = dstWindows[:, 0], dstWindows[:, 1]
+    xMax, yMax = xMin + dstWindows[:, 2], yMin + dstWindows[:, 3]
+
+    dirChildren = childVRTDirectory(pathVRT)
+    if not pathVRT.startswith('/vsi'):
+        os.makedirs(dirChildren, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pathVRT))[0]
+    nb = len(bands)
+    bandNames = [name for name, _ in bands]
+    children = []
+
+    def cellSources(indices: np.ndarray, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        return indices[(xMin[indices] < x1) & (xMax[indices] > x0) & (yMin[indices] < y1) & (yMax[indices] > y0)]
+
+    def writeCell(key: str, indices: np.ndarray, x0: int, y0: int, x1: int, y1: int) -> RasterSourceInfo:
+        path = pathVRT if key == '' else '{}/{}.q{}.vrt'.format(dirChildren, stem, key)
+        gt = (geoTransform[0] + x0 * geoTransform[1] + y0 * geoTransform[2], geoTransform[1], geoTransform[2],
+              geoTransform[3] + x0 * geoTransform[4] + y0 * geoTransform[5], geoTransform[4], geoTransform[5])
+        xSize, ySize = x1 - x0, y1 - y0
+
+        cells = []
+        if len(indices) > maxSources and xSize > 1 and ySize > 1:
+            xm, ym = x0 + xSize // 2, y0 + ySize // 2
+            for q, (cx0, cy0, cx1, cy1) in enumerate([(x0, y0, xm, ym), (xm, y0, x1, ym),
+                                                      (x0, ym, xm, y1), (xm, ym, x1, y1)]):
+                cellIndices = cellSources(indices, cx0, cy0, cx1, cy1)
+                if len(cellIndices) > 0:
+                    cells.append((key + str(q), cellIndices, cx0, cy0, cx1, cy1))
+            if all(len(cell[1]) == len(indices) for cell in cells):
+                cells = []
+
+        if len(cells) == 0:
+            used = set(paths[i] for i in indices.tolist())
+            cellBands = [(name, [s for s in sources if s[0] in used]) for name, sources in bands]
+            cellInfos = sourceInfos
+        else:
+            cellInfos = {info.path: info for info in [writeCell(*cell) for cell in cells]}
+            cellBands = [(name, [(p, b) for p in cellInfos.keys()]) for b, name in enumerate(bandNames)]
+
+        writeVRT(path, xSize, ySize, gt, cellBands, cellInfos, wkt=wkt, dataType=dataType, noData=noData,
+                 overviewList=overviewList if key == '' else None, overviewResampling=overviewResampling)
+        if key != '':
+            children.append(path)
+        # VRT bands have a default block size of 128x128 pixel
+        return RasterSourceInfo(path=path, rasterXSize=xSize, rasterYSize=ySize, geoTransform=gt, wkt=wkt or '',
+                                dataTypes=[dataType] * nb, noDataValues=[noData] * nb, bandNames=bandNames,
+                                blockSizes=[(128, 128)] * nb)
+
+    writeCell('', np.flatnonzero(valid), 0, 0, rasterXSize, rasterYSize)
+    return children
+
+
+def removeUnusedChildVRTs(pathVRT: str, used: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Removes child VRTs of a hierarchical VRT that are not used anymore
+    :param pathVRT: str, path of the VRT
+    :param used: paths of child VRTs that are still used
+    :return: [list-of-str] with paths of removed files
+    """
+    dirChildren = childVRTDirectory(pathVRT)
+    if pathVRT.startswith('/vsi'):
+        names = gdal.ReadDir(dirChildren) or []
+    elif os.path.isdir(dirChildren):
+        names = os.listdir(dirChildren)
+    else:
+        names = []
+    prefix = os.path.splitext(os.path.basename(pathVRT))[0] + '.q'
+    used = set(os.path.normpath(p) for p in used)
+    removed = []
+    for name in names:
+        path = dirChildren + '/' + name
+        if name.startswith(prefix) and name.endswith('.vrt') and os.path.normpath(path) not in used:
+            if gdal.Unlink(path) == 0:
+                removed.append(path)
+    if len(removed) > 0 and len(used) == 0 and not pathVRT.startswith('/vsi') and len(os.listdir(dirChildren)) == 0:
+        os.rmdir(dirChildren)
+    return removed
+
+
+def _ringWkt(ring: np.ndarray) -> typing.Optional[str]:
+    # WKT polygon of a footprint outline, ignoring points that could not be reprojected
+    ring = ring[np.isfinite(ring).all(axis=1)]
+    if len(ring) < 3:
+        return None
+    ring = np.vstack((ring, ring[0:1]))
+    return 'POLYGON(({}))'.format(', '.join('{} {}'.format(_xmlNumber(x), _xmlNumber(y)) for x, y in ring.tolist()))
+
+
+def writeTileIndex(pathIndex: typing.Union[str, pathlib.Path],
+                   tiles: typing.List[typing.Tuple[str, np.ndarray, typing.Optional[str]]],
+                   wkt: str,
+                   geoTransform: tuple,
+                   rasterXSize: int,
+                   rasterYSize: int,
+                   bandCount: int,
+                   dataType: int,
+                   noData: float = None,
+                   layerName: str = GTI_LAYER_NAME) -> typing.Tuple[int, int]:
+    """
+    Writes a GDAL raster tile index (GTI) into a GeoPackage. Each tile is a feature with the tile footprint as
+    geometry, the tile location in the GTI_LOCATION_FIELD and its mosaic order in the GTI_SORT_FIELD.
+    The GTI_SIGNATURE_FIELD stores a hash of the tile signature and footprint.
+    The layer metadata describes the raster grid, the number of bands and their data type.
+    GDAL opens the index as raster with "GTI:<pathIndex>", or directly, if the file name ends with ".gti.gpkg".
+
+    An existing index is updated: only tiles that are new are inserted, tiles that are not listed anymore are
+    removed and the order of the others is updated. Tiles whose signature or footprint changed are replaced.
+    The layer is created again if its CRS differs.
+    :param pathIndex: path of the GeoPackage
+    :param tiles: [(location, footprint outline, signature), ...] in mosaic order, i.e. later tiles are drawn on top.
+                  Locations are raster paths or GDAL connection strings. Footprints are arrays of shape (P, 2)
+                  in the index CRS. Signatures are optional strings that change with the tile file,
+                  e.g. derived from its fileSignature().
+    :param wkt: CRS of the raster as WKT
+    :param geoTransform: geo-transformation of the raster
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param bandCount: number of bands
+    :param dataType: GDAL data type of all bands
+    :param noData: no-data value of all bands
+    :param layerName: name of the layer
+    :return: (number of inserted tiles, number of removed tiles)
+    """
+    if isinstance(pathIndex, pathlib.Path):
+        pathIndex = pathIndex.as_posix()
+    assert geoTransform[2] == 0 and geoTransform[4] == 0, 'rotated geo-transformations are not supported'
+
+    ds: ogr.DataSource = None
+    if gdal.VSIStatL(pathIndex) is not None:
+        ds = ogr.Open(pathIndex, update=1)
+    if ds is None:
+        ds = ogr.GetDriverByName('GPKG').CreateDataSource(pathIndex)
+    assert ds is not None, 'Unable to open {}'.format(pathIndex)
+
+    layer: ogr.Layer = ds.GetLayerByName(layerName)
+    if layer is not None:
+        srs = layer.GetSpatialRef()
+        if srs is None or not isSameCrs(srs.ExportToWkt(), wkt):
+            ds.DeleteLayer(layerName)
+            layer = None
+    if layer is None:
+        srs = spatialReference(wkt).Clone()
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        layer = ds.CreateLayer(layerName, srs=srs, geom_type=ogr.wkbPolygon)
+    for name, fieldType in [(GTI_LOCATION_FIELD, ogr.OFTString),
+                            (GTI_SORT_FIELD, ogr.OFTInteger),
+                            (GTI_SIGNATURE_FIELD, ogr.OFTString)]:
+        # indices written by former versions have no signature field
+        if layer.GetLayerDefn().GetFieldIndex(name) < 0:
+            layer.CreateField(ogr.FieldDefn(name, fieldType))
+
+    xMin = geoTransform[0]
+    yMax = geoTransform[3]
+    metadata = {'LOCATION_FIELD': GTI_LOCATION_FIELD,
+                'SORT_FIELD': GTI_SORT_FIELD,
+                'RESX': _xmlNumber(abs(geoTransform[1])),
+                'RESY': _xmlNumber(abs(geoTransform[5])),
+                'MINX': _xmlNumber(xMin),
+                'MAXX': _xmlNumber(xMin + rasterXSize * geoTransform[1]),
+                'MINY': _xmlNumber(yMax + rasterYSize * geoTransform[5]),
+                'MAXY': _xmlNumber(yMax),
+                'BAND_COUNT': str(bandCount),
+                'DATA_TYPE': gdal.GetDataTypeName(dataType)}
+    if noData is not None:
+        metadata['NODATA'] = _xmlNumber(noData)
+    layer.SetMetadata(metadata)
+
+    order = {location: i for i, (location, _, _) in enumerate(tiles)}
+    # {location: (footprint WKT, hash of signature and footprint)} of tiles with a known footprint
+    geometries = dict()
+    for location, ring, signature in tiles:
+        geometryWkt = _ringWkt(ring)
+        if geometryWkt is not None:
+            key = json.dumps([signature, geometryWkt])
+            geometries[location] = (geometryWkt, hashlib.sha1(key.encode('utf-8')).hexdigest())
+    existing = set()
+    removed = 0
+    layer.StartTransaction()
+    try:
+        layer.ResetReading()
+        # features are not changed while reading the layer
+        features = [(f.GetFID(), f.GetField(GTI_LOCATION_FIELD), f.GetField(GTI_SORT_FIELD),
+                     f.GetField(GTI_SIGNATURE_FIELD)) for f in layer]
+        for fid, location, priority, signature in features:
+            if location not in geometries or location in existing or signature != geometries[location][1]:
+                layer.DeleteFeature(fid)
+                removed += 1
+            else:
+                existing.add(location)
+                if priority != order[location]:
+                    feature = layer.GetFeature(fid)
+                    feature.SetField(GTI_SORT_FIELD, order[location])
+                    layer.SetFeature(feature)
+        inserted = 0
+        defn = layer.GetLayerDefn()
+        for location, _, _ in tiles:
+            if location in existing or location not in geometries:
+                continue
+            geometryWkt, signature = geometries[location]
+            feature = ogr.Feature(defn)
+            feature.SetField(GTI_LOCATION_FIELD, location)
+            feature.SetField(GTI_SORT_FIELD, order[location])
+            feature.SetField(GTI_SIGNATURE_FIELD, signature)
+            feature.SetGeometry(ogr.CreateGeometryFromWkt(geometryWkt))
+            layer.CreateFeature(feature)
+            existing.add(location)
+            inserted += 1
+        layer.CommitTransaction()
+    except Exception:
+        layer.RollbackTransaction()
+        raise
+    finally:
+        layer = None
+        ds = None
+    return inserted, removed
+
+
+def resampleAlgorithms() -> typing.Dict[str, int]:
+    """
+    Returns the resampling algorithms available in GDAL
+    :return: {name: gdal.GRA_* constant}
+    """
+    return {k[4:]: v for k, v in gdal.__dict__.items() if k.startswith('GRA_')}
+
+
+def resampleAlgorithm(value: typing.Union[str, int, None]) -> int:
+    """
+    Returns the gdal.GRA_* constant of a resampling algorithm
+    :param value: gdal.GRA_* constant, name like 'NearestNeighbour' or 'Bilinear' (case-insensitive),
+                  gdalwarp name like 'near' or 'cubic' or None for nearest neighbour resampling
+    :return: int
+    """
+    algs = resampleAlgorithms()
+    if value is None:
+        return gdal.GRA_NearestNeighbour
+    if isinstance(value, int):
+        assert value in algs.values(), 'Unknown resampling algorithm "{}"'.format(value)
+        return value
+    names = {k.lower(): v for k, v in algs.items()}
+    names['near'] = names['nearest'] = gdal.GRA_NearestNeighbour
+    assert value.lower() in names, 'Unknown resampling algorithm "{}"'.format(value)
+    return names[value.lower()]
+
+
+def spatialReference(value: typing.Union[str, osr.SpatialReference]) -> osr.SpatialReference:
+    """
+    Returns an osr.SpatialReference with traditional GIS axis order (x = easting / longitude)
+    :param value: osr.SpatialReference | WKT | any user input accepted by osr, like 'EPSG:4326'
+    :return: osr.SpatialReference
+    """
+    if isinstance(value, osr.SpatialReference):
+        srs = value.Clone()
+    else:
+        srs = osr.SpatialReference()
+        assert srs.SetFromUserInput(value) == 0, 'Unable to read spatial reference from "{}"'.format(value)
+    if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+
+class CrsCache(object):
+    """
+    Process-wide cache of parsed spatial references, CRS comparisons and coordinate transformations,
+    with hit and miss counters. osr objects are cached per thread, as they must not be shared between threads.
+    """
+
+    def __init__(self):
+        self.mLock = threading.Lock()
+        self.mLocal = threading.local()
+        # {(crs A, crs B): bool}
+        self.mSameCrs: typing.Dict[typing.Tuple[str, str], bool] = dict()
+        # {crs: normalised key}
+        self.mKeys: typing.Dict[str, str] = dict()
+        # {'srs' | 'same' | 'key' | 'transform': [hits, misses]}
+        self.mCounts: typing.Dict[str, typing.List[int]] = {'srs': [0, 0], 'same': [0, 0], 'key': [0, 0],
+                                                            'transform': [0, 0]}
+
+    def _count(self, kind: str, hit: bool):
+        with self.mLock:
+            self.mCounts[kind][0 if hit else 1] += 1
+
+    def _threadCache(self, name: str) -> dict:
+        cache = getattr(self.mLocal, name, None)
+        if cache is None:
+            cache = dict()
+            setattr(self.mLocal, name, cache)
+        return cache
+
+    def spatialReference(self, value: str) -> osr.SpatialReference:
+        """
+        Returns the cached osr.SpatialReference of a CRS. The returned object must not be modified.
+        :param value: WKT or any user input accepted by osr, like 'EPSG:4326'
+        :return: osr.SpatialReference
+        """
+        cache = self._threadCache('srs')
+        srs = cache.get(value)
+        self._count('srs', srs is not None)
+        if srs is None:
+            srs = cache[value] = spatialReference(value)
+        return srs
+
+    def isSameCrs(self, crsA: str, crsB: str) -> bool:
+        """
+        Returns True if two CRS are the same, see isSameCrs
+        :param crsA: WKT or any user input accepted by osr
+        :param crsB: WKT or any user input accepted by osr
+        :return: bool
+        """
+        key = (crsA, crsB)
+        same = self.mSameCrs.get(key)
+        self._count('same', same is not None)
+        if same is None:
+            same = bool(self.spatialReference(crsA).IsSame(self.spatialReference(crsB)))
+            self.mSameCrs[key] = self.mSameCrs[(crsB, crsA)] = same
+        return same
+
+    def crsKey(self, crs: str) -> str:
+        """
+        Returns a normalised key of a CRS, which is the same for different WKT variants of a CRS with
+        an authority code
+        :param crs: WKT or any user input accepted by osr
+        :return: str, the authority code like 'EPSG:32633', or the WKT exported by osr if the CRS has none
+        """
+        key = self.mKeys.get(crs)
+        self._count('key', key is not None)
+        if key is None:
+            # identifying the EPSG code modifies the srs, so do not use a cached one
+            srs = spatialReference(crs)
+            if not (srs.GetAuthorityName(None) and srs.GetAuthorityCode(None)):
+                try:
+                    srs.AutoIdentifyEPSG()
+                except Exception:
+                    pass
+            name, code = srs.GetAuthorityName(None), srs.GetAuthorityCode(None)
+            key = self.mKeys[crs] = '{}:{}'.format(name, code) if name and code else srs.ExportToWkt()
+        return key
+
+    def transformation(self, srcCrs: str, dstCrs: str) -> osr.CoordinateTransformation:
+        """
+        Returns the cached osr.CoordinateTransformation between two CRS
+        :param srcCrs: WKT or any user input accepted by osr
+        :param dstCrs: WKT or any user input accepted by osr
+        :return: osr.CoordinateTransformation
+        """
+        cache = self._threadCache('transform')
+        key = (srcCrs, dstCrs)
+        trans = cache.get(key)
+        self._count('transform', trans is not None)
+        if trans is None:
+            trans = cache[key] = osr.CoordinateTransformation(self.spatialReference(srcCrs),
+                                                              self.spatialReference(dstCrs))
+        return trans
+
+    def statistics(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        """
+        Returns the number of cache hits and misses
+        :return: {'srs': (hits, misses), 'same': (hits, misses), 'key': (hits, misses), 'transform': (hits, misses)}
+        """
+        with self.mLock:
+            return {k: tuple(v) for k, v in self.mCounts.items()}
+
+    def clear(self):
+        """
+        Removes all cached objects and resets the counters. Caches of other threads are released when these
+        threads call the cache again.
+        """
+        with self.mLock:
+            self.mLocal = threading.local()
+            self.mSameCrs = dict()
+            self.mKeys = dict()
+            for counts in self.mCounts.values():
+                counts[:] = [0, 0]
+
+
+_CRS_CACHE = CrsCache()
+
+
+def crsCache() -> CrsCache:
+    """
+    Returns the process-wide CrsCache
+    :return: CrsCache
+    """
+    return _CRS_CACHE
+
+
+def isSameCrs(wktA: str, wktB: str) -> bool:
+    """
+    Returns True if two WKT strings describe the same coordinate reference system.
+    Sources without CRS are considered to be in the same CRS as any other.
+    :param wktA: str
+    :param wktB: str
+    :return: bool
+    """
+    if wktA == wktB or not wktA or not wktB:
+        return True
+    return crsCache().isSameCrs(wktA, wktB)
+
+
+def crsKey(wkt: str) -> str:
+    """
+    Returns a normalised key of a CRS, see CrsCache.crsKey
+    :param wkt: str
+    :return: str, empty for sources without CRS
+    """
+    if not wkt:
+        return ''
+    return crsCache().crsKey(wkt)
+
+
+@dataclass
+class SourceCrsGroup:
+    """
+    Raster sources that share the same CRS
+    """
+    key: str
+    wkt: str
+    infos: typing.List[RasterSourceInfo] = field(default_factory=list)
+    sameCrs: bool = True
+
+    def paths(self) -> typing.List[str]:
+        return [info.path for info in self.infos]
+
+
+def groupSourcesByCrs(infos: typing.List[RasterSourceInfo], wkt: str) -> typing.List[SourceCrsGroup]:
+    """
+    Groups raster sources by their normalised CRS and compares each group CRS once to a target CRS.
+    WKT variants of the same authority code are put into the same group.
+    :param infos: [list-of-RasterSourceInfo]
+    :param wkt: target CRS
+    :return: [list-of-SourceCrsGroup], ordered by the first source of each group
+    """
+    # most archives have few distinct WKT strings, so normalise each of them only once
+    byWkt: typing.Dict[str, SourceCrsGroup] = dict()
+    byKey: typing.Dict[str, SourceCrsGroup] = dict()
+    for info in infos:
+        group = byWkt.get(info.wkt)
+        if group is None:
+            key = crsKey(info.wkt)
+            group = byKey.get(key)
+            if group is None:
+                group = byKey[key] = SourceCrsGroup(key=key, wkt=info.wkt)
+            byWkt[info.wkt] = group
+        group.infos.append(info)
+
+    dstKey = crsKey(wkt)
+    for group in byKey.values():
+        group.sameCrs = group.key == dstKey or isSameCrs(group.wkt, wkt)
+    return list(byKey.values())
+
+
+def boundsCorners(bounds) -> np.ndarray:
+    """
+    Returns the corner points of rectangles
+    :param bounds: array-like of shape (N, 4) with (xMin, yMin, xMax, yMax) rows, or a single bounds tuple
+    :return: numpy.ndarray of shape (4 * N, 2), the lower-left, upper-left, lower-right and upper-right corner of
+             each rectangle
+    """
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    return bounds[:, [0, 1, 0, 3, 2, 1, 2, 3]].reshape(-1, 2)
+
+
+def cornersBounds(corners) -> np.ndarray:
+    """
+    Returns the bounding boxes of groups of four corner points, e.g. of transformed boundsCorners
+    :param corners: array-like of shape (4 * N, 2)
+    :return: numpy.ndarray of shape (N, 4) with (xMin, yMin, xMax, yMax) rows
+    """
+    corners = np.asarray(corners, dtype=np.float64).reshape(-1, 4, 2)
+    return np.concatenate((corners.min(axis=1), corners.max(axis=1)), axis=1)
+
+
+def coordinateTransformation(srcWkt: str, dstWkt: str) -> osr.CoordinateTransformation:
+    """
+    Returns an osr.CoordinateTransformation between two CRS from the crsCache()
+    :param srcWkt: source CRS
+    :param dstWkt: destination CRS
+    :return: osr.CoordinateTransformation
+    """
+    return crsCache().transformation(srcWkt, dstWkt)
+
+
+def transformPoints(points, srcWkt: str, dstWkt: str) -> np.ndarray:
+    """
+    Transforms points into another CRS with a single osr call
+    :param points: array-like of shape (N, 2)
+    :param srcWkt: source CRS
+    :param dstWkt: destination CRS
+    :return: numpy.ndarray of shape (N, 2), NaN for points that can not be transformed
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return points.copy()
+    pts = np.asarray(coordinateTransformation(srcWkt, dstWkt).TransformPoints(points.tolist()),
+                     dtype=np.float64)[:, 0:2]
+    pts[~np.isfinite(pts)] = np.nan
+    return pts
+
+
+def transformBoundsArray(bounds, srcWkt: str, dstWkt: str) -> np.ndarray:
+    """
+    Transforms many bounds into another CRS and returns the bounding boxes of the transformed corners
+    :param bounds: array-like of shape (N, 4) with (xMin, yMin, xMax, yMax) rows
+    :param srcWkt: source CRS
+    :param dstWkt: destination CRS
+    :return: numpy.ndarray of shape (N, 4)
+    """
+    bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+    if isSameCrs(srcWkt, dstWkt) or len(bounds) == 0:
+        return bounds
+    return cornersBounds(transformPoints(boundsCorners(bounds), srcWkt, dstWkt))
+
+
+def densifyBounds(bounds, densify: int = FOOTPRINT_DENSIFY) -> np.ndarray:
+    """
+    Returns the outlines of rectangles with additional points along each edge
+    :param bounds: array-like of shape (N, 4) with (xMin, yMin, xMax, yMax) rows
+    :param densify: number of points per edge, starting at the edge corner. 1 returns the corners only.
+    :return: numpy.ndarray of shape (N, 4 * densify, 2), counterclockwise rings starting at the lower-left corner
+    """
+    assert densify >= 1
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    xMin, yMin, xMax, yMax = [bounds[:, i:i + 1] for i in range(4)]
+    t = np.linspace(0, 1, densify, endpoint=False).reshape(1, -1)
+    w = xMax - xMin
+    h = yMax - yMin
+    ones = np.ones_like(t)
+    x = np.concatenate((xMin + t * w, xMax * ones, xMax - t * w, xMin * ones), axis=1)
+    y = np.concatenate((yMin * ones, yMin + t * h, yMax * ones, yMax - t * h), axis=1)
+    return np.stack((x, y), axis=2)
+
+
+def ringsBounds(rings) -> np.ndarray:
+    """
+    Returns the bounding boxes of rings, ignoring NaN points
+    :param rings: array-like of shape (N, P, 2)
+    :return: numpy.ndarray of shape (N, 4), NaN for rings without any valid point
+    """
+    rings = np.asarray(rings, dtype=np.float64)
+    valid = np.isfinite(rings).all(axis=2, keepdims=True)
+    lower = np.where(valid, rings, np.inf).min(axis=1)
+    upper = np.where(valid, rings, -np.inf).max(axis=1)
+    bounds = np.concatenate((lower, upper), axis=1)
+    bounds[~valid.any(axis=1)[:, 0]] = np.nan
+    return bounds
+
+
+def transformFootprints(bounds, srcWkt: str, dstWkt: str,
+                        densify: int = FOOTPRINT_DENSIFY) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Transforms the densified outlines of many rectangles into another CRS with a single osr call.
+    Unlike transformBoundsArray, this accounts for edges that become curves, and for rectangles that
+    contain a pole of a geographic destination CRS.
+    :param bounds: array-like of shape (N, 4) with (xMin, yMin, xMax, yMax) rows in the source CRS
+    :param srcWkt: source CRS
+    :param dstWkt: destination CRS
+    :param densify: number of points per edge
+    :return: (rings, bounds), a numpy.ndarray of shape (N, 4 * densify, 2) with the footprint outlines and
+             a numpy.ndarray of shape (N, 4) with their bounding boxes, both in the destination CRS.
+             Points that can not be transformed are NaN.
+    """
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    rings = densifyBounds(bounds, densify=densify)
+    if isSameCrs(srcWkt, dstWkt) or len(bounds) == 0:
+        return rings, bounds.copy()
+    rings = transformPoints(rings.reshape(-1, 2), srcWkt, dstWkt).reshape(rings.shape)
+    result = ringsBounds(rings)
+
+    if crsCache().spatialReference(dstWkt).IsGeographic():
+        # a footprint that contains a pole covers all longitudes up to this pole
+        try:
+            poles = transformPoints([(0, 90), (0, -90)], dstWkt, srcWkt)
+        except Exception:
+            poles = np.full((2, 2), np.nan)
+        for (px, py), column, value in zip(poles.tolist(), [3, 1], [90, -90]):
+            if not (math.isfinite(px) and math.isfinite(py)):
+                continue
+            inside = (bounds[:, 0] <= px) & (px <= bounds[:, 2]) & (bounds[:, 1] <= py) & (py <= bounds[:, 3])
+            result[inside, column] = value
+            result[inside, 0] = -180
+            result[inside, 2] = 180
+    return rings, result
+
+
+class SourceFootprints(object):
+    """
+    The footprints of raster sources in a common CRS
+    """
+
+    def __init__(self, paths: typing.List[str], wkt: str, bounds: np.ndarray,
+                 rings: typing.Dict[int, np.ndarray] = None):
+        """
+        :param paths: [list-of-str], source paths
+        :param wkt: CRS of the footprints
+        :param bounds: numpy.ndarray of shape (N, 4), footprint bounding boxes, NaN if unknown
+        :param rings: {source index: numpy.ndarray of shape (P, 2)}, footprint outlines of reprojected sources
+        """
+        assert len(paths) == len(bounds)
+        self.mPaths = list(paths)
+        self.mWkt = wkt
+        self.mBounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        self.mRings = dict() if rings is None else rings
+        self.mIndex = {path: i for i, path in enumerate(self.mPaths)}
+
+    @staticmethod
+    def fromSourceInfos(infos: typing.List[RasterSourceInfo], wkt: str,
+                        densify: int = FOOTPRINT_DENSIFY) -> 'SourceFootprints':
+        """
+        Calculates source footprints. The footprints of all sources that share a CRS are transformed at once.
+        :param infos: [list-of-RasterSourceInfo]
+        :param wkt: CRS of the footprints
+        :param densify: number of points per edge used to reproject footprints
+        :return: SourceFootprints
+        """
+        bounds = np.asarray([info.bounds() for info in infos], dtype=np.float64).reshape(-1, 4)
+        rings = dict()
+        indices = {id(info): i for i, info in enumerate(infos)}
+        for group in groupSourcesByCrs(infos, wkt):
+            if not group.sameCrs:
+                groupIndices = [indices[id(info)] for info in group.infos]
+                groupRings, bounds[groupIndices] = transformFootprints(bounds[groupIndices], group.wkt, wkt,
+                                                                       densify=densify)
+                rings.update(zip(groupIndices, groupRings))
+        return SourceFootprints([info.path for info in infos], wkt, bounds, rings=rings)
+
+    def __len__(self):
+        return len(self.mPaths)
+
+    def __contains__(self, path: str):
+        return path in self.mIndex
+
+    def paths(self) -> typing.List[str]:
+        return self.mPaths[:]
+
+    def wkt(self) -> str:
+        return self.mWkt
+
+    def bounds(self, path: str = None) -> typing.Union[np.ndarray, typing.Tuple[float, float, float, float]]:
+        """
+        Returns footprint bounding boxes
+        :param path: str, optional, a source path
+        :return: tuple (xMin, yMin, xMax, yMax) of the source, or a numpy.ndarray of shape (N, 4) with the bounding
+                 boxes of all sources
+        """
+        if path is None:
+            return self.mBounds.copy()
+        return tuple(self.mBounds[self.mIndex[path]].tolist())
+
+    def footprint(self, path: str) -> np.ndarray:
+        """
+        Returns the footprint outline of a source
+        :param path: str
+        :return: numpy.ndarray of shape (P, 2), the corners of sources in the footprint CRS or the densified
+                 outline of reprojected sources
+        """
+        i = self.mIndex[path]
+        ring = self.mRings.get(i)
+        if ring is None:
+            ring = densifyBounds(self.mBounds[i], densify=1)[0]
+        return ring.copy()
+
+    def validBounds(self) -> typing.List[typing.Tuple[str, typing.Tuple[float, float, float, float]]]:
+        """
+        Returns the sources whose footprint is known
+        :return: [(path, (xMin, yMin, xMax, yMax)), ...]
+        """
+        valid = np.isfinite(self.mBounds).all(axis=1)
+        return [(self.mPaths[i], tuple(b)) for i, b in zip(np.flatnonzero(valid).tolist(),
+                                                           self.mBounds[valid].tolist())]
+
+    def union(self) -> typing.Optional[typing.Tuple[float, float, float, float]]:
+        """
+        Returns the bounding box of all footprints
+        :return: tuple (xMin, yMin, xMax, yMax) or None, if no footprint is known
+        """
+        bounds = self.mBounds[np.isfinite(self.mBounds).all(axis=1)]
+        if len(bounds) == 0:
+            return None
+        return (float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+                float(bounds[:, 2].max()), float(bounds[:, 3].max()))
+
+
+def transformBounds(bounds: tuple, srcWkt: str, dstWkt: str) -> typing.Tuple[float, float, float, float]:
+    """
+    Transforms bounds into another CRS and returns the bounding box of the transformed corners
+    :param bounds: tuple (xMin, yMin, xMax, yMax)
+    :param srcWkt: source CRS
+    :param dstWkt: destination CRS
+    :return: tuple (xMin, yMin, xMax, yMax)
+    """
+    if isSameCrs(srcWkt, dstWkt):
+        return tuple(bounds)
+    return tuple(transformBoundsArray([bounds], srcWkt, dstWkt)[0].tolist())
+
+
+def _geoTransforms(gt) -> np.ndarray:
+    """
+    Returns one or many geo-transformation tuples as array of shape (N, 6), N = 1 for a single tuple
+    """
+    return np.asarray(gt, dtype=np.float64).reshape(-1, 6)
+
+
+def px2geoArray(px, gt) -> np.ndarray:
+    """
+    Returns the geo-coordinates of pixel positions
+    :param px: array-like of shape (N, 2) with (x, y) pixel positions
+    :param gt: GDAL geo-transformation tuple, or array-like of shape (N, 6) with one geo-transformation per position
+    :return: numpy.ndarray of shape (N, 2)
+    """
+    px = np.asarray(px, dtype=np.float64).reshape(-1, 2)
+    gt = _geoTransforms(gt)
+    gx = gt[:, 0] + px[:, 0] * gt[:, 1] + px[:, 1] * gt[:, 2]
+    gy = gt[:, 3] + px[:, 0] * gt[:, 4] + px[:, 1] * gt[:, 5]
+    return np.column_stack((gx, gy))
+
+
+def geo2pxFArray(geo, gt) -> np.ndarray:
+    """
+    Returns the pixel positions related to geo-coordinates in floating point precision.
+    :param geo: array-like of shape (N, 2) with (x, y) geo-coordinates
+    :param gt: GDAL geo-transformation tuple, or array-like of shape (N, 6) with one geo-transformation per position
+    :return: numpy.ndarray of shape (N, 2)
+    """
+    geo = np.asarray(geo, dtype=np.float64).reshape(-1, 2)
+    gt = _geoTransforms(gt)
+    px = (geo[:, 0] - gt[:, 0]) / gt[:, 1]  # x pixel
+    py = (geo[:, 1] - gt[:, 3]) / gt[:, 5]  # y pixel
+    return np.column_stack((px, py))
+
+
+def geo2pxArray(geo, gt) -> np.ndarray:
+    """
+    Returns the pixel positions related to geo-coordinates as integer numbers.
+    Floating-point coordinates are truncated, e.g. (0.815, 23.42) is returned as (0, 23)
+    :param geo: array-like of shape (N, 2) with (x, y) geo-coordinates
+    :param gt: GDAL geo-transformation tuple, or array-like of shape (N, 6) with one geo-transformation per position
+    :return: numpy.ndarray of shape (N, 2) and type int64
+    """
+    return np.trunc(geo2pxFArray(geo, gt)).astype(np.int64)
+
+
+def px2geo(px: typing.Tuple[float, float], gt: tuple) -> typing.Tuple[float, float]:
+    """
+    Returns the geo-coordinate of a pixel position
+    :param px: tuple (x, y) pixel position
+    :param gt: GDAL geo-transformation tuple
+    :return: tuple (x, y)
+    """
+    return tuple(px2geoArray(px, gt)[0].tolist())
+
+
+def geo2pxF(geo: typing.Tuple[float, float], gt: tuple) -> typing.Tuple[float, float]:
+    """
+    Returns the pixel position related to a geo-coordinate in floating point precision.
+    :param geo: tuple (x, y) geo-coordinate
+    :param gt: GDAL geo-transformation tuple, as described in http://www.gdal.org/gdal_datamodel.html
+    :return: tuple (x, y) pixel position
+    """
+    return tuple(geo2pxFArray(geo, gt)[0].tolist())
+
+
+def geo2px(geo: typing.Tuple[float, float], gt: tuple) -> typing.Tuple[int, int]:
+    """
+    Returns the pixel position related to a geo-coordinate as integer number.
+    Floating-point coordinate are casted to integer coordinate, e.g. (0.815, 23.42) is returned as (0, 23)
+    :param geo: tuple (x, y) geo-coordinate
+    :param gt: GDAL geo-transformation tuple
+    :return: tuple (x, y) pixel position
+    """
+    return tuple(geo2pxArray(geo, gt)[0].tolist())
+
+
+def geotransform(upperLeft: typing.Tuple[float, float], resolution: typing.Tuple[float, float]) -> tuple:
+    """
+    Creates a north-up GDAL geo-transformation tuple
+    :param upperLeft: tuple (x, y), upper left image corner
+    :param resolution: tuple (xRes, yRes), positive pixel size
+    :return: tuple
+    """
+    assert resolution[0] > 0
+    assert resolution[1] > 0
+    return upperLeft[0], resolution[0], 0, upperLeft[1], 0, -resolution[1]
+
+
+def alignPointsToGrid(pixelSize: typing.Tuple[float, float],
+                      gridRefPoint: typing.Tuple[float, float],
+                      points) -> np.ndarray:
+    """
+    Shifts points onto a grid defined by a pixel size and a reference point
+    :param pixelSize: tuple (xRes, yRes)
+    :param gridRefPoint: tuple (x, y), point on the reference grid, or array-like of shape (N, 2) with one
+                         reference point per point
+    :param points: array-like of shape (N, 2) with (x, y) points to align to the reference grid
+    :return: numpy.ndarray of shape (N, 2)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    ref = np.asarray(gridRefPoint, dtype=np.float64).reshape(-1, 2)
+    res = np.asarray(pixelSize, dtype=np.float64).reshape(1, 2)
+    return ref + res * np.round((points - ref) / res)
+
+
+def alignRectanglesToGrid(pixelSize: typing.Tuple[float, float],
+                          gridRefPoint: typing.Tuple[float, float],
+                          bounds) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the bounds and raster sizes of rectangles aligned to the pixel size and reference grid
+    :param pixelSize: tuple (xRes, yRes)
+    :param gridRefPoint: tuple (x, y), a reference grid location, i.e. a pixel corner, or array-like of shape (N, 2)
+                         with one reference location per rectangle
+    :param bounds: array-like of shape (N, 4) with (xMin, yMin, xMax, yMax) rows, the extents to get aligned
+    :return: tuple (bounds, sizes), a numpy.ndarray of shape (N, 4) and an int64 numpy.ndarray of shape (N, 2)
+             with the (ns, nl) of each rectangle
+    """
+    w, h = pixelSize
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    ul = alignPointsToGrid(pixelSize, gridRefPoint, bounds[:, [0, 3]])
+    lr = alignPointsToGrid(pixelSize, gridRefPoint, bounds[:, [2, 1]])
+    xMin, yMax = ul[:, 0], ul[:, 1]
+
+    ns = np.maximum(1, np.round((lr[:, 0] - xMin) / w)).astype(np.int64)
+    nl = np.maximum(1, np.round((yMax - lr[:, 1]) / h)).astype(np.int64)
+    return np.column_stack((xMin, yMax - nl * h, xMin + ns * w, yMax)), np.column_stack((ns, nl))
+
+
+def alignPointToGrid(pixelSize: typing.Tuple[float, float],
+                     gridRefPoint: typing.Tuple[float, float],
+                     gridPoint: typing.Tuple[float, float]) -> typing.Tuple[float, float]:
+    """
+    Shifts a point onto a grid defined by a pixel size and a reference point
+    :param pixelSize: tuple (xRes, yRes)
+    :param gridRefPoint: tuple (x, y), point on the reference grid
+    :param gridPoint: tuple (x, y), point to align to the reference grid
+    :return: tuple (x, y)
+    """
+    return tuple(alignPointsToGrid(pixelSize, gridRefPoint, gridPoint)[0].tolist())
+
+
+def alignRectangleToGrid(pixelSize: typing.Tuple[float, float],
+                         gridRefPoint: typing.Tuple[float, float],
+                         bounds: typing.Tuple[float, float, float, float]) \
+        -> typing.Tuple[typing.Tuple[float, float, float, float], typing.Tuple[int, int]]:
+    """
+    Returns the bounds and raster size of a rectangle aligned to the pixel size and reference grid
+    :param pixelSize: tuple (xRes, yRes)
+    :param gridRefPoint: tuple (x, y), a reference grid location, i.e. a pixel corner
+    :param bounds: tuple (xMin, yMin, xMax, yMax), the extent to get aligned
+    :return: tuple ((xMin, yMin, xMax, yMax), (ns, nl))
+    """
+    aligned, sizes = alignRectanglesToGrid(pixelSize, gridRefPoint, bounds)
+    return tuple(aligned[0].tolist()), tuple(sizes[0].tolist())
+
+
+class SpatialIndex(object):
+    """
+    A static R-tree of bounding boxes, packed with the Sort-Tile-Recursive (STR) algorithm.
+    """
+
+    def __init__(self, items: typing.List[typing.Tuple[typing.Any, typing.Tuple[float, float, float, float]]],
+                 nodeCapacity: int = 16):
+        """
+        :param items: [list-of-(id, (xMin, yMin, xMax, yMax))]
+        :param nodeCapacity: maximum number of children per node
+        """
+        assert nodeCapacity > 1
+        self.mIds = [i for i, _ in items]
+        self.mNodeCapacity = nodeCapacity
+        # a node is a tuple (xMin, yMin, xMax, yMax, children), children is the item index of leaf entries
+        nodes = [(b[0], b[1], b[2], b[3], i) for i, (_, b) in enumerate(items)]
+        while len(nodes) > nodeCapacity:
+            nodes = self._pack(nodes)
+        self.mRoot = nodes
+
+    def _pack(self, nodes: list) -> list:
+        M = self.mNodeCapacity
+        nParents = math.ceil(len(nodes) / M)
+        nSlices = math.ceil(math.sqrt(nParents))
+        nodes = sorted(nodes, key=lambda n: n[0] + n[2])
+        sliceSize = nSlices * M
+        parents = []
+        for s in range(0, len(nodes), sliceSize):
+            tile = sorted(nodes[s:s + sliceSize], key=lambda n: n[1] + n[3])
+            for c in range(0, len(tile), M):
+                children = tile[c:c + M]
+                parents.append((min(n[0] for n in children), min(n[1] for n in children),
+                                max(n[2] for n in children), max(n[3] for n in children), children))
+        return parents
+
+    def __len__(self):
+        return len(self.mIds)
+
+    def bounds(self) -> typing.Optional[typing.Tuple[float, float, float, float]]:
+        """
+        Returns the bounding box of all items
+        :return: tuple (xMin, yMin, xMax, yMax) or None, if the index is empty
+        """
+        if len(self.mRoot) == 0:
+            return None
+        return (min(n[0] for n in self.mRoot), min(n[1] for n in self.mRoot),
+                max(n[2] for n in self.mRoot), max(n[3] for n in self.mRoot))
+
+    def intersects(self, bounds: typing.Tuple[float, float, float, float]) -> typing.List[typing.Any]:
+        """
+        Returns the ids of all items whose bounding box intersects or touches the bounds
+        :param bounds: tuple (xMin, yMin, xMax, yMax)
+        :return: [list-of-ids] in order of the items the index was created with
+        """
+        xMin, yMin, xMax, yMax = bounds
+        found = []
+        stack = [self.mRoot]
+        while len(stack) > 0:
+            for n in stack.pop():
+                if n[0] <= xMax and n[2] >= xMin and n[1] <= yMax and n[3] >= yMin:
+                    if isinstance(n[4], int):
+                        found.append(n[4])
+                    else:
+                        stack.append(n[4])
+        return [self.mIds[i] for i in sorted(found)]
+
+
+def createVRT(pathVRT: typing.Union[str, pathlib.Path],
+              bands: typing.List[typing.Tuple[str, typing.List[typing.Tuple[str, int]]]],
+              wkt: str,
+              geoTransform: tuple,
+              rasterXSize: int,
+              rasterYSize: int,
+              resampleAlg: int = gdal.GRA_NearestNeighbour,
+              noData: float = None,
+              dataType: int = None,
+              maxWorkers: int = None) -> str:
+    """
+    Creates a VRT from virtual band definitions.
+    Sources in another CRS are warped into VRTs that are stored in <directory>/<basename>.WarpedImages/,
+    see warpSources. Warped sources that are not used anymore are removed from this directory.
+    :param pathVRT: path of the VRT
+    :param bands: list of virtual bands, each described as (band name, [(source path, source band index), ...])
+    :param wkt: CRS of the VRT
+    :param geoTransform: geo-transformation of the VRT
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param resampleAlg: gdal.GRA_* resampling algorithm used to warp sources
+    :param noData: no-data value of all virtual bands
+    :param dataType: the GDAL data type of all virtual bands, see writeVRT
+    :param maxWorkers: number of threads used to read source properties, see readSourceInfos
+    :return: str, the VRT path
+    """
+    if isinstance(pathVRT, pathlib.Path):
+        pathVRT = pathVRT.as_posix()
+    assert pathVRT.endswith('.vrt')
+
+    sources = list(dict.fromkeys(path for _, bandSources in bands for path, _ in bandSources))
+    assert len(sources) >= 1 or dataType is not None, 'VRT needs to define at least 1 input source'
+
+    infos = readSourceInfos(sources, maxWorkers=maxWorkers)
+    srcInfos = warpSources(pathVRT, infos, wkt, geoTransform, rasterXSize, rasterYSize, resampleAlg=resampleAlg)
+
+    bands = [(name, [(srcInfos[path].path, bandIndex) for path, bandIndex in bandSources])
+             for name, bandSources in bands]
+    used = [info.path for path, info in srcInfos.items() if info.path != path]
+    srcInfos = {info.path: info for info in srcInfos.values()}
+
+    writeVRT(pathVRT, rasterXSize, rasterYSize, geoTransform, bands, srcInfos, wkt=wkt,
+             dataType=dataType, noData=noData)
+    removeUnusedWarpedSources(pathVRT, used)
+    return pathVRT
+
+
+def warpedDirectory(pathVRT: str) -> str:
+    """
+    Returns the directory that contains the warped sources of a VRT, i.e. <directory>/<basename>.WarpedImages
+    :param pathVRT: str
+    :return: str
+    """
+    if pathVRT.startswith('/vsi'):
+        return os.path.splitext(pathVRT)[0] + '.WarpedImages'
+    return os.path.join(os.path.dirname(pathVRT), os.path.splitext(os.path.basename(pathVRT))[0] + '.WarpedImages')
+
+
+def warpedSourceName(info: RasterSourceInfo, wkt: str, xRes: float, yRes: float, outputBounds: tuple,
+                     resampleAlg: int) -> str:
+    """
+    Returns the file name of a warped source. It is derived from a hash of the source path, its size and
+    modification time and the warp parameters, so that a warped source can be reused as long as these do not change.
+    :return: str, like warped.<source basename>.<hash>.vrt
+    """
+    signature = fileSignature(info.path)
+    if signature is None:
+        # e.g. a /vsimem/ source, whose changes can not be detected
+        digest = uuid.uuid4().hex
+    else:
+        key = json.dumps([info.path, signature, wkt, xRes, yRes, list(outputBounds), resampleAlg])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return 'warped.{}.{}.vrt'.format(os.path.basename(info.path), digest[0:20])
+
+
+def warpSources(pathVRT: str,
+                infos: typing.List[RasterSourceInfo],
+                wkt: str,
+                geoTransform: tuple,
+                rasterXSize: int,
+                rasterYSize: int,
+                resampleAlg: int = gdal.GRA_NearestNeighbour) -> typing.Dict[str, RasterSourceInfo]:
+    """
+    Warps sources that are not in the VRT CRS into VRTs that are stored in the warpedDirectory(pathVRT).
+    Warped sources are named by warpedSourceName and reused, if they already exist.
+    The RasterSourceInfos of warped sources are read with readSourceInfos, i.e. taken from the sourceInfoCache().
+    :param pathVRT: path of the VRT
+    :param infos: [list-of-RasterSourceInfo] of the sources
+    :param wkt: CRS of the VRT
+    :param geoTransform: geo-transformation of the VRT
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param resampleAlg: gdal.GRA_* resampling algorithm
+    :return: {source path: RasterSourceInfo of the source or its warped VRT}
+    """
+    dirWarped = warpedDirectory(pathVRT)
+    inVSI = pathVRT.startswith('/vsi')
+
+    xRes = geoTransform[1]
+    yRes = abs(geoTransform[5])
+    outputBounds = (geoTransform[0], geoTransform[3] - rasterYSize * yRes,
+                    geoTransform[0] + rasterXSize * xRes, geoTransform[3])
+
+    srcInfos = dict()
+    warpedFileNames = dict()
+    for group in groupSourcesByCrs(infos, wkt):
+        if group.sameCrs:
+            srcInfos.update((info.path, info) for info in group.infos)
+            continue
+
+        # reproject, if necessary, based on VRT. All sources of a group share the same warp options.
+        if not inVSI:
+            os.makedirs(dirWarped, exist_ok=True)
+        wops = gdal.WarpOptions(format='VRT',
+                                resampleAlg=resampleAlg,
+                                outputBounds=outputBounds,
+                                outputBoundsSRS=wkt,
+                                xRes=xRes,
+                                yRes=yRes,
+                                dstSRS=wkt)
+        for info in group.infos:
+            pathSrc = info.path
+            name = warpedSourceName(info, wkt, xRes, yRes, outputBounds, resampleAlg)
+            warpedFileName = dirWarped + '/' + name if inVSI else os.path.join(dirWarped, name)
+
+            if gdal.VSIStatL(warpedFileName) is None:
+                # write to a temporary file first, to not reuse incomplete files
+                tmpFileName = warpedFileName + '.{}.tmp'.format(uuid.uuid4().hex)
+                tmp = gdal.Warp(tmpFileName, pathSrc, options=wops)
+                assert isinstance(tmp, gdal.Dataset), 'Unable to warp {}'.format(pathSrc)
+                tmp = None
+                gdal.Rename(tmpFileName, warpedFileName)
+            warpedFileNames[pathSrc] = warpedFileName
+
+    # reused warped VRTs are described by the sourceInfoCache() and do not need to be opened again
+    warpedInfos = readSourceInfos(list(warpedFileNames.values()))
+    srcInfos.update(zip(warpedFileNames.keys(), warpedInfos))
+    return srcInfos
+
+
+def removeUnusedWarpedSources(pathVRT: str, used: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Removes warped sources of a VRT that are not used anymore
+    :param pathVRT: str, path of the VRT
+    :param used: paths of warped sources that are still used
+    :return: [list-of-str] with paths of removed files
+    """
+    dirWarped = warpedDirectory(pathVRT)
+    if pathVRT.startswith('/vsi'):
+        names = gdal.ReadDir(dirWarped) or []
+        paths = [dirWarped + '/' + n for n in names]
+    elif os.path.isdir(dirWarped):
+        paths = [os.path.join(dirWarped, n) for n in os.listdir(dirWarped)]
+    else:
+        paths = []
+    used = set(os.path.normpath(p) for p in used)
+    removed = []
+    for path in paths:
+        name = os.path.basename(path)
+        if name.startswith('warped.') and (name.endswith('.vrt') or name.endswith('.tmp')) \
+                and os.path.normpath(path) not in used:
+            if gdal.Unlink(path) == 0:
+                removed.append(path)
+    return removed
+
+
+class VRTRasterInputSourceBand(object):
+    """
+    A single band of a raster source file that is used as input of a virtual band
+    """
+
+    @staticmethod
+    def fromGDALDataSet(pathOrDataSet):
+        """
+        Returns the VRTRasterInputSourceBands from a raster data source
+        :param pathOrDataSet: str | gdal.Dataset
+        :return: [list-of-VRTRasterInputSourceBand]
+        """
+        srcBands = []
+        if isinstance(pathOrDataSet, pathlib.Path):
+            pathOrDataSet = pathOrDataSet.as_posix()
+        if isinstance(pathOrDataSet, str):
+            # read the number of bands from the source info cache
+            info = sourceInfo(pathOrDataSet)
+            for b in range(info.bandCount()):
+                srcBands.append(VRTRasterInputSourceBand(pathOrDataSet, b))
+            return srcBands
+
+        if isinstance(pathOrDataSet, gdal.Band):
+            pathOrDataSet = pathOrDataSet.GetDataset()
+        elif not isinstance(pathOrDataSet, gdal.Dataset):
+            # e.g. a QgsRasterLayer
+            from vrtbuilder.externals.qps.utils import gdalDataset
+            pathOrDataSet = gdalDataset(pathOrDataSet)
+
+        if isinstance(pathOrDataSet, gdal.Dataset):
+            path = pathOrDataSet.GetFileList()[0]
+            for b in range(pathOrDataSet.RasterCount):
+                srcBands.append(VRTRasterInputSourceBand(path, b))
+        return srcBands
+
+    @staticmethod
+    def fromRasterLayer(layer):
+        """
+        Returns the VRTRasterInputSourceBands of a QgsRasterLayer
+        :param layer: QgsRasterLayer
+        :return: [list-of-VRTRasterInputSourceBand]
+        """
+        from vrtbuilder.externals.qps.utils import qgsRasterLayer
+        layer = qgsRasterLayer(layer)
+        srcBands = []
+        src = layer.source()
+        for b in range(layer.bandCount()):
+            name = layer.bandName(b + 1)
+            srcBands.append(VRTRasterInputSourceBand(src, b, bandName=name))
+
+        return srcBands
+
+    def __init__(self, path: str, bandIndex: int, bandName: str = ''):
+        if isinstance(path, pathlib.Path):
+            path = path.as_posix()
+        assert isinstance(path, str)
+        assert isinstance(bandIndex, int)
+        self.mSource: str = path
+        self.mBandIndex: int = bandIndex
+        self.mBandName: str = bandName
+        self.mNoData = None
+        self.mVirtualBand = None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, VRTRasterInputSourceBand):
+            return False
+        return self.mSource == other.mSource and self.mBandIndex == other.mBandIndex
+
+    def __repr__(self):
+        return f'VRTRasterInputSourceBand {self.mSource}:{self.mBandIndex}'
+
+    def __hash__(self):
+        return hash((self.mSource, self.mBandIndex))
+
+    def name(self) -> str:
+        """
+        Returns the band name
+        :return: str
+        """
+        return self.mBandName
+
+    def bandIndex(self) -> int:
+        """
+        Returns the band index
+        :return: int
+        """
+        return self.mBandIndex
+
+    def source(self) -> str:
+        """
+        Returns the source uri
+        :return: str
+        """
+        return self.mSource
+
+    def isEqual(self, other) -> bool:
+        """
+        Returns True for same input sources
+        :param other: VRTRasterInputSourceBand
+        :return: bool
+        """
+        if isinstance(other, VRTRasterInputSourceBand):
+            return self.mSource == other.mSource and self.mBandIndex == other.mBandIndex
+        else:
+            return False
+
+    def __reduce_ex__(self, protocol):
+
+        return self.__class__, (self.mSource, self.mBandIndex, self.mBandName), self.__getstate__()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('mVirtualBand')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def virtualBand(self):
+        return self.mVirtualBand
+
+    def sourceInfo(self) -> RasterSourceInfo:
+        """
+        Returns the properties of the source raster, if possible without opening it.
+        :return: RasterSourceInfo
+        """
+        return sourceInfo(self.source())
+
+    def toDataset(self) -> gdal.Dataset:
+        """
+        Opens the source as GDAL Dataset
+        :return: gdal.Dataset
+        """
+        ds = gdal.Open(self.source())
+        assert isinstance(ds, gdal.Dataset)
+        return ds
+
+    def toRasterLayer(self):
+        """
+        Opens the source as QgsRasterLayer
+        :return: QgsRasterLayer
+        """
+        from qgis.core import QgsRasterLayer
+        lyr = QgsRasterLayer(self.source(), self.name(), 'gdal')
+        # todo: set renderer to this specific band
+
+        return lyr
+
+
+class VirtualBand(object):
+    """
+    A virtual band, i.e. a named list of input source bands.
+    """
+
+    def __init__(self, name: str = ''):
+        assert isinstance(name, str)
+        self.mName: str = name
+        self.mSources: typing.List[VRTRasterInputSourceBand] = []
+        # {source path: VRTRasterInputSourceBand}, each source file can be used only once per band
+        self.mSourcesByPath: typing.Dict[str, VRTRasterInputSourceBand] = dict()
+        # True if the band has been changed since the VRT was saved last
+        self.mDirty: bool = True
+        # the VirtualRaster this band belongs to
+        self.mRaster = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['mRaster'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for src in self.mSources:
+            src.mVirtualBand = self
+
+    def __iter__(self):
+        return iter(self.mSources)
+
+    def __getitem__(self, slice):
+        return self.mSources[slice]
+
+    def __len__(self):
+        return len(self.mSources)
+
+    def setName(self, name: str) -> bool:
+        """
+        Sets the band name
+        :param name: str
+        :return: bool, True if the name has changed
+        """
+        assert isinstance(name, str)
+        changed = name != self.mName
+        self.mName = name
+        self.mDirty = self.mDirty or changed
+        return changed
+
+    def name(self) -> str:
+        """
+        Returns the band name
+        :return: str
+        """
+        return self.mName
+
+    def insertSource(self, index: int, source: VRTRasterInputSourceBand) -> typing.Optional[int]:
+        """
+        Inserts an input source. Each source file can be used only once per virtual band.
+        :param index: insert position
+        :param source: VRTRasterInputSourceBand
+        :return: the index the source was inserted at or None, if the source file is already used
+        """
+        assert isinstance(source, VRTRasterInputSourceBand)
+        index = min(index, len(self.mSources))
+        if source.source() in self.mSourcesByPath:
+            return None
+        source.mVirtualBand = self
+        self.mSources.insert(index, source)
+        self.mSourcesByPath[source.source()] = source
+        self.mDirty = True
+        if self.mRaster is not None:
+            self.mRaster._registerSource(self, source)
+        return index
+
+    def addSource(self, source: VRTRasterInputSourceBand) -> typing.Optional[int]:
+        """
+        Appends an input source
+        :param source: VRTRasterInputSourceBand
+        :return: the index the source was inserted at or None
+        """
+        return self.insertSource(len(self.mSources), source)
+
+    def removeSource(self, source: typing.Union[str, VRTRasterInputSourceBand]) \
+            -> typing.Optional[typing.Tuple[int, VRTRasterInputSourceBand]]:
+        """
+        Removes an input source
+        :param source: VRTRasterInputSourceBand | str source path
+        :return: (index, VRTRasterInputSourceBand) of the removed source or None
+        """
+        if isinstance(source, str):
+            source = self.mSourcesByPath.get(source)
+        if not isinstance(source, VRTRasterInputSourceBand):
+            return None
+        existing = self.mSourcesByPath.get(source.source())
+        if existing is None or existing != source:
+            return None
+
+        i = self.sourceIndex(existing.source())
+        self.mSources.pop(i)
+        del self.mSourcesByPath[existing.source()]
+        self.mDirty = True
+        if self.mRaster is not None:
+            self.mRaster._unregisterSource(self, existing)
+        return i, existing
+
+    def hasSource(self, path: str) -> bool:
+        """
+        Returns True if the source file is used by this band
+        :param path: str
+        :return: bool
+        """
+        return path in self.mSourcesByPath
+
+    def sourceIndex(self, path: str) -> typing.Optional[int]:
+        """
+        Returns the position of a source file in this band
+        :param path: str
+        :return: int or None, if the source file is not used by this band
+        """
+        src = self.mSourcesByPath.get(path)
+        if src is None:
+            return None
+        for i, s in enumerate(self.mSources):
+            if s is src:
+                return i
+
+    def isDirty(self) -> bool:
+        """
+        Returns True if name or sources have been changed since the VRT was saved last
+        :return: bool
+        """
+        return self.mDirty
+
+    def setDirty(self, dirty: bool = True):
+        self.mDirty = dirty
+
+    def sourceFiles(self) -> typing.List[str]:
+        """
+        Returns the files paths of source files
+        :return: [list-of-str]
+        """
+        return [src.source() for src in self.mSources]
+
+    def __eq__(self, other):
+        if not isinstance(other, VirtualBand):
+            return False
+        return self.mSources == other.mSources
+
+    def __repr__(self):
+        infos = ['VirtualBand name="{}"'.format(self.mName)]
+        for i, info in enumerate(self.mSources):
+            infos.append('\t{} SourceFileName {} SourceBand {}'.format(i + 1, info.mSource, info.mBandIndex))
+        return '\n'.join(infos)
+
+
+class VirtualRaster(object):
+    """
+    The definition of a virtual raster: virtual bands, CRS and raster grid.
+    Coordinates are (x, y) tuples, sizes are (width, height) tuples and the CRS is a WKT string.
+    Instances can be pickled, e.g. to create VRTs in other processes.
+    """
+
+    def __init__(self):
+        self.mBands: typing.List[VirtualBand] = []
+        self.mWkt: typing.Optional[str] = None
+        self.mUL: typing.Optional[typing.Tuple[float, float]] = None
+        self.mResolution: typing.Optional[typing.Tuple[float, float]] = None
+        self.mSize: typing.Optional[typing.Tuple[int, int]] = None
+        self.mResamplingAlg: int = gdal.GRA_NearestNeighbour
+        self.mNoDataValue: typing.Optional[float] = None
+        self.mMaxWorkers: int = SOURCE_INFO_WORKERS
+        self.mMetadata = dict()
+        # ((wkt, source paths), SourceFootprints, SpatialIndex) of source footprints in the raster CRS
+        self.mSourceIndex = None
+        # what has been written by the last saveVRT call
+        self.mSaveState: typing.Optional[VRTSaveState] = None
+        # {source path: {id(VirtualBand): (VirtualBand, VRTRasterInputSourceBand)}} of the bands that use a source,
+        # ordered by first use
+        self.mSourceRegistry: typing.Dict[str, typing.Dict[int, tuple]] = dict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # band ids are not valid in other processes
+        state.pop('mSourceRegistry')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.mSourceRegistry = dict()
+        for band in self.mBands:
+            band.mRaster = self
+            for src in band:
+                self._registerSource(band, src)
+
+    def _registerSource(self, band: VirtualBand, source: VRTRasterInputSourceBand):
+        self.mSourceRegistry.setdefault(source.source(), dict())[id(band)] = (band, source)
+
+    def _unregisterSource(self, band: VirtualBand, source: VRTRasterInputSourceBand):
+        bands = self.mSourceRegistry.get(source.source())
+        if bands is not None:
+            bands.pop(id(band), None)
+            if len(bands) == 0:
+                del self.mSourceRegistry[source.source()]
+
+    def __len__(self):
+        return len(self.mBands)
+
+    def __getitem__(self, slice):
+        return self.mBands[slice]
+
+    def __iter__(self):
+        return iter(self.mBands)
+
+    def __contains__(self, item):
+        return item in self.mBands
+
+    def __eq__(self, other):
+        if not isinstance(other, VirtualRaster):
+            return False
+        if not (self.mSize == other.mSize and
+                (self.mWkt == other.mWkt or (self.mWkt and other.mWkt and isSameCrs(self.mWkt, other.mWkt))) and
+                self.mResolution == other.mResolution and
+                self.mNoDataValue == other.mNoDataValue):
+            return False
+        return self.mBands == other.mBands
+
+    def __repr__(self):
+        info = ['VirtualRasterBuilder: {} bands, {} source files'.format(
+            len(self.mBands), len(self.sourceRaster()))]
+        for vBand in self.mBands:
+            info.append(str(vBand))
+        return '\n'.join(info)
+
+    def setMaxWorkers(self, maxWorkers: int):
+        """
+        Sets the number of threads used to read the properties of source files
+        :param maxWorkers: int, use 1 to read sources sequentially
+        """
+        assert isinstance(maxWorkers, int) and maxWorkers > 0
+        self.mMaxWorkers = maxWorkers
+
+    def maxWorkers(self) -> int:
+        """
+        Returns the number of threads used to read the properties of source files
+        :return: int
+        """
+        return self.mMaxWorkers
+
+    def setResamplingAlg(self, value: typing.Union[str, int, None]) -> bool:
+        """
+        Sets the resampling algorithm used to warp sources
+        :param value: gdal.GRA_* constant, name like 'NearestNeighbour' or None, see resampleAlgorithm
+        :return: bool, True if the algorithm has changed
+        """
+        last = self.mResamplingAlg
+        self.mResamplingAlg = resampleAlgorithm(value)
+        return last != self.mResamplingAlg
+
+    def resamplingAlg(self, asString: bool = False) -> typing.Union[int, str]:
+        """
+        Returns the resampling algorithm
+        :param asString: Set True to return the resampling algorithm name
+        :return: gdal.GRA_* constant | str
+        """
+        if asString:
+            for name, value in resampleAlgorithms().items():
+                if value == self.mResamplingAlg:
+                    return name
+        return self.mResamplingAlg
+
+    def setNoDataValue(self, value: typing.Optional[float]) -> bool:
+        """
+        Sets the no-data value of all virtual bands
+        :param value: float | None
+        :return: bool, True if the value has changed
+        """
+        assert value is None or isinstance(value, (int, float))
+        changed = self.mNoDataValue != value
+        self.mNoDataValue = value
+        return changed
+
+    def noDataValue(self) -> typing.Optional[float]:
+        return self.mNoDataValue
+
+    def wkt(self) -> typing.Optional[str]:
+        """
+        Returns the CRS as WKT
+        :return: str
+        """
+        return self.mWkt
+
+    def srs(self) -> typing.Optional[osr.SpatialReference]:
+        """
+        Returns the CRS as osr.SpatialReference
+        :return: osr.SpatialReference
+        """
+        if not self.mWkt:
+            return None
+        return spatialReference(self.mWkt)
+
+    def setWkt(self, wkt: str, warpArgs: dict = None) -> bool:
+        """
+        Sets the CRS. A defined raster grid gets reprojected into the new CRS, i.e. the new grid covers the
+        former extent, and its resolution is the one suggested by gdal.Warp.
+        If the new WKT describes the same CRS in another notation, the new WKT is kept but the grid remains unchanged
+        :param wkt: str, CRS as WKT
+        :param warpArgs: dict, optional keywords for gdal.WarpOptions used to reproject the grid
+        :return: bool, True if the CRS has changed
+        """
+        if wkt == self.mWkt:
+            return False
+        if wkt and self.mWkt and isSameCrs(wkt, self.mWkt):
+            self.mWkt = wkt
+            return False
+        wktOld = self.mWkt
+        self.mWkt = wkt
+
+        if wktOld and wkt and self.isGridDefined():
+            try:
+                self.mUL, self.mResolution, self.mSize = warpedGrid(wktOld, self.geoTransform(), self.mSize,
+                                                                    wkt, warpArgs=warpArgs)
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+        return True
+
+    def isGridDefined(self) -> bool:
+        """
+        Returns True if the upper-left coordinate, resolution and size of the raster grid are defined
+        :return: bool
+        """
+        return None not in [self.mUL, self.mResolution, self.mSize]
+
+    def initGrid(self, info: RasterSourceInfo = None) -> bool:
+        """
+        Initializes undefined grid properties (CRS, resolution, upper-left coordinate and size) from a source raster
+        :param info: RasterSourceInfo, defaults to that of the first source raster
+        :return: bool, True if grid properties have been changed
+        """
+        if self.mWkt is not None and self.isGridDefined():
+            return False
+        if info is None:
+            sources = self.sourceRaster()
+            if len(sources) == 0:
+                return False
+            info = sourceInfo(sources[0])
+        assert isinstance(info, RasterSourceInfo)
+
+        gt = info.geoTransform
+        if self.mWkt is None:
+            self.mWkt = info.wkt
+        if self.mResolution is None:
+            self.mResolution = (gt[1], abs(gt[5]))
+        if self.mUL is None:
+            bounds = info.bounds()
+            self.mUL = (bounds[0], bounds[3])
+        if self.mSize is None:
+            self.mSize = (info.rasterXSize, info.rasterYSize)
+        return True
+
+    def setResolution(self, resolution: typing.Tuple[float, float]) -> bool:
+        """
+        Sets the pixel size. The upper-left coordinate and raster size are kept.
+        :param resolution: tuple (xRes, yRes)
+        :return: bool, True if the resolution has changed
+        """
+        resolution = (float(resolution[0]), float(resolution[1]))
+        assert resolution[0] > 0 and resolution[1] > 0
+        changed = resolution != self.mResolution
+        self.mResolution = resolution
+        return changed
+
+    def resolution(self) -> typing.Optional[typing.Tuple[float, float]]:
+        return self.mResolution
+
+    def setSize(self, size: typing.Tuple[int, int]) -> bool:
+        """
+        Sets the raster size in pixel
+        :param size: tuple (width, height)
+        :return: bool, True if the size has changed
+        """
+        size = (int(size[0]), int(size[1]))
+        assert size[0] > 0 and size[1] > 0
+        changed = size != self.mSize
+        self.mSize = size
+        return changed
+
+    def size(self) -> typing.Optional[typing.Tuple[int, int]]:
+        return self.mSize
+
+    def ul(self) -> typing.Optional[typing.Tuple[float, float]]:
+        """
+        Returns the upper-left pixel corner coordinate
+        :return: tuple (x, y)
+        """
+        return self.mUL
+
+    def lr(self) -> typing.Optional[typing.Tuple[float, float]]:
+        """
+        Returns the lower-right pixel corner coordinate
+        :return: tuple (x, y)
+        """
+        if not self.isGridDefined():
+            return None
+        return (self.mUL[0] + self.mSize[0] * self.mResolution[0],
+                self.mUL[1] - self.mSize[1] * self.mResolution[1])
+
+    def bounds(self) -> typing.Optional[typing.Tuple[float, float, float, float]]:
+        """
+        Returns the spatial extent
+        :return: tuple (xMin, yMin, xMax, yMax)
+        """
+        lr = self.lr()
+        if lr is None:
+            return None
+        return self.mUL[0], lr[1], lr[0], self.mUL[1]
+
+    def geoTransform(self) -> typing.Optional[tuple]:
+        """
+        Returns the GDAL geo-transformation
+        :return: tuple
+        """
+        if self.mUL is None or self.mResolution is None:
+            return None
+        return geotransform(self.mUL, self.mResolution)
+
+    def setExtent(self, bounds: typing.Tuple[float, float, float, float],
+                  wkt: str = None,
+                  referenceGrid: typing.Tuple[float, float] = None) -> bool:
+        """
+        Sets a new extent, which gets aligned to the pixel grid. This will change the number of pixels.
+        :param bounds: tuple (xMin, yMin, xMax, yMax)
+        :param wkt: CRS of the bounds, defaults to the raster CRS
+        :param referenceGrid: tuple (x, y), a pixel corner of the grid to align to. Defaults to the upper-left
+                              corner of the bounds.
+        :return: bool, True if the extent has changed
+        """
+        last = self.bounds()
+        if wkt and not isSameCrs(wkt, self.mWkt):
+            assert self.mWkt, 'use .setWkt() to specify the coordinate reference system first'
+            bounds = transformBounds(bounds, wkt, self.mWkt)
+            if referenceGrid is not None:
+                referenceGrid = tuple(transformPoints([referenceGrid], wkt, self.mWkt)[0].tolist())
+
+        xMin, yMin, xMax, yMax = bounds
+        if not (all(math.isfinite(v) for v in bounds) and xMax > xMin and yMax > yMin):
+            return False
+        if self.mResolution is None:
+            return False
+
+        if referenceGrid is None:
+            referenceGrid = (xMin, yMax)
+        bounds, size = alignRectangleToGrid(self.mResolution, referenceGrid, bounds)
+        self.mUL = (bounds[0], bounds[3])
+        self.mSize = size
+        return last != self.bounds()
+
+    def alignToGrid(self, pixelSize: typing.Tuple[float, float], refPoint: typing.Tuple[float, float]) -> bool:
+        """
+        Aligns the raster grid to the grid defined by a pixel size and a reference point
+        :param pixelSize: tuple (xRes, yRes), the new resolution
+        :param refPoint: tuple (x, y), a pixel corner of the new grid
+        :return: bool, True if the grid has changed
+        """
+        last = (self.bounds(), self.mResolution)
+        self.setResolution(pixelSize)
+        bounds = last[0]
+        if bounds is not None:
+            bounds, self.mSize = alignRectangleToGrid(self.mResolution, refPoint, bounds)
+            self.mUL = (bounds[0], bounds[3])
+        return last != (self.bounds(), self.mResolution)
+
+    def insertBand(self, index: int, band: VirtualBand) -> VirtualBand:
+        """
+        Inserts a virtual band
+        :param index: insert position
+        :param band: VirtualBand
+        :return: VirtualBand
+        """
+        assert isinstance(band, VirtualBand)
+        assert index <= len(self.mBands)
+        if len(band.name()) == 0:
+            band.setName('Band {}'.format(index + 1))
+        self.mBands.insert(index, band)
+        band.mRaster = self
+        for src in band:
+            self._registerSource(band, src)
+        return band
+
+    def addBand(self, band: VirtualBand = None) -> VirtualBand:
+        """
+        Appends a virtual band
+        :param band: VirtualBand, defaults to a new, empty virtual band
+        :return: VirtualBand
+        """
+        if band is None:
+            band = VirtualBand()
+        return self.insertBand(len(self.mBands), band)
+
+    def removeBands(self, bandsOrIndices: list) -> typing.List[typing.Tuple[int, VirtualBand]]:
+        """
+        Removes virtual bands
+        :param bandsOrIndices: [list-of-VirtualBand | int]
+        :return: [(index, VirtualBand), ...] of removed bands, in descending index order
+        """
+        indices = set()
+        for band in bandsOrIndices:
+            if isinstance(band, VirtualBand):
+                band = [i for i, b in enumerate(self.mBands) if b is band][0]
+            indices.add(band)
+        removed = []
+        for i in sorted(indices, reverse=True):
+            band = self.mBands.pop(i)
+            for src in band:
+                self._unregisterSource(band, src)
+            band.mRaster = None
+            removed.append((i, band))
+        return removed
+
+    def removeInputSource(self, path: str) -> typing.List[typing.Tuple[VirtualBand, int, VRTRasterInputSourceBand]]:
+        """
+        Removes all source bands that relate to an input source file
+        :param path: str
+        :return: [(VirtualBand, index, VRTRasterInputSourceBand), ...] of removed source bands
+        """
+        removed = []
+        for band, src in self.inputSources(path):
+            result = band.removeSource(src)
+            if result is not None:
+                removed.append((band, result[0], result[1]))
+        return removed
+
+    def inputSources(self, path: str) -> typing.List[typing.Tuple[VirtualBand, VRTRasterInputSourceBand]]:
+        """
+        Returns the source bands that relate to an input source file
+        :param path: str
+        :return: [(VirtualBand, VRTRasterInputSourceBand), ...]
+        """
+        return list(self.mSourceRegistry.get(path, dict()).values())
+
+    def sourcePositions(self, path: str) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Returns the positions of an input source file
+        :param path: str
+        :return: [(band index, source index), ...]
+        """
+        bandIndices = {id(b): i for i, b in enumerate(self.mBands)}
+        return sorted((bandIndices[id(band)], band.sourceIndex(path)) for band, _ in self.inputSources(path))
+
+    def hasSource(self, path: str) -> bool:
+        """
+        Returns True if an input source file is used by any virtual band
+        :param path: str
+        :return: bool
+        """
+        return path in self.mSourceRegistry
+
+    def sourceRefCount(self, path: str) -> int:
+        """
+        Returns the number of virtual bands that use an input source file
+        :param path: str
+        :return: int
+        """
+        return len(self.mSourceRegistry.get(path, ()))
+
+    def sourceCount(self) -> int:
+        """
+        Returns the number of unique input source files
+        :return: int
+        """
+        return len(self.mSourceRegistry)
+
+    def sourceRaster(self, bounds: typing.Tuple[float, float, float, float] = None) -> typing.List[str]:
+        """
+        Returns the list of source raster files
+        :param bounds: tuple (xMin, yMin, xMax, yMax), optional, to return only sources that intersect these
+                       bounds in the raster CRS
+        :return: [list-of-str]
+        """
+        sources = list(self.mSourceRegistry.keys())
+        if bounds is None:
+            return sources
+        return self.sourceIndex(sources).intersects(bounds)
+
+    def sourceFootprints(self, sources: typing.List[str] = None) -> SourceFootprints:
+        """
+        Returns the footprints of the source rasters in the raster CRS.
+        Footprints are calculated from the source info cache and reused until the sources or the CRS change.
+        :param sources: [list-of-str], the current sourceRaster(), if already known
+        :return: SourceFootprints
+        """
+        self._updateSourceIndex(sources)
+        return self.mSourceIndex[1]
+
+    def sourceIndex(self, sources: typing.List[str] = None) -> SpatialIndex:
+        """
+        Returns a spatial index of the source raster footprints in the raster CRS.
+        The index is reused until the sources or the CRS change.
+        :param sources: [list-of-str], the current sourceRaster(), if already known
+        :return: SpatialIndex with source paths as ids
+        """
+        self._updateSourceIndex(sources)
+        return self.mSourceIndex[2]
+
+    def _updateSourceIndex(self, sources: typing.List[str] = None):
+        if sources is None:
+            sources = self.sourceRaster()
+        key = (self.mWkt, tuple(sources))
+        if self.mSourceIndex is None or self.mSourceIndex[0] != key:
+            infos = readSourceInfos(sources, maxWorkers=self.mMaxWorkers)
+            footprints = SourceFootprints.fromSourceInfos(infos, self.mWkt)
+            self.mSourceIndex = (key, footprints, SpatialIndex(footprints.validBounds()))
+
+    def addFilesAsMosaic(self, files: list):
+        """
+        Mosaics all input files. All bands will maintain their band position in the virtual raster.
+        :param files: [list-of-file-paths]
+        :return: self
+        """
+        files = [f.as_posix() if isinstance(f, pathlib.Path) else f for f in files]
+        infos = readSourceInfos(files, maxWorkers=self.mMaxWorkers)
+        for file, info in zip(files, infos):
+            for b in range(info.bandCount()):
+                if b + 1 > len(self):
+                    self.addBand()
+                self.mBands[b].addSource(VRTRasterInputSourceBand(file, b))
+        if len(infos) > 0:
+            self.initGrid(infos[0])
+        return self
+
+    def addFilesAsStack(self, files: list):
+        """
+        Stacks all input files, i.e. each band of an input file will be a new virtual band.
+        :param files: [list-of-file-paths]
+        :return: self
+        """
+        files = [f.as_posix() if isinstance(f, pathlib.Path) else f for f in files]
+        infos = readSourceInfos(files, maxWorkers=self.mMaxWorkers)
+        for file, info in zip(files, infos):
+            for b in range(info.bandCount()):
+                self.addBand().addSource(VRTRasterInputSourceBand(file, b))
+        if len(infos) > 0:
+            self.initGrid(infos[0])
+        return self
+
+    def fullSourceRasterExtent(self) -> typing.Optional[typing.Tuple[float, float, float, float]]:
+        """
+        Returns the extent of all source rasters in the raster CRS
+        :return: tuple (xMin, yMin, xMax, yMax)
+        """
+        return self.sourceFootprints().union()
+
+    def loadVRT(self, pathVRT: typing.Union[str, pathlib.Path], bandIndex: int = None):
+        """
+        Loads the virtual bands of an existing VRT and inserts them
+        :param pathVRT: str, path of VRT
+        :param bandIndex: insert position, defaults to the end
+        :return: self
+        """
+        bands, noData = readVRTBands(pathVRT)
+        if bandIndex is None:
+            bandIndex = len(self.mBands)
+        if noData is not None:
+            self.setNoDataValue(noData)
+        for i, band in enumerate(bands):
+            self.insertBand(bandIndex + i, band)
+        self.initGrid()
+        return self
+
+    def saveVRT(self, pathVRT: typing.Union[str, pathlib.Path], incremental: bool = True,
+                overviews: str = None, overviewResampling: str = 'AVERAGE', maxSourcesPerVRT: int = None) -> str:
+        """
+        Writes the VRT. An undefined grid is initialized from the first source raster.
+        Sources outside the raster extent are skipped without being opened or warped.
+
+        If the VRT was saved to the same path before, with the same CRS, grid and resampling algorithm, only the
+        XML of bands whose sources have changed is created again and only new or changed sources are warped.
+        Warped sources are reused across saves and removed when not used anymore, see warpSources.
+
+        Overviews make zoomed-out reads fast, which otherwise read all sources in full resolution:
+        VRT_OVERVIEWS_SOURCES writes an OverviewList, i.e. virtual overviews that GDAL reads from the overviews of
+        the sources, and VRT_OVERVIEWS_BUILD computes the overview levels in parallel into a <pathVRT>.ovr file.
+        An outdated <pathVRT>.ovr file is removed in any case.
+
+        With maxSourcesPerVRT, VRTs with more sources are written as hierarchical VRT of VRTs,
+        see writeHierarchicalVRT. Its child VRTs are written completely on each save.
+
+        :param pathVRT: str, path of the VRT
+        :param incremental: set False to create the VRT and all warped sources from scratch
+        :param overviews: None, VRT_OVERVIEWS_SOURCES or VRT_OVERVIEWS_BUILD
+        :param overviewResampling: resampling algorithm of the overviews, e.g. 'AVERAGE' or 'NEAREST'
+        :param maxSourcesPerVRT: int, max. number of sources per VRT, e.g. VRT_MAX_SOURCES.
+                                 Defaults to None, i.e. a single VRT.
+        :return: str, path of the VRT
+        """
+        assert overviews in [None, VRT_OVERVIEWS_SOURCES, VRT_OVERVIEWS_BUILD], \
+            'Unknown overview mode "{}"'.format(overviews)
+        if isinstance(pathVRT, pathlib.Path):
+            pathVRT = pathVRT.as_posix()
+        assert pathVRT.endswith('.vrt')
+        sources = self.sourceRaster()
+        assert len(sources) >= 1, 'VRT needs to define at least 1 input source'
+        self.initGrid()
+        assert self.isGridDefined(), 'VRT raster grid is undefined'
+
+        gt = self.geoTransform()
+        xSize, ySize = self.mSize
+        dirVRT = vrtDirectory(pathVRT)
+        key = (pathVRT, self.mWkt, gt, self.mSize, self.mResamplingAlg)
+        state = self.mSaveState
+        if not (incremental and isinstance(state, VRTSaveState) and state.key == key
+                and gdal.VSIStatL(pathVRT) is not None):
+            state = VRTSaveState(key)
+
+        # the data type is defined by the first source band, even if it is outside the extent
+        first = [band[0] for band in self.mBands if len(band) > 0][0]
+        dataType = first.sourceInfo().dataTypes[first.bandIndex()]
+
+        visible = self.sourceIndex(sources).intersects(self.bounds())
+        infos = dict(zip(visible, readSourceInfos(visible, maxWorkers=self.mMaxWorkers)))
+
+        # sources that are new, have been changed on disk or whose warped VRT has been removed
+        changed = []
+        for path, info in infos.items():
+            last = state.sources.get(path)
+            if last is None or last[0] != info or \
+                    (last[1].path != path and gdal.VSIStatL(last[1].path) is None):
+                changed.append(path)
+        warped = warpSources(pathVRT, [infos[p] for p in changed], self.mWkt, gt, xSize, ySize,
+                             resampleAlg=self.mResamplingAlg)
+        changed = set(changed)
+        state.sources = {path: state.sources[path] for path in infos.keys() if path not in changed}
+        for path in changed:
+            state.sources[path] = (infos[path], warped[path])
+        effectiveInfos = {info.path: info for _, info in state.sources.values()}
+
+        hierarchical = maxSourcesPerVRT is not None and len(infos) > maxSourcesPerVRT
+        bands = []
+        bandSourcesXML = []
+        for band in self.mBands:
+            bandSources = [(state.sources[s.mSource][1].path, s.mBandIndex) for s in band if s.mSource in infos]
+            last = state.bands.get(id(band))
+            if hierarchical:
+                xml = None
+            elif last is not None and last[0] is band and last[1] is not None and not band.isDirty() and \
+                    not any(s.mSource in changed for s in band):
+                xml = last[1]
+            else:
+                xml = vrtBandSourcesXML(bandSources, effectiveInfos, gt, xSize, ySize, dirVRT=dirVRT)
+            bands.append((band.name(), bandSources))
+            bandSourcesXML.append(xml)
+
+        factors = overviewFactors(xSize, ySize, minSize=VRT_OVERVIEW_MIN_SIZE)
+        overviewList = factors if overviews == VRT_OVERVIEWS_SOURCES else None
+        if hierarchical:
+            children = writeHierarchicalVRT(pathVRT, xSize, ySize, gt, bands, effectiveInfos, wkt=self.mWkt,
+                                            dataType=dataType, noData=self.mNoDataValue, maxSources=maxSourcesPerVRT,
+                                            overviewList=overviewList, overviewResampling=overviewResampling)
+        else:
+            writeVRT(pathVRT, xSize, ySize, gt, bands, effectiveInfos, wkt=self.mWkt, dataType=dataType,
+                     noData=self.mNoDataValue, bandSourcesXML=bandSourcesXML,
+                     overviewList=overviewList, overviewResampling=overviewResampling)
+            children = []
+        removeUnusedChildVRTs(pathVRT, children)
+        if overviews == VRT_OVERVIEWS_BUILD:
+            buildExternalOverviews(pathVRT, factors=factors, resampling=overviewResampling,
+                                   maxWorkers=self.mMaxWorkers)
+        elif gdal.VSIStatL(pathVRT + '.ovr') is not None:
+            gdal.Unlink(pathVRT + '.ovr')
+
+        removeUnusedWarpedSources(pathVRT, [info.path for path, (_, info) in state.sources.items()
+                                            if info.path != path])
+
+        state.bands = {id(band): (band, xml) for band, xml in zip(self.mBands, bandSourcesXML)}
+        state.noData = self.mNoDataValue
+        for band in self.mBands:
+            band.setDirty(False)
+        self.mSaveState = state
+        return pathVRT
+
+    def saveTileIndex(self, pathIndex: typing.Union[str, pathlib.Path], layerName: str = GTI_LAYER_NAME) -> str:
+        """
+        Writes the mosaic as GDAL raster tile index (GTI) into a GeoPackage, see writeTileIndex.
+        GDAL then only opens the tiles that intersect with a read window. Saving to an existing index only inserts
+        new or changed sources and removes the ones that are not used anymore.
+        Footprints are calculated from the current source infos, so that sources that have been rewritten since the
+        sourceFootprints() were calculated get their new footprint.
+        Sources in another CRS are referenced by warped VRTs, like in saveVRT. Sources whose bands are used in another order are referenced as "vrt://" connection
+        strings that select their bands.
+        :param pathIndex: path of the GeoPackage, e.g. "mosaic.gti.gpkg"
+        :param layerName: name of the tile index layer
+        :return: str, path of the GeoPackage
+        """
+        if isinstance(pathIndex, pathlib.Path):
+            pathIndex = pathIndex.as_posix()
+        sources = self.sourceRaster()
+        assert len(sources) >= 1, 'Tile index needs to define at least 1 input source'
+        self.initGrid()
+        assert self.isGridDefined(), 'Raster grid is undefined'
+        gt = self.geoTransform()
+        xSize, ySize = self.mSize
+        nb = len(self.mBands)
+
+        # the source band of each virtual band, in the order of the first virtual band
+        bandIndices: typing.Dict[str, typing.List[typing.Optional[int]]] = dict()
+        for b, band in enumerate(self.mBands):
+            for source in band:
+                bandIndices.setdefault(source.mSource, [None] * nb)[b] = source.mBandIndex
+        incomplete = [path for path, indices in bandIndices.items() if None in indices]
+        assert len(incomplete) == 0, \
+            'Tile indices require each source to contribute to all bands, which {} does not'.format(incomplete[0])
+
+        allPaths = list(bandIndices.keys())
+        allInfos = readSourceInfos(allPaths, maxWorkers=self.mMaxWorkers)
+        footprints = SourceFootprints.fromSourceInfos(allInfos, self.mWkt)
+        visible = set(SpatialIndex(footprints.validBounds()).intersects(self.bounds()))
+        paths = [path for path in allPaths if path in visible]
+        infos = [info for path, info in zip(allPaths, allInfos) if path in visible]
+        warped = warpSources(pathIndex, infos, self.mWkt, gt, xSize, ySize, resampleAlg=self.mResamplingAlg)
+
+        first = [band[0] for band in self.mBands if len(band) > 0][0]
+        dataType = first.sourceInfo().dataTypes[first.bandIndex()]
+        dirIndex = vrtDirectory(pathIndex)
+        tiles = []
+        for path, info in zip(paths, infos):
+            # GTI resolves relative locations relative to the index, but not inside vrt:// connection strings
+            location = _sourceFilename(warped[path].path, dirIndex)[0]
+            indices = bandIndices[path]
+            if indices != list(range(info.bandCount())):
+                location = 'vrt://{}?bands={}'.format(warped[path].path, ','.join(str(i + 1) for i in indices))
+            signature = fileSignature(path)
+            tiles.append((location, footprints.footprint(path), None if signature is None else json.dumps(signature)))
+
+        writeTileIndex(pathIndex, tiles, self.mWkt, gt, xSize, ySize, nb, dataType,
+                       noData=self.mNoDataValue, layerName=layerName)
+        removeUnusedWarpedSources(pathIndex, [info.path for path, info in warped.items() if info.path != path])
+        return pathIndex
+
+    def isDirty(self) -> bool:
+        """
+        Returns True if the VRT has been changed since it was saved last
+        :return: bool
+        """
+        state = self.mSaveState
+        if state is None or state.key[1:] != (self.mWkt, self.geoTransform(), self.mSize, self.mResamplingAlg) \
+                or state.noData != self.mNoDataValue:
+            return True
+        if [id(band) for band in self.mBands] != list(state.bands.keys()):
+            return True
+        return any(band.isDirty() for band in self.mBands)
+
+
+class VRTSaveState(object):
+    """
+    Describes what VirtualRaster.saveVRT has written, to allow incremental saves
+    """
+
+    def __init__(self, key: tuple):
+        # (path, wkt, geo-transformation, size, resampling algorithm)
+        self.key = key
+        # {source path: (RasterSourceInfo of source, RasterSourceInfo of source or warped source)}
+        self.sources: typing.Dict[str, typing.Tuple[RasterSourceInfo, RasterSourceInfo]] = dict()
+        # {id(VirtualBand): (VirtualBand, XML of band sources)}
+        self.bands: typing.Dict[int, typing.Tuple[VirtualBand, str]] = dict()
+        self.noData = None
+
+    def __getstate__(self):
+        # band ids are not valid in other processes
+        state = self.__dict__.copy()
+        state['bands'] = dict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+def warpedGrid(srcWkt: str, geoTransform: tuple, size: typing.Tuple[int, int], dstWkt: str,
+               warpArgs: dict = None) -> typing.Tuple[tuple, tuple, tuple]:
+    """
+    Reprojects a raster grid. Returns the grid suggested by gdal.Warp to cover the same extent in another CRS.
+    :param srcWkt: str, source CRS
+    :param geoTransform: tuple, source geo-transformation
+    :param size: tuple (width, height), source size in pixel
+    :param dstWkt: str, destination CRS
+    :param warpArgs: dict, optional keywords for gdal.WarpOptions
+    :return: tuple (upper-left (x, y), resolution (xRes, yRes), size (width, height))
+    """
+    drvVRT = gdal.GetDriverByName('VRT')
+    id = uuid.uuid4()
+    tmpSrc = '/vsimem/tmp.{}.src.vrt'.format(id)
+    tmpDst = '/vsimem/tmp.{}.dst.vrt'.format(id)
+
+    dsDummy = drvVRT.Create(tmpSrc, size[0], size[1], 1, eType=gdal.GDT_Byte)
+    dsDummy.SetProjection(srcWkt)
+    dsDummy.SetGeoTransform(geoTransform)
+    dsDummy.FlushCache()
+
+    if not isinstance(warpArgs, dict):
+        warpArgs = dict()
+    wops = gdal.WarpOptions(dstSRS=dstWkt, format='VRT', **warpArgs)
+    dsWarped = gdal.Warp(tmpDst, dsDummy, options=wops)
+    dsDummy = None
+    gdal.Unlink(tmpSrc)
+    if not isinstance(dsWarped, gdal.Dataset):
+        raise Exception('Warping failed from \n{} \nto {}'.format(srcWkt, dstWkt))
+
+    gt = dsWarped.GetGeoTransform()
+    result = (gt[0], gt[3]), (gt[1], abs(gt[5])), (dsWarped.RasterXSize, dsWarped.RasterYSize)
+    dsWarped = None
+    gdal.Unlink(tmpDst)
+    return result
+
+
+# VRT elements that describe a source band
+VRT_SOURCE_TAGS = ['SimpleSource', 'ComplexSource', 'AveragedSource', 'KernelFilteredSource']
+
+
+def readVRTBands(pathVRT: typing.Union[str, pathlib.Path]) -> typing.Tuple[typing.List[VirtualBand], float]:
+    """
+    Reads the virtual bands of an existing VRT. The VRT XML is parsed incrementally, without opening the VRT or
+    its sources with GDAL. Relative source paths are returned as absolute paths.
+    :param pathVRT: str, path of VRT
+    :return: ([list-of-VirtualBand], no-data value of the first band)
+    """
+    if isinstance(pathVRT, pathlib.Path):
+        pathVRT = pathVRT.as_posix()
+
+    if pathVRT.startswith('/vsi'):
+        fp = gdal.VSIFOpenL(pathVRT, 'rb')
+        assert fp is not None, 'Unable to open {}'.format(pathVRT)
+        try:
+            gdal.VSIFSeekL(fp, 0, 2)
+            size = gdal.VSIFTellL(fp)
+            gdal.VSIFSeekL(fp, 0, 0)
+            stream = io.BytesIO(gdal.VSIFReadL(1, size, fp))
+        finally:
+            gdal.VSIFCloseL(fp)
+        dirVRT = os.path.dirname(pathVRT)
+    else:
+        stream = open(pathVRT, 'rb')
+        dirVRT = os.path.dirname(os.path.abspath(pathVRT))
+
+    bands = []
+    noData = None
+    band = None
+    path = []
+    try:
+        for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                path.append(element.tag)
+                if len(path) == 1:
+                    assert element.tag == 'VRTDataset', '{} is not a VRT'.format(pathVRT)
+                elif len(path) == 2 and element.tag == 'VRTRasterBand':
+                    band = VirtualBand()
+                continue
+
+            path.pop()
+            if band is None:
+                pass
+            elif len(path) == 1 and element.tag == 'VRTRasterBand':
+                bands.append(band)
+                band = None
+                element.clear()
+            elif len(path) == 2 and element.tag == 'Description':
+                band.setName(element.text or '')
+            elif len(path) == 2 and element.tag == 'NoDataValue' and len(bands) == 0:
+                noData = float(element.text)
+            elif len(path) == 2 and element.tag in VRT_SOURCE_TAGS:
+                srcPath = element.findtext('SourceFilename')
+                srcBand = element.findtext('SourceBand', '1')
+                if srcPath and srcBand.isdigit():
+                    if element.find('SourceFilename').get('relativeToVRT', '0') == '1':
+                        srcPath = pathlib.Path(os.path.normpath(os.path.join(dirVRT, srcPath))).as_posix()
+                    band.addSource(VRTRasterInputSourceBand(srcPath, int(srcBand) - 1))
+                element.clear()
+    finally:
+        stream.close()
+    return bands, noData
+
+
+def buildVRT(pathVRT: typing.Union[str, pathlib.Path],
+             files: typing.List[typing.Union[str, pathlib.Path]],
+             stack: bool = False,
+             crs: str = None,
+             resolution: typing.Tuple[float, float] = None,
+             bounds: typing.Tuple[float, float, float, float] = None,
+             resampleAlg: typing.Union[str, int] = None,
+             noData: float = None,
+             maxWorkers: int = None,
+             overviews: str = None,
+             maxSourcesPerVRT: int = None) -> str:
+    """
+    Creates a VRT from a list of raster files, without requiring QGIS.
+    The CRS and resolution default to those of the first file, the bounds to the union of all files.
+    :param pathVRT: path of the VRT, or of a GDAL raster tile index, if it ends with ".gpkg"
+    :param files: list of raster files
+    :param stack: set True to stack all bands of all files into separate virtual bands (file1-band1, file1-band2,
+                  ... file2-band1, ...). By default, files are mosaiced, i.e. the n-th bands of all files are
+                  combined in the n-th virtual band.
+    :param crs: CRS of the VRT, as any user input accepted by osr, e.g. 'EPSG:32633' or WKT
+    :param resolution: tuple (xRes, yRes) pixel size in units of the VRT CRS
+    :param bounds: tuple (xMin, yMin, xMax, yMax) in the VRT CRS
+    :param resampleAlg: resampling algorithm used to warp sources in another CRS, see resampleAlgorithm
+    :param noData: no-data value of all virtual bands
+    :param maxWorkers: number of threads used to read source properties, see readSourceInfos
+    :param overviews: overview mode, see VirtualRaster.saveVRT
+    :param maxSourcesPerVRT: max. number of sources per VRT, to write a hierarchical VRT of VRTs
+    :return: str, the path of the VRT or tile index
+    """
+    assert len(files) > 0, 'VRT needs to define at least 1 input source'
+    vrt = VirtualRaster()
+    if maxWorkers:
+        vrt.setMaxWorkers(maxWorkers)
+    vrt.setResamplingAlg(resampleAlg)
+    vrt.setNoDataValue(noData)
+    if stack:
+        vrt.addFilesAsStack(files)
+    else:
+        vrt.addFilesAsMosaic(files)
+
+    # the grid is initialized from the first file. Reprojecting it gives the resolution in the VRT CRS.
+    if crs:
+        vrt.setWkt(spatialReference(crs).ExportToWkt())
+    if resolution:
+        vrt.setResolution(resolution)
+    if bounds is None:
+        bounds = vrt.fullSourceRasterExtent()
+    xMin, yMin, xMax, yMax = bounds
+    assert xMax > xMin and yMax > yMin, 'Invalid bounds: {}'.format(bounds)
+    vrt.setExtent(bounds)
+
+    if str(pathVRT).lower().endswith('.gpkg'):
+        return vrt.saveTileIndex(pathVRT)
+    return vrt.saveVRT(pathVRT, overviews=overviews, maxSourcesPerVRT=maxSourcesPerVRT)
@@ -0,0 +1,653 @@
+# -*- coding: utf-8 -*-
+# noinspection PyPep8Naming
+"""
+***************************************************************************
+    materialize
+    ---------------------
+    Copyright            : (C) 2017 by Benjamin Jakimow
+    Email                : benjamin.jakimow@geo.hu-berlin.de
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 3 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Writes the pixels of a VRT into a binary raster file, e.g.
+
+    materialize('mosaic.vrt', 'mosaic.tif', creationOptions=['COMPRESS=DEFLATE'], maxWorkers=16)
+
+The output is split into windows that are aligned to its blocks. Windows are read concurrently by a thread
+or process pool, in which each worker opens its own dataset of the VRT, and are written in order by the
+calling thread.
+
+Cloud-Optimized GeoTIFFs are written with materializeCOG, e.g.
+
+    materializeCOG('mosaic.vrt', 'mosaic.tif', compress='ZSTD', overviewsFromSource=True)
+
+The full resolution is materialized into a temporary tiled GeoTIFF first. Each overview level is then computed
+in parallel, directly from the full resolution data or from the source VRT, and the COG driver finally copies
+the full resolution and the overview levels into the COG layout. External .ovr overview files, e.g. of VRTs,
+are built the same way with buildExternalOverviews. This module must not import PyQt or QGIS.
+"""
+import os
+import tempfile
+import threading
+import time
+import typing
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+from osgeo import gdal
+
+# default number of workers that read windows
+MATERIALIZE_WORKERS = os.cpu_count() or 1
+
+# approximate size of a window in bytes, summed over all bands
+WINDOW_BYTES = 32 * 2 ** 20
+
+# number of windows per worker that are read ahead of the window being written
+READ_AHEAD = 2
+
+# default block size of Cloud-Optimized GeoTIFFs. Overview levels are added until they fit into a single block.
+COG_BLOCK_SIZE = 512
+
+# compression methods for which the predictor is enabled by default
+PREDICTOR_COMPRESSIONS = ['DEFLATE', 'LZW', 'LZMA', 'ZSTD']
+
+
+@dataclass
+class MaterializeProgress:
+    """
+    Progress of writing a raster with materialize
+    """
+    path: str
+    windowsDone: int = 0
+    windowsTotal: int = 0
+    bytesDone: int = 0
+    bytesTotal: int = 0
+    duration: float = 0.0
+    canceled: bool = False
+
+    def fraction(self) -> float:
+        """
+        Returns the progress as fraction between 0 and 1
+        :return: float
+        """
+        return self.bytesDone / self.bytesTotal if self.bytesTotal > 0 else 1.0
+
+    def throughput(self) -> float:
+        """
+        Returns the number of bytes written per second
+        :return: float
+        """
+        return self.bytesDone / self.duration if self.duration > 0 else 0.0
+
+    def eta(self) -> typing.Optional[float]:
+        """
+        Returns the estimated time in seconds until all windows are written
+        :return: float or None, if not yet known
+        """
+        throughput = self.throughput()
+        if throughput <= 0:
+            return None
+        return (self.bytesTotal - self.bytesDone) / throughput
+
+    def summary(self) -> str:
+        """
+        Returns a human-readable description of the progress, like "45% 120.3 MB/s ETA 0:12"
+        :return: str
+        """
+        text = '{:0.0f}% {:0.1f} MB/s'.format(100 * self.fraction(), self.throughput() / 2 ** 20)
+        eta = self.eta()
+        if eta is not None and self.windowsDone < self.windowsTotal:
+            text += ' ETA {}:{:02d}'.format(int(eta // 60), int(eta % 60))
+        return text
+
+
+def formatFromPath(path: str) -> typing.Optional[str]:
+    """
+    Returns the short name of a GDAL driver that creates files with the extension of a path
+    :param path: str, e.g. 'image.tif'
+    :return: str, e.g. 'GTiff', or None, if no driver is known
+    """
+    ext = os.path.splitext(path)[1].lower()[1:]
+    if ext in ['bsq', 'bil', 'bip']:
+        return 'ENVI'
+    for i in range(gdal.GetDriverCount()):
+        drv = gdal.GetDriver(i)
+        if drv.GetMetadataItem(gdal.DCAP_RASTER) != 'YES':
+            continue
+        if not (drv.GetMetadataItem(gdal.DCAP_CREATE) == 'YES' or
+                drv.GetMetadataItem(gdal.DCAP_CREATECOPY) == 'YES'):
+            continue
+        if ext in (drv.GetMetadataItem(gdal.DMD_EXTENSIONS) or '').lower().split(' '):
+            return drv.ShortName
+    return None
+
+
+def defaultCreationOptions(format: str, path: str) -> typing.List[str]:
+    """
+    Returns the creation options used for an output format, if not specified otherwise
+    :param format: GDAL driver short name
+    :param path: output path
+    :return: [list-of-str]
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if format == 'ENVI' and ext in ['.bsq', '.bil', '.bip']:
+        return ['INTERLEAVE={}'.format(ext[1:].upper())]
+    return []
+
+
+def blockWindows(rasterXSize: int, rasterYSize: int, blockXSize: int, blockYSize: int,
+                 bytesPerPixel: int, windowBytes: int = WINDOW_BYTES) -> typing.List[typing.Tuple[int, int, int, int]]:
+    """
+    Splits a raster into windows that are aligned to its blocks
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param blockXSize: block width in pixel
+    :param blockYSize: block height in pixel
+    :param bytesPerPixel: bytes of a pixel, summed over all bands
+    :param windowBytes: approximate size of a window in bytes. Windows contain at least one block.
+    :return: [(xOff, yOff, xSize, ySize), ...] in row-major order
+    """
+    blockXSize = max(1, min(blockXSize, rasterXSize))
+    blockYSize = max(1, min(blockYSize, rasterYSize))
+    blocks = max(1, windowBytes // max(1, blockXSize * blockYSize * bytesPerPixel))
+    # prefer windows that span complete rows of blocks, which GDAL drivers write sequentially
+    blocksPerRow = -(-rasterXSize // blockXSize)
+    nx = min(blocks, blocksPerRow)
+    ny = max(1, blocks // nx)
+    winXSize = nx * blockXSize
+    winYSize = ny * blockYSize
+
+    windows = []
+    for yOff in range(0, rasterYSize, winYSize):
+        for xOff in range(0, rasterXSize, winXSize):
+            windows.append((xOff, yOff, min(winXSize, rasterXSize - xOff), min(winYSize, rasterYSize - yOff)))
+    return windows
+
+
+_LOCAL = threading.local()
+_PROCESS_SOURCE: typing.Optional[tuple] = None
+
+
+def _dataset(path: str) -> gdal.Dataset:
+    # GDAL datasets must not be shared between threads, so each worker opens its own
+    datasets = getattr(_LOCAL, 'datasets', None)
+    if datasets is None:
+        datasets = _LOCAL.datasets = dict()
+    ds = datasets.get(path)
+    if ds is None:
+        ds = datasets[path] = gdal.Open(path)
+        assert isinstance(ds, gdal.Dataset), 'Unable to open {}'.format(path)
+    return ds
+
+
+def _readWindow(path: str, dataType: int, window: typing.Tuple[int, int, int, int]) -> bytes:
+    xOff, yOff, xSize, ySize = window
+    return _dataset(path).ReadRaster(xOff, yOff, xSize, ySize, buf_type=dataType)
+
+
+def _initProcessWorker(path: str, dataType: int):
+    global _PROCESS_SOURCE
+    _PROCESS_SOURCE = (path, dataType)
+
+
+def _readWindowInProcess(window: typing.Tuple[int, int, int, int]) -> bytes:
+    return _readWindow(_PROCESS_SOURCE[0], _PROCESS_SOURCE[1], window)
+
+
+def materialize(pathSrc: str,
+                pathDst: str,
+                format: str = None,
+                creationOptions: typing.List[str] = None,
+                maxWorkers: int = None,
+                processes: bool = False,
+                windowBytes: int = WINDOW_BYTES,
+                progress: typing.Callable[[MaterializeProgress], None] = None,
+                isCanceled: typing.Callable[[], bool] = None) -> MaterializeProgress:
+    """
+    Writes the pixels of a raster, usually a VRT, into a new raster file. Windows are read concurrently and
+    written in order. Drivers that can not create files window-by-window are written by gdal.Translate.
+    :param pathSrc: str, the raster to read from
+    :param pathDst: str, the raster to create
+    :param format: GDAL driver short name. Defaults to the driver that matches the pathDst extension.
+                   'COG' writes a Cloud-Optimized GeoTIFF with materializeCOG.
+    :param creationOptions: [list-of-str], GDAL creation options. Defaults to defaultCreationOptions.
+                            GeoTIFFs that are compressed use maxWorkers threads to compress blocks,
+                            unless NUM_THREADS is set.
+    :param maxWorkers: int, number of threads or processes that read windows. Defaults to MATERIALIZE_WORKERS.
+    :param processes: set True to read windows in worker processes instead of threads, e.g. for sources whose
+                      drivers hold the GIL. Sources in /vsimem/ are always read by threads.
+    :param windowBytes: approximate size of a window in bytes, summed over all bands
+    :param progress: callback function(MaterializeProgress), called after each written window
+    :param isCanceled: function that returns True to cancel. Canceled outputs are removed.
+    :return: MaterializeProgress, the final progress
+    """
+    t0 = time.time()
+    if format is None:
+        format = formatFromPath(pathDst)
+    assert format is not None, 'Unable to derive output format from {}'.format(pathDst)
+    if format == 'COG':
+        return materializeCOG(pathSrc, pathDst, creationOptions=creationOptions, maxWorkers=maxWorkers,
+                              processes=processes, windowBytes=windowBytes, progress=progress, isCanceled=isCanceled)
+    drv: gdal.Driver = gdal.GetDriverByName(format)
+    assert isinstance(drv, gdal.Driver), 'Unknown GDAL driver "{}"'.format(format)
+    if creationOptions is None:
+        creationOptions = defaultCreationOptions(format, pathDst)
+    creationOptions = list(creationOptions)
+    if maxWorkers is None:
+        maxWorkers = MATERIALIZE_WORKERS
+    maxWorkers = max(1, maxWorkers)
+
+    src: gdal.Dataset = gdal.Open(pathSrc)
+    assert isinstance(src, gdal.Dataset), 'Unable to open {}'.format(pathSrc)
+    nb = src.RasterCount
+    assert nb > 0, '{} has no bands'.format(pathSrc)
+    dataType = src.GetRasterBand(1).DataType
+    bytesPerPixel = nb * gdal.GetDataTypeSize(dataType) // 8
+    state = MaterializeProgress(path=pathDst, bytesTotal=src.RasterXSize * src.RasterYSize * bytesPerPixel)
+
+    def report():
+        state.duration = time.time() - t0
+        if progress:
+            progress(state)
+
+    if drv.GetMetadataItem(gdal.DCAP_CREATE) != 'YES' or format == 'VRT':
+        def callback(fraction, message, data):
+            state.bytesDone = int(fraction * state.bytesTotal)
+            report()
+            return 0 if isCanceled and isCanceled() else 1
+
+        options = gdal.TranslateOptions(format=format, creationOptions=creationOptions, callback=callback)
+        ds = gdal.Translate(pathDst, src, options=options)
+        state.canceled = ds is None and bool(isCanceled and isCanceled())
+        assert isinstance(ds, gdal.Dataset) or state.canceled, 'Unable to write {}'.format(pathDst)
+        ds = None
+        state.windowsDone = state.windowsTotal = 1
+        report()
+        return state
+
+    if format == 'GTiff' and not any(o.upper().startswith('NUM_THREADS=') for o in creationOptions):
+        compress = [o.split('=', 1)[1].upper() for o in creationOptions if o.upper().startswith('COMPRESS=')]
+        if len(compress) > 0 and compress[-1] != 'NONE':
+            creationOptions.append('NUM_THREADS={}'.format(maxWorkers))
+
+    dst: gdal.Dataset = drv.Create(pathDst, src.RasterXSize, src.RasterYSize, nb, dataType, options=creationOptions)
+    assert isinstance(dst, gdal.Dataset), 'Unable to create {}'.format(pathDst)
+    dst.SetGeoTransform(src.GetGeoTransform())
+    dst.SetProjection(src.GetProjection())
+    dst.SetMetadata(src.GetMetadata())
+    for b in range(nb):
+        bandSrc: gdal.Band = src.GetRasterBand(b + 1)
+        bandDst: gdal.Band = dst.GetRasterBand(b + 1)
+        bandDst.SetDescription(bandSrc.GetDescription())
+        noData = bandSrc.GetNoDataValue()
+        if noData is not None:
+            bandDst.SetNoDataValue(noData)
+
+    blockXSize, blockYSize = dst.GetRasterBand(1).GetBlockSize()
+    windows = blockWindows(src.RasterXSize, src.RasterYSize, blockXSize, blockYSize, bytesPerPixel,
+                           windowBytes=windowBytes)
+    state.windowsTotal = len(windows)
+    src = None
+
+    if processes and maxWorkers > 1 and not pathSrc.startswith('/vsimem/'):
+        pool = ProcessPoolExecutor(max_workers=maxWorkers, initializer=_initProcessWorker,
+                                   initargs=(pathSrc, dataType))
+
+        def submit(window):
+            return pool.submit(_readWindowInProcess, window)
+    else:
+        pool = ThreadPoolExecutor(max_workers=maxWorkers)
+
+        def submit(window):
+            return pool.submit(_readWindow, pathSrc, dataType, window)
+
+    try:
+        pending = []
+        nextWindow = 0
+        while state.windowsDone < len(windows):
+            if isCanceled and isCanceled():
+                state.canceled = True
+                break
+            # keep a limited number of windows in memory
+            while nextWindow < len(windows) and len(pending) < READ_AHEAD * maxWorkers:
+                pending.append((windows[nextWindow], submit(windows[nextWindow])))
+                nextWindow += 1
+            (xOff, yOff, xSize, ySize), future = pending.pop(0)
+            data = future.result()
+            dst.WriteRaster(xOff, yOff, xSize, ySize, data, buf_type=dataType)
+            state.windowsDone += 1
+            state.bytesDone += len(data)
+            report()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+    dst.FlushCache()
+    dst = None
+    if state.canceled:
+        drv.Delete(pathDst)
+    report()
+    return state
+
+
+def overviewFactors(rasterXSize: int, rasterYSize: int, minSize: int = COG_BLOCK_SIZE) -> typing.List[int]:
+    """
+    Returns the decimation factors of overview levels, like the COG driver does
+    :param rasterXSize: raster width in pixel
+    :param rasterYSize: raster height in pixel
+    :param minSize: levels are added until the largest side of the last level is not larger than minSize
+    :return: [2, 4, 8, ...]
+    """
+    factors = []
+    factor = 2
+    while -(-max(rasterXSize, rasterYSize) // (factor // 2)) > max(1, minSize):
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def _mergeOptions(defaults: typing.List[str], options: typing.List[str]) -> typing.List[str]:
+    # options override defaults with the same name
+    merged = dict()
+    for option in list(defaults) + list(options or []):
+        name, value = option.split('=', 1)
+        merged[name.upper()] = value
+    return ['{}={}'.format(k, v) for k, v in merged.items()]
+
+
+def _temporaryBaseName(path: str) -> str:
+    # temporary files are written next to the output, unless it is a network file system that can not be
+    # written randomly
+    if path.startswith('/vsi') and not path.startswith('/vsimem/'):
+        path = os.path.join(tempfile.gettempdir(), os.path.basename(path))
+    return '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+
+
+def _overviewVRT(pathFull: str, levels: typing.List[str]) -> str:
+    """
+    Returns the XML of a VRT that describes a raster and uses other rasters as its overview levels
+    """
+    vrt: gdal.Dataset = gdal.Translate('', pathFull, format='VRT')
+    root = ElementTree.fromstring(vrt.GetMetadata('xml:VRT')[0])
+    for band in root.iter('VRTRasterBand'):
+        for path in levels:
+            overview = ElementTree.SubElement(band, 'Overview')
+            filename = ElementTree.SubElement(overview, 'SourceFilename', relativeToVRT='0')
+            filename.text = path
+            ElementTree.SubElement(overview, 'SourceBand').text = band.get('band')
+    return ElementTree.tostring(root, encoding='unicode')
+
+
+def buildOverviewLevel(pathSrc: str, pathLevel: str, size: typing.Tuple[int, int],
+                       resampling: str = 'AVERAGE',
+                       creationOptions: typing.List[str] = None,
+                       isCanceled: typing.Callable[[], bool] = None):
+    """
+    Writes a downsampled copy of a raster into a GeoTIFF, to be used as overview level
+    :param pathSrc: str, the raster to read from
+    :param pathLevel: str, the GeoTIFF to create
+    :param size: (width, height) of the level in pixel
+    :param resampling: resampling algorithm, e.g. 'AVERAGE' or 'NEAREST'
+    :param creationOptions: [list-of-str], GTiff creation options
+    :param isCanceled: function that returns True to cancel
+    """
+    options = gdal.TranslateOptions(format='GTiff', width=size[0], height=size[1], resampleAlg=resampling.lower(),
+                                    creationOptions=creationOptions or [],
+                                    callback=lambda *args: 0 if isCanceled and isCanceled() else 1)
+    ds = gdal.Translate(pathLevel, pathSrc, options=options)
+    assert isinstance(ds, gdal.Dataset) or (isCanceled and isCanceled()), \
+        'Unable to create overview level {}'.format(pathLevel)
+
+
+def buildExternalOverviews(pathSrc: str,
+                           factors: typing.List[int] = None,
+                           resampling: str = 'AVERAGE',
+                           compress: str = 'DEFLATE',
+                           minSize: int = COG_BLOCK_SIZE,
+                           maxWorkers: int = None,
+                           progress: typing.Callable[[MaterializeProgress], None] = None,
+                           isCanceled: typing.Callable[[], bool] = None) -> MaterializeProgress:
+    """
+    Creates the external overview file <pathSrc>.ovr of a raster, e.g. of a VRT.
+    Each overview level is computed in parallel, directly from the raster, which lets GDAL use the overviews of
+    VRT sources. The levels are then copied into the .ovr file. An existing .ovr file is replaced.
+    :param pathSrc: str, the raster to create overviews for
+    :param factors: [list-of-int], decimation factors like [2, 4, 8]. Defaults to overviewFactors(..., minSize).
+    :param resampling: resampling algorithm, e.g. 'AVERAGE' or 'NEAREST'
+    :param compress: compression method of the .ovr file
+    :param minSize: see overviewFactors
+    :param maxWorkers: int, number of overview levels computed in parallel. Defaults to MATERIALIZE_WORKERS.
+    :param progress: callback function(MaterializeProgress), always called from the calling thread
+    :param isCanceled: function that returns True to cancel. It might be called from other threads.
+    :return: MaterializeProgress, the final progress. Its path is that of the .ovr file.
+    """
+    t0 = time.time()
+    pathOvr = pathSrc + '.ovr'
+    # otherwise GDAL would compute the new levels from the outdated ones
+    if gdal.VSIStatL(pathOvr) is not None:
+        gdal.Unlink(pathOvr)
+    if maxWorkers is None:
+        maxWorkers = MATERIALIZE_WORKERS
+
+    src: gdal.Dataset = gdal.Open(pathSrc)
+    assert isinstance(src, gdal.Dataset), 'Unable to open {}'.format(pathSrc)
+    xSize, ySize = src.RasterXSize, src.RasterYSize
+    bytesPerPixel = src.RasterCount * gdal.GetDataTypeSize(src.GetRasterBand(1).DataType) // 8
+    src = None
+    if factors is None:
+        factors = overviewFactors(xSize, ySize, minSize=minSize)
+    factors = sorted(factors)
+    levelSizes = [(-(-xSize // f), -(-ySize // f)) for f in factors]
+    levelBytes = [w * h * bytesPerPixel for w, h in levelSizes]
+    state = MaterializeProgress(path=pathOvr, windowsTotal=len(factors) + 1, bytesTotal=2 * sum(levelBytes))
+
+    def report():
+        state.duration = time.time() - t0
+        if progress:
+            progress(state)
+
+    def canceled() -> bool:
+        return bool(isCanceled and isCanceled())
+
+    if len(factors) == 0:
+        state.windowsDone = state.windowsTotal
+        report()
+        return state
+
+    baseName = _temporaryBaseName(pathOvr)
+    levelPaths = ['{}.ovr{}.tif'.format(baseName, f) for f in factors]
+    tiled = ['TILED=YES', 'BIGTIFF=IF_SAFER']
+    pool = ThreadPoolExecutor(max_workers=max(1, min(maxWorkers, len(factors))))
+    futures = []
+    try:
+        futures = {pool.submit(buildOverviewLevel, pathSrc, path, size, resampling=resampling,
+                               creationOptions=tiled, isCanceled=isCanceled): i
+                   for i, (path, size) in enumerate(zip(levelPaths, levelSizes))}
+        for future in as_completed(futures):
+            future.result()
+            state.windowsDone += 1
+            state.bytesDone += levelBytes[futures[future]]
+            report()
+        state.canceled = canceled()
+
+        if not state.canceled:
+            # an .ovr file is a GeoTIFF whose first image is the first level and whose overviews are the others
+            def callback(fraction, message, data):
+                state.bytesDone = state.bytesTotal - int((1 - fraction) * sum(levelBytes))
+                report()
+                return 0 if canceled() else 1
+
+            options = ['TILED=YES', 'COPY_SRC_OVERVIEWS=YES', 'BIGTIFF=IF_SAFER', 'COMPRESS={}'.format(compress)]
+            if compress.upper() not in ['', 'NONE']:
+                options.append('NUM_THREADS={}'.format(max(1, maxWorkers)))
+            vrt = gdal.Open(_overviewVRT(levelPaths[0], levelPaths[1:]))
+            ds = gdal.Translate(pathOvr, vrt, options=gdal.TranslateOptions(format='GTiff', creationOptions=options,
+                                                                             callback=callback))
+            state.canceled = ds is None and canceled()
+            assert isinstance(ds, gdal.Dataset) or state.canceled, 'Unable to write {}'.format(pathOvr)
+            ds = vrt = None
+            if state.canceled:
+                if gdal.VSIStatL(pathOvr) is not None:
+                    gdal.Unlink(pathOvr)
+            else:
+                state.windowsDone = state.windowsTotal
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+        for path in levelPaths:
+            if gdal.VSIStatL(path) is not None:
+                gdal.GetDriverByName('GTiff').Delete(path)
+
+    report()
+    return state
+
+
+def materializeCOG(pathSrc: str,
+                   pathDst: str,
+                   compress: str = 'DEFLATE',
+                   predictor: str = None,
+                   blockSize: int = COG_BLOCK_SIZE,
+                   overviewResampling: str = 'AVERAGE',
+                   overviewsFromSource: bool = False,
+                   creationOptions: typing.List[str] = None,
+                   maxWorkers: int = None,
+                   processes: bool = False,
+                   windowBytes: int = WINDOW_BYTES,
+                   progress: typing.Callable[[MaterializeProgress], None] = None,
+                   isCanceled: typing.Callable[[], bool] = None) -> MaterializeProgress:
+    """
+    Writes the pixels of a raster, usually a VRT, into a Cloud-Optimized GeoTIFF with internal tiles and overviews.
+    Overview levels are computed in parallel, each one directly from the full resolution, not from the
+    previous level.
+    :param pathSrc: str, the raster to read from
+    :param pathDst: str, the COG to create
+    :param compress: compression method, e.g. 'DEFLATE', 'ZSTD', 'LZW', 'JPEG' or 'NONE'
+    :param predictor: 'YES', 'NO', 'STANDARD' or 'FLOATING_POINT'.
+                      Defaults to 'YES' for compression methods in PREDICTOR_COMPRESSIONS.
+    :param blockSize: int, the tile size in pixel
+    :param overviewResampling: resampling algorithm used to compute the overviews, e.g. 'AVERAGE' or 'NEAREST'
+    :param overviewsFromSource: set True to compute the overviews from pathSrc, while the full resolution is
+                                written, instead of from the written full resolution. This can use overviews of
+                                the VRT sources and avoids reading the full resolution once per level.
+    :param creationOptions: [list-of-str], further COG creation options, which override the arguments above
+    :param maxWorkers: int, number of threads or processes that read windows and compute overview levels.
+                       Defaults to MATERIALIZE_WORKERS.
+    :param processes: set True to read the full resolution windows in worker processes, see materialize
+    :param windowBytes: approximate size of a window in bytes, summed over all bands
+    :param progress: callback function(MaterializeProgress), always called from the calling thread
+    :param isCanceled: function that returns True to cancel. It might be called from other threads.
+                       Canceled outputs are removed.
+    :return: MaterializeProgress, the final progress
+    """
+    t0 = time.time()
+    if maxWorkers is None:
+        maxWorkers = MATERIALIZE_WORKERS
+    maxWorkers = max(1, maxWorkers)
+
+    defaults = ['BLOCKSIZE={}'.format(blockSize), 'COMPRESS={}'.format(compress), 'BIGTIFF=IF_SAFER']
+    options = _mergeOptions(defaults, creationOptions)
+    compress = [o.split('=', 1)[1].upper() for o in options if o.startswith('COMPRESS=')][0]
+    blockSize = int([o.split('=', 1)[1] for o in options if o.startswith('BLOCKSIZE=')][0])
+    if predictor is None and compress in PREDICTOR_COMPRESSIONS:
+        predictor = 'YES'
+    defaults = ['PREDICTOR={}'.format(predictor)] if predictor else []
+    # the overview levels are created here, the COG driver only copies them
+    defaults += ['NUM_THREADS={}'.format(maxWorkers), 'OVERVIEWS=FORCE_USE_EXISTING']
+    options = _mergeOptions(defaults, options)
+
+    src: gdal.Dataset = gdal.Open(pathSrc)
+    assert isinstance(src, gdal.Dataset), 'Unable to open {}'.format(pathSrc)
+    xSize, ySize = src.RasterXSize, src.RasterYSize
+    bytesPerPixel = src.RasterCount * gdal.GetDataTypeSize(src.GetRasterBand(1).DataType) // 8
+    src = None
+
+    factors = overviewFactors(xSize, ySize, minSize=blockSize)
+    levelSizes = [(-(-xSize // f), -(-ySize // f)) for f in factors]
+    fullBytes = xSize * ySize * bytesPerPixel
+    levelBytes = [w * h * bytesPerPixel for w, h in levelSizes]
+    copyBytes = fullBytes + sum(levelBytes)
+    # writing the full resolution, computing the overview levels, and copying both into the COG
+    state = MaterializeProgress(path=pathDst, bytesTotal=fullBytes + sum(levelBytes) + copyBytes)
+
+    def report():
+        state.duration = time.time() - t0
+        if progress:
+            progress(state)
+
+    def canceled() -> bool:
+        return bool(isCanceled and isCanceled())
+
+    baseName = _temporaryBaseName(pathDst)
+    pathFull = baseName + '.tif'
+    levelPaths = ['{}.ovr{}.tif'.format(baseName, f) for f in factors]
+    tiled = ['TILED=YES', 'BLOCKXSIZE={}'.format(blockSize), 'BLOCKYSIZE={}'.format(blockSize), 'BIGTIFF=IF_SAFER']
+    drvTmp: gdal.Driver = gdal.GetDriverByName('GTiff')
+
+    def buildLevel(i: int) -> int:
+        buildOverviewLevel(pathSrc if overviewsFromSource else pathFull, levelPaths[i], levelSizes[i],
+                           resampling=overviewResampling, creationOptions=tiled, isCanceled=isCanceled)
+        return i
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(maxWorkers, len(factors))))
+    futures = []
+    try:
+        if overviewsFromSource:
+            futures = [pool.submit(buildLevel, i) for i in range(len(factors))]
+
+        def onWindow(full: MaterializeProgress):
+            state.windowsTotal = full.windowsTotal + len(factors) + 1
+            state.windowsDone = full.windowsDone
+            state.bytesDone = full.bytesDone
+            report()
+
+        full = materialize(pathSrc, pathFull, format='GTiff', creationOptions=tiled, maxWorkers=maxWorkers,
+                           processes=processes, windowBytes=windowBytes, progress=onWindow, isCanceled=isCanceled)
+        state.canceled = full.canceled
+
+        if not state.canceled:
+            if not overviewsFromSource:
+                futures = [pool.submit(buildLevel, i) for i in range(len(factors))]
+            for future in as_completed(futures):
+                i = future.result()
+                state.windowsDone += 1
+                state.bytesDone += levelBytes[i]
+                report()
+            state.canceled = canceled()
+
+        if not state.canceled:
+            def callback(fraction, message, data):
+                state.bytesDone = state.bytesTotal - int((1 - fraction) * copyBytes)
+                report()
+                return 0 if canceled() else 1
+
+            vrt = gdal.Open(_overviewVRT(pathFull, levelPaths))
+            ds = gdal.Translate(pathDst, vrt, options=gdal.TranslateOptions(format='COG', creationOptions=options,
+                                                                             callback=callback))
+            state.canceled = ds is None and canceled()
+            assert isinstance(ds, gdal.Dataset) or state.canceled, 'Unable to write {}'.format(pathDst)
+            ds = vrt = None
+            if state.canceled:
+                if gdal.VSIStatL(pathDst) is not None:
+                    gdal.Unlink(pathDst)
+            else:
+                state.windowsDone = state.windowsTotal
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+        for path in [pathFull] + levelPaths:
+            if gdal.VSIStatL(path) is not None:
+                drvTmp.Delete(path)
+
+    report()
+    return state
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# noinspection PyPep8Naming
+"""
+***************************************************************************
+    scan
+    ---------------------
+    Copyright            : (C) 2017 by Benjamin Jakimow
+    Email                : benjamin.jakimow@geo.hu-berlin.de
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 3 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Searches directory trees for raster source files, e.g.
+
+    files = scanFiles('/data/landsat', pattern='*_SR_B*.tif', extensions=rasterFileExtensions())
+
+Directories are listed with os.scandir in a thread pool, level by level and without recursion.
+Directory listings are cached by the directory modification time, so that rescanning an unchanged tree
+only needs to stat its directories. This module must not import PyQt or QGIS.
+"""
+import fnmatch
+import json
+import os
+import pathlib
+import re
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from osgeo import gdal
+
+# number of threads used to list directories
+SCAN_WORKERS = min(32, 4 * (os.cpu_count() or 1))
+
+# directories modified within this time (ns) before being listed are not cached, as the file system might not
+# update their modification time on further changes in the same clock tick
+RECENT_MTIME_NS = 2 * 10 ** 9
+
+# extensions of GDAL driver files that describe other files and are never used as raster source
+SIDECAR_EXTENSIONS = ['.aux', '.hdr', '.json', '.msk', '.ovr', '.prj', '.tfw', '.txt', '.wld', '.xml']
+
+
+def rasterFileExtensions() -> typing.Set[str]:
+    """
+    Returns the file extensions of all GDAL raster drivers, e.g. {'.tif', '.tiff', '.bsq', ...}
+    :return: {set-of-str}, lower-case extensions including the leading dot
+    """
+    extensions = {'.bsq', '.bil', '.bip'}
+    for i in range(gdal.GetDriverCount()):
+        drv = gdal.GetDriver(i)
+        if drv.GetMetadataItem(gdal.DCAP_RASTER) != 'YES':
+            continue
+        for e in (drv.GetMetadataItem(gdal.DMD_EXTENSIONS) or '').split(' '):
+            if len(e) > 0:
+                extensions.add('.' + e.lower())
+    return extensions.difference(SIDECAR_EXTENSIONS)
+
+
+class DirectoryListingCache(object):
+    """
+    Caches the file and sub-directory names of directories, together with the directory modification time
+    """
+
+    def __init__(self, path: typing.Union[str, pathlib.Path] = None):
+        """
+        :param path: JSON file to load the cache from and to save it to, optional
+        """
+        self.mPath = None if path is None else pathlib.Path(path).as_posix()
+        self.mLock = threading.Lock()
+        # {directory: (mtime in ns, [file names], [sub-directory names], [names of links to directories])}
+        self.mListings: typing.Dict[str, tuple] = dict()
+        if self.mPath is not None and os.path.isfile(self.mPath):
+            with open(self.mPath, 'r', encoding='utf-8') as f:
+                self.mListings = {k: tuple(v) for k, v in json.load(f).items()}
+
+    def __len__(self):
+        return len(self.mListings)
+
+    def listing(self, directory: str, mtime: int) -> typing.Optional[typing.Tuple[list, list, list]]:
+        """
+        Returns the cached listing of a directory
+        :param directory: str
+        :param mtime: int, current modification time of the directory in ns
+        :return: ([file names], [sub-directory names], [names of links to directories]) or None,
+                 if not cached or the directory has been changed
+        """
+        with self.mLock:
+            cached = self.mListings.get(directory)
+        if cached is None or cached[0] != mtime:
+            return None
+        return cached[1], cached[2], cached[3]
+
+    def setListing(self, directory: str, mtime: int,
+                   files: typing.List[str], dirs: typing.List[str], links: typing.List[str]):
+        with self.mLock:
+            self.mListings[directory] = (mtime, files, dirs, links)
+
+    def clear(self):
+        with self.mLock:
+            self.mListings.clear()
+
+    def save(self, path: typing.Union[str, pathlib.Path] = None):
+        """
+        Saves the cache as JSON file
+        :param path: defaults to the path the cache has been created with
+        """
+        path = self.mPath if path is None else pathlib.Path(path).as_posix()
+        assert path is not None, 'Path undefined'
+        with self.mLock:
+            listings = dict(self.mListings)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(listings, f)
+
+
+_LISTING_CACHE: typing.Optional[DirectoryListingCache] = DirectoryListingCache()
+
+
+def listingCache() -> typing.Optional[DirectoryListingCache]:
+    """
+    Returns the DirectoryListingCache used by scanFiles. By default, this is an in-memory cache.
+    :return: DirectoryListingCache or None, if caching is disabled
+    """
+    return _LISTING_CACHE
+
+
+def setListingCache(cache: typing.Optional[DirectoryListingCache]):
+    """
+    Sets the DirectoryListingCache used by scanFiles
+    :param cache: DirectoryListingCache or None, to disable caching
+    """
+    global _LISTING_CACHE
+    assert cache is None or isinstance(cache, DirectoryListingCache)
+    _LISTING_CACHE = cache
+
+
+def compilePatterns(patterns, ignoreCase: bool = False) -> typing.Optional[re.Pattern]:
+    """
+    Compiles wildcard patterns or regular expressions into a single regular expression
+    :param patterns: wildcard pattern like "*.tif", compiled regular expression, or a list of them
+    :param ignoreCase: set True to ignore the character case
+    :return: compiled regular expression to be used with .match(name), or None, if no pattern is given
+    """
+    if patterns is None:
+        return None
+    if not isinstance(patterns, (list, tuple, set)):
+        patterns = [patterns]
+    if len(patterns) == 0:
+        return None
+    if len(patterns) == 1 and isinstance(patterns[0], re.Pattern) and not ignoreCase:
+        return re.compile('.*?(?:{})'.format(patterns[0].pattern), patterns[0].flags)
+    parts = []
+    for pattern in patterns:
+        if isinstance(pattern, re.Pattern):
+            # regular expressions can match anywhere in the file name
+            parts.append('(?:.*?(?:{}))'.format(pattern.pattern))
+        else:
+            parts.append('(?:{})'.format(fnmatch.translate(pattern)))
+    return re.compile('|'.join(parts), re.IGNORECASE if ignoreCase else 0)
+
+
+def listDirectory(directory: str,
+                  followSymlinks: bool = False,
+                  cache: DirectoryListingCache = None) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    """
+    Lists a directory
+    :param directory: str
+    :param followSymlinks: set True to return symbolic links to directories as sub-directories
+    :param cache: DirectoryListingCache, optional
+    :return: ([file names], [sub-directory names]), empty if the directory can not be read
+    """
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+        listing = None if cache is None else cache.listing(directory, mtime)
+        if listing is None:
+            files = []
+            dirs = []
+            links = []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        (links if entry.is_symlink() else dirs).append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+            listing = (files, dirs, links)
+            if cache is not None and time.time_ns() - mtime > RECENT_MTIME_NS:
+                cache.setListing(directory, mtime, files, dirs, links)
+    except OSError:
+        return [], []
+    files, dirs, links = listing
+    return files, dirs + links if followSymlinks else dirs
+
+
+def scanFiles(roots,
+              pattern=None,
+              recursive: bool = True,
+              ignoreCase: bool = False,
+              extensions: typing.Iterable[str] = None,
+              followSymlinks: bool = False,
+              maxWorkers: int = None,
+              useCache: bool = True) -> typing.List[str]:
+    """
+    Searches for files
+    :param roots: directory or list of directories to search in
+    :param pattern: wildcard pattern like "*.tif", compiled regular expression, or a list of them,
+                    that a file name needs to match. Defaults to all files.
+    :param recursive: set False to search the root directories only
+    :param ignoreCase: set True to ignore the character case of the pattern and the extensions
+    :param extensions: file extensions like ['.tif', '.bsq'] that a file needs to have, e.g. rasterFileExtensions().
+                       This check is cheaper than the pattern matching and done first.
+    :param followSymlinks: set True to search in symbolically linked directories too
+    :param maxWorkers: int, number of threads. Defaults to SCAN_WORKERS. Use 1 to search sequentially.
+    :param useCache: bool, set False to ignore the listingCache()
+    :return: [list-of-str], sorted file paths
+    """
+    if not isinstance(roots, (list, tuple, set)):
+        roots = [roots]
+    roots = [pathlib.Path(r).as_posix() for r in roots]
+    regex = compilePatterns(pattern, ignoreCase=ignoreCase)
+    if extensions is not None:
+        extensions = {e.lower() for e in extensions} if ignoreCase else set(extensions)
+    if maxWorkers is None:
+        maxWorkers = SCAN_WORKERS
+    cache = listingCache() if useCache else None
+
+    def scan(directory: str) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        files, dirs = listDirectory(directory, followSymlinks=followSymlinks, cache=cache)
+        if extensions is not None:
+            if ignoreCase:
+                files = [f for f in files if os.path.splitext(f)[1].lower() in extensions]
+            else:
+                files = [f for f in files if os.path.splitext(f)[1] in extensions]
+        if regex is not None:
+            files = [f for f in files if regex.match(f)]
+        return [directory + '/' + f for f in files], [directory + '/' + d for d in dirs]
+
+    results = []
+    # real paths of visited directories, to not run into loops of symbolic links
+    visited = set()
+    level = [r for r in roots if os.path.isdir(r)]
+    with ThreadPoolExecutor(max_workers=max(1, maxWorkers)) as pool:
+        while len(level) > 0:
+            if followSymlinks:
+                level = [d for d in level if os.path.realpath(d) not in visited]
+                visited.update(os.path.realpath(d) for d in level)
+            nextLevel = []
+            scanned = pool.map(scan, level) if maxWorkers > 1 and len(level) > 1 else map(scan, level)
+            for files, dirs in scanned:
+                results.extend(files)
+                if recursive:
+                    nextLevel.extend(dirs)
+            level = nextLevel
+    return sorted(results)
+
+
+def expandSources(sources: typing.List[typing.Union[str, pathlib.Path]],
+                  pattern=None,
+                  recursive: bool = True,
+                  maxWorkers: int = None) -> typing.List[str]:
+    """
+    Replaces directories in a list of raster sources by the raster files they contain.
+    Files are searched by the extensions of GDAL raster drivers and the pattern, ignoring the character case.
+    :param sources: list of file paths, directories or other GDAL data source names
+    :param pattern: wildcard pattern(s) or regular expression(s) that files found in directories need to match
+    :param recursive: set False to not search in sub-directories
+    :param maxWorkers: int, number of threads used to scan directories
+    :return: [list-of-str]
+    """
+    results = []
+    extensions = None
+    for source in sources:
+        source = source.as_posix() if isinstance(source, pathlib.Path) else source
+        if isinstance(source, str) and os.path.isdir(source):
+            if extensions is None:
+                extensions = rasterFileExtensions()
+            results.extend(scanFiles(source, pattern=pattern, recursive=recursive, ignoreCase=True,
+                                     extensions=extensions, maxWorkers=maxWorkers))
+        else:
+            results.append(source)
+    return results
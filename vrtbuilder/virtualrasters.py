@@ -19,19 +19,20 @@
  *                                                                         *
  ***************************************************************************/
 """
+import contextlib
 import os
-import re
-import sys
+import threading
 import typing
-import uuid
 import pathlib
-from xml.etree import ElementTree
 from osgeo import gdal, osr
-from PyQt5.QtCore import QObject, pyqtSignal, QSize, QSizeF, QPoint
+from PyQt5.QtCore import QObject, pyqtSignal, QSize, QSizeF, QPoint, QPointF
 from qgis.core import QgsRasterLayer, QgsCoordinateReferenceSystem, QgsRectangle, QgsCoordinateTransform, \
-    QgsPointXY, QgsPoint
+    QgsPointXY
 
-from vrtbuilder.externals.qps.utils import qgsRasterLayer, gdalDataset
+from vrtbuilder.externals.qps.utils import qgsRasterLayer
+from vrtbuilder import core
+from vrtbuilder.core import VRTRasterInputSourceBand, VirtualBand, VirtualRaster, \
+    readSourceInfos, readVRTBands
 from vrtbuilder.externals.qps.models import Option, OptionListModel
 
 # lookup GDAL Data Type and its size in bytes
@@ -137,16 +138,15 @@ def resolution(lyr) -> QSizeF:
 
 def px2geo(px, gt) -> QgsPointXY:
     """
-    :param px:
-    :param gt:
-    :return:
+    Returns the geo-coordinate of a pixel position
+    :param px: QPoint | QgsPointXY pixel position
+    :param gt: GDAL Geo-Transformation tuple
+    :return: QgsPointXY
     """
-    gx = gt[0] + px.x() * gt[1] + px.y() * gt[2]
-    gy = gt[3] + px.x() * gt[4] + px.y() * gt[5]
-    return QgsPointXY(gx, gy)
+    return QgsPointXY(*core.px2geo((px.x(), px.y()), gt))
 
 
-def geo2pxF(geo, gt):
+def geo2pxF(geo, gt) -> QPointF:
     """
     Returns the pixel position related to a Geo-Coordinate in floating point precision.
     :param geo: Geo-Coordinate as QgsPoint
@@ -154,13 +154,10 @@ def geo2pxF(geo, gt):
     :return: pixel position as QPointF
     """
     assert isinstance(geo, QgsPointXY)
-    # see http://www.gdal.org/gdal_datamodel.html
-    px = (geo.x() - gt[0]) / gt[1]  # x pixel
-    py = (geo.y() - gt[3]) / gt[5]  # y pixel
-    return QPointF(px, py)
+    return QPointF(*core.geo2pxF((geo.x(), geo.y()), gt))
 
 
-def geo2px(geo, gt):
+def geo2px(geo, gt) -> QPoint:
     """
     Returns the pixel position related to a Geo-Coordinate as integer number.
     Floating-point coordinate are casted to integer coordinate, e.g. the pixel coordinate (0.815, 23.42) is returned as (0,23)
@@ -173,10 +170,143 @@ def geo2px(geo, gt):
     if isinstance(gt, QgsRasterLayer):
         return geo2px(geo, geotransform(gt))
     elif isinstance(gt, gdal.Dataset):
-        return geo2px(gt.GetGeoTransform())
+        return geo2px(geo, gt.GetGeoTransform())
     else:
-        px = geo2pxF(geo, gt)
-        return QPoint(int(px.x()), int(px.y()))
+        return QPoint(*core.geo2px((geo.x(), geo.y()), gt))
+
+
+class QgsCrsCache(object):
+    """
+    Process-wide cache of QgsCoordinateReferenceSystems, keyed by WKT or authority id, and of
+    QgsCoordinateTransforms, keyed by source and destination CRS, with hit and miss counters.
+    See vrtbuilder.core.crsCache() for the corresponding cache of osr objects.
+    """
+
+    def __init__(self):
+        self.mLock = threading.Lock()
+        self.mCrs: typing.Dict[str, QgsCoordinateReferenceSystem] = dict()
+        self.mTransforms: typing.Dict[typing.Tuple[str, str], QgsCoordinateTransform] = dict()
+        # {'crs' | 'transform': [hits, misses]}
+        self.mCounts: typing.Dict[str, typing.List[int]] = {'crs': [0, 0], 'transform': [0, 0]}
+
+    @staticmethod
+    def crsKey(crs: QgsCoordinateReferenceSystem) -> str:
+        """
+        Returns the key a QgsCoordinateReferenceSystem is cached with
+        :param crs: QgsCoordinateReferenceSystem
+        :return: str, the authority id or, for CRS without authority id, the WKT
+        """
+        authid = crs.authid()
+        if authid and not authid.startswith('USER:'):
+            return authid
+        return crs.toWkt()
+
+    def crs(self, value: typing.Union[str, osr.SpatialReference]) -> QgsCoordinateReferenceSystem:
+        """
+        Returns the QgsCoordinateReferenceSystem of a WKT, authority id like 'EPSG:4326' or osr.SpatialReference
+        :param value: str | osr.SpatialReference
+        :return: QgsCoordinateReferenceSystem
+        """
+        if isinstance(value, osr.SpatialReference):
+            if value.GetAuthorityName(None) and value.GetAuthorityCode(None):
+                value = '{}:{}'.format(value.GetAuthorityName(None), value.GetAuthorityCode(None))
+            else:
+                value = value.ExportToWkt()
+        with self.mLock:
+            crs = self.mCrs.get(value)
+            self.mCounts['crs'][0 if crs is not None else 1] += 1
+        if crs is None:
+            crs = QgsCoordinateReferenceSystem(value)
+            if not crs.isValid():
+                crs = QgsCoordinateReferenceSystem.fromWkt(value)
+            with self.mLock:
+                self.mCrs[value] = crs
+        return QgsCoordinateReferenceSystem(crs)
+
+    def transform(self, srcCrs: QgsCoordinateReferenceSystem,
+                  dstCrs: QgsCoordinateReferenceSystem) -> QgsCoordinateTransform:
+        """
+        Returns a QgsCoordinateTransform between two CRS
+        :param srcCrs: QgsCoordinateReferenceSystem
+        :param dstCrs: QgsCoordinateReferenceSystem
+        :return: QgsCoordinateTransform
+        """
+        key = (self.crsKey(srcCrs), self.crsKey(dstCrs))
+        with self.mLock:
+            trans = self.mTransforms.get(key)
+            self.mCounts['transform'][0 if trans is not None else 1] += 1
+        if trans is None:
+            trans = QgsCoordinateTransform()
+            trans.setSourceCrs(srcCrs)
+            trans.setDestinationCrs(dstCrs)
+            with self.mLock:
+                self.mTransforms[key] = trans
+        return QgsCoordinateTransform(trans)
+
+    def transformRectangle(self, rectangle: QgsRectangle,
+                           srcCrs: QgsCoordinateReferenceSystem,
+                           dstCrs: QgsCoordinateReferenceSystem) -> typing.Optional[QgsRectangle]:
+        """
+        Transforms the bounding box of a rectangle into another CRS, like qps.utils.SpatialExtent.toCrs
+        :param rectangle: QgsRectangle
+        :param srcCrs: QgsCoordinateReferenceSystem of the rectangle
+        :param dstCrs: QgsCoordinateReferenceSystem to transform into
+        :return: QgsRectangle or None, if the rectangle can not be transformed
+        """
+        if srcCrs == dstCrs:
+            return QgsRectangle(rectangle)
+        if rectangle.isEmpty():
+            return None
+        try:
+            return self.transform(srcCrs, dstCrs).transformBoundingBox(rectangle)
+        except Exception:
+            return None
+
+    def transformPoint(self, point: QgsPointXY,
+                       srcCrs: QgsCoordinateReferenceSystem,
+                       dstCrs: QgsCoordinateReferenceSystem) -> typing.Optional[QgsPointXY]:
+        """
+        Transforms a point into another CRS, like qps.utils.SpatialPoint.toCrs
+        :param point: QgsPointXY
+        :param srcCrs: QgsCoordinateReferenceSystem of the point
+        :param dstCrs: QgsCoordinateReferenceSystem to transform into
+        :return: QgsPointXY or None, if the point can not be transformed
+        """
+        if srcCrs == dstCrs:
+            return QgsPointXY(point)
+        try:
+            return self.transform(srcCrs, dstCrs).transform(point)
+        except Exception:
+            return None
+
+    def statistics(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        """
+        Returns the number of cache hits and misses
+        :return: {'crs': (hits, misses), 'transform': (hits, misses)}
+        """
+        with self.mLock:
+            return {k: tuple(v) for k, v in self.mCounts.items()}
+
+    def clear(self):
+        """
+        Removes all cached objects and resets the counters
+        """
+        with self.mLock:
+            self.mCrs.clear()
+            self.mTransforms.clear()
+            for counts in self.mCounts.values():
+                counts[:] = [0, 0]
+
+
+_QGS_CRS_CACHE = QgsCrsCache()
+
+
+def qgsCrsCache() -> QgsCrsCache:
+    """
+    Returns the process-wide QgsCrsCache
+    :return: QgsCrsCache
+    """
+    return _QGS_CRS_CACHE
 
 
 def transformBoundingBox(rectangle: QgsRectangle, trans: QgsCoordinateTransform) -> QgsRectangle:
@@ -189,25 +319,13 @@ def transformBoundingBox(rectangle: QgsRectangle, trans: QgsCoordinateTransform)
     assert isinstance(rectangle, QgsRectangle)
     assert isinstance(trans, QgsCoordinateTransform)
 
-    pts = [QgsPointXY(rectangle.xMinimum(), rectangle.yMinimum()),
-           QgsPointXY(rectangle.xMinimum(), rectangle.yMaximum()),
-           QgsPointXY(rectangle.xMaximum(), rectangle.yMinimum()),
-           QgsPointXY(rectangle.xMaximum(), rectangle.yMaximum())
-           ]
-    pts = [trans.transform(pt) for pt in pts]
+    corners = core.boundsCorners((rectangle.xMinimum(), rectangle.yMinimum(),
+                                  rectangle.xMaximum(), rectangle.yMaximum()))
+    pts = [trans.transform(QgsPointXY(x, y)) for x, y in corners.tolist()]
+    return QgsRectangle(*core.cornersBounds([(pt.x(), pt.y()) for pt in pts])[0].tolist())
 
-    xvalues = [pt.x() for pt in pts]
-    yvalues = [pt.y() for pt in pts]
 
-    xMin = min(xvalues)
-    xMax = max(xvalues)
-    yMin = min(yvalues)
-    yMax = max(yvalues)
-
-    return QgsRectangle(xMin, yMin, xMax, yMax)
-
-
-def geotransform(upperLeft: QgsPointXY, resolution: QSizeF) -> tuple:
+def geotransform(upperLeft: QgsPointXY, resolution: QSizeF = None) -> tuple:
     """
     Create a GeoTransformation tuple
     :param upperLeft: QgsPointXY upper left image coordinate
@@ -215,18 +333,15 @@ def geotransform(upperLeft: QgsPointXY, resolution: QSizeF) -> tuple:
     :return: tuple
     """
     if isinstance(upperLeft, QgsRasterLayer):
-        resolution = resolution(upperLeft)
-        upperLeft = QgsPointXY(upperLeft.extent().xMinimum(), upperLeft.extent().yMaximum())
+        ext = upperLeft.extent()
+        resolution = QSizeF(upperLeft.rasterUnitsPerPixelX(), upperLeft.rasterUnitsPerPixelY())
+        upperLeft = QgsPointXY(ext.xMinimum(), ext.yMaximum())
     if isinstance(upperLeft, gdal.Dataset):
         return upperLeft.GetGeoTransform()
     if isinstance(upperLeft, gdal.Band):
         return upperLeft.GetDataset().GetGeoTransform()
 
-    assert resolution.height() > 0
-    assert resolution.width() > 0
-    gt = (upperLeft.x(), resolution.width(), 0,
-          upperLeft.y(), 0, resolution.height())
-    return gt
+    return core.geotransform((upperLeft.x(), upperLeft.y()), (resolution.width(), resolution.height()))
 
 
 def alignPointToGrid(pixelSize: QSizeF, gridRefPoint: QgsPointXY, gridPoint: QgsPointXY) -> QgsPointXY:
@@ -237,12 +352,9 @@ def alignPointToGrid(pixelSize: QSizeF, gridRefPoint: QgsPointXY, gridPoint: Qgs
     :param gridPoint: QgsPointXY to alignt to reference grid
     :return: QgsPointXY
     """
-    w = pixelSize.width()
-    h = pixelSize.height()
-
-    x = gridRefPoint.x() + w * int(round((gridPoint.x() - gridRefPoint.x()) / w))
-    y = gridRefPoint.y() + h * int(round((gridPoint.y() - gridRefPoint.y()) / h))
-    return QgsPointXY(x, y)
+    return QgsPointXY(*core.alignPointToGrid((pixelSize.width(), pixelSize.height()),
+                                             (gridRefPoint.x(), gridRefPoint.y()),
+                                             (gridPoint.x(), gridPoint.y())))
 
 
 def alignRectangleToGrid(pixelSize: QSizeF, gridRefPoint: QgsPointXY, rectangle: QgsRectangle) -> QgsRectangle:
@@ -253,29 +365,11 @@ def alignRectangleToGrid(pixelSize: QSizeF, gridRefPoint: QgsPointXY, rectangle:
     :param rectangle: QgsRectangle. the extent to get aligned
     :return: tuple (QgsRectangle, QSize)
     """
-
-    w = pixelSize.width()
-    h = pixelSize.height()
-
-    xMin = gridRefPoint.x() + w * int(round((rectangle.xMinimum() - gridRefPoint.x()) / w))
-    yMax = gridRefPoint.y() + h * int(round((rectangle.yMaximum() - gridRefPoint.y()) / h))
-    xMax = gridRefPoint.x() + w * int(round((rectangle.xMaximum() - gridRefPoint.x()) / w))
-    yMin = gridRefPoint.y() + h * int(round((rectangle.yMinimum() - gridRefPoint.y()) / h))
-
-    width = float(xMax - xMin)
-    height = float(yMax - yMin)
-
-    ns = int(round(width / w))
-    nl = int(round(height / h))
-
-    ns = max(1, ns)
-    nl = max(1, nl)
-
-    newExtent = QgsRectangle(xMin, yMax, xMin + ns * w, yMax - nl * h)
-    size = QSize(ns, nl)
-    if size.width() < 0 or size.height() < 0:
-        s = ""
-    return newExtent, size
+    bounds, size = core.alignRectangleToGrid((pixelSize.width(), pixelSize.height()),
+                                             (gridRefPoint.x(), gridRefPoint.y()),
+                                             (rectangle.xMinimum(), rectangle.yMinimum(),
+                                              rectangle.xMaximum(), rectangle.yMaximum()))
+    return QgsRectangle(*bounds), QSize(*size)
 
 
 def describeRawFile(pathRaw, pathVrt, xsize, ysize,
@@ -367,137 +461,53 @@ def describeRawFile(pathRaw, pathVrt, xsize, ysize,
     return dsVRT
 
 
-class VRTRasterInputSourceBand(object):
-
-    @staticmethod
-    def fromGDALDataSet(pathOrDataSet):
-        """
-        Returns the VRTRasterInputSourceBands from a raster data source
-        :param pathOrDataSet: str | gdal.Dataset
-        :return: [list-of-VRTRasterInputSourceBand]
-        """
-        srcBands = []
-        pathOrDataSet = gdalDataset(pathOrDataSet)
-        if isinstance(pathOrDataSet, gdal.Dataset):
-            path = pathOrDataSet.GetFileList()[0]
-            for b in range(pathOrDataSet.RasterCount):
-                srcBands.append(VRTRasterInputSourceBand(path, b))
-        return srcBands
-
-    @staticmethod
-    def fromRasterLayer(layer: QgsRasterLayer):
-        layer = qgsRasterLayer(layer)
-        srcBands = []
-        src = layer.source()
-        for b in range(layer.bandCount()):
-            name = layer.bandName(b + 1)
-            srcBands.append(VRTRasterInputSourceBand(src, b, bandName=name))
-
-        return srcBands
-
-    def __init__(self, path: str, bandIndex: int, bandName: str = ''):
-        if isinstance(path, pathlib.Path):
-            path = path.as_posix()
-        assert isinstance(path, str)
-        assert isinstance(bandIndex, int)
-        self.mSource: str = path
-        self.mBandIndex: int = bandIndex
-        self.mBandName: str = bandName
-        self.mNoData = None
-        self.mVirtualBand = None
-
-    def __eq__(self, other) -> bool:
-        if not isinstance(other, VRTRasterInputSourceBand):
-            return False
-        return self.mSource == other.mSource and self.mBandIndex == other.mBandIndex
-
-    def __repr__(self):
-        return f'VRTRasterInputSourceBand {self.mSource}:{self.mBandIndex}'
-
-    def __hash__(self):
-        return hash((self.mSource, self.mBandIndex))
-
-    def name(self) -> str:
-        """
-        Returns the band name
-        :return: str
-        """
-        return self.mBandName
-
-    def bandIndex(self) -> int:
-        """
-        Returns the band index
-        :return: int
-        """
-        return self.mBandIndex
-
-    def source(self) -> str:
-        """
-        Returns the source uri
-        :return: str
-        """
-        return self.mSource
-
-    def isEqual(self, other) -> bool:
-        """
-        Returns True for same input sources
-        :param other: VRTRasterInputSourceBand
-        :return: bool
-        """
-        if isinstance(other, VRTRasterInputSourceBand):
-            return self.mSource == other.mSource and self.mBandIndex == other.mBandIndex
-        else:
-            return False
-
-    def __reduce_ex__(self, protocol):
-
-        return self.__class__, (self.mSource, self.mBandIndex, self.mBandName), self.__getstate__()
-
-    def __getstate__(self):
-        state = self.__dict__.copy()
-        state.pop('mVirtualBand')
-        return state
-
-    def __setstate__(self, state):
-        self.__dict__.update(state)
-
-    def virtualBand(self):
-        return self.mVirtualBand
-
-    def toDataset(self) -> gdal.Dataset:
-        """
-        Opens the source as GDAL Dataset
-        :return: gdal.Dataset
-        """
-        ds = gdal.Open(self.source())
-        assert isinstance(ds, gdal.Dataset)
-        return ds
-
-    def toRasterLayer(self) -> QgsRasterLayer:
-        """
-        Opens the source as QgsRasterLayer
-        :return: QgsRasterLayer
-        """
-        lyr = QgsRasterLayer(self.source(), self.name(), 'gdal')
-        # todo: set renderer to this specific band
-
-        return lyr
-
-
 class VRTRasterBand(QObject):
+    """
+    Qt adapter of a VirtualBand that emits signals on changes
+    """
     sigNameChanged = pyqtSignal(str)
     sigSourceInserted = pyqtSignal(int, VRTRasterInputSourceBand)
+    # (index of first source, [list-of-VRTRasterInputSourceBand]) of a range of inserted sources
+    sigSourcesInserted = pyqtSignal(int, list)
     sigSourceRemoved = pyqtSignal(int, VRTRasterInputSourceBand)
 
     def __init__(self, name: str = '', parent=None):
         super(VRTRasterBand, self).__init__(parent)
-        self.mSources = []
-        self.mName = ''
+        self.mCore = VirtualBand()
         self.setName(name)
         self.mVRT = None
         self.mMetadataDomains = dict()
         self.mClassificationScheme = None
 
+    @staticmethod
+    def fromVirtualBand(virtualBand: VirtualBand, parent=None) -> 'VRTRasterBand':
+        """
+        Creates a VRTRasterBand around an existing VirtualBand, without emitting a signal for each of its sources
+        :param virtualBand: VirtualBand
+        :return: VRTRasterBand
+        """
+        assert isinstance(virtualBand, VirtualBand)
+        band = VRTRasterBand(parent=parent)
+        band.mCore = virtualBand
+        for src in virtualBand:
+            src.mVirtualBand = band
+        return band
+
+    @property
+    def mSources(self) -> typing.List[VRTRasterInputSourceBand]:
+        return self.mCore.mSources
+
+    @property
+    def mName(self) -> str:
+        return self.mCore.mName
+
+    def virtualBand(self) -> VirtualBand:
+        """
+        Returns the Qt-independent band definition
+        :return: VirtualBand
+        """
+        return self.mCore
+
     def __iter__(self):
         return iter(self.mSources)
 
@@ -521,10 +531,7 @@ class VRTRasterBand(QObject):
         Sets the band name
         :param name: str
         """
-        assert isinstance(name, str)
-        oldName = self.mName
-        self.mName = name
-        if oldName != self.mName:
+        if self.mCore.setName(name):
             self.sigNameChanged.emit(name)
 
     def name(self):
@@ -532,7 +539,7 @@ class VRTRasterBand(QObject):
         Returns the band name
         :return: str
         """
-        return self.mName
+        return self.mCore.name()
 
     def addSource(self, vrtRasterInputSourceBand: VRTRasterInputSourceBand):
         """
@@ -548,17 +555,55 @@ class VRTRasterBand(QObject):
         :param index: index of input sources
         :param vrtRasterInputSourceBand: input source
         """
-        assert isinstance(vrtRasterInputSourceBand, VRTRasterInputSourceBand)
+        index = self.mCore.insertSource(index, vrtRasterInputSourceBand)
         vrtRasterInputSourceBand.mVirtualBand = self
-        if index > len(self.mSources):
-            index = len(self.mSources)
+        if index is not None:
+            if not self.updatesBlocked():
+                self.sigSourceInserted.emit(index, vrtRasterInputSourceBand)
+            self.sourcesInserted(index, [vrtRasterInputSourceBand])
+
+    def insertSources(self, index: int, sources: typing.List[VRTRasterInputSourceBand]) \
+            -> typing.List[VRTRasterInputSourceBand]:
+        """
+        Inserts a range of input sources and emits a single sigSourcesInserted signal.
+        Sources whose file is already used by this band are skipped.
+        :param index: index of the first input source
+        :param sources: [list-of-VRTRasterInputSourceBand]
+        :return: [list-of-VRTRasterInputSourceBand] that have been inserted
+        """
+        index = min(index, len(self.mSources))
+        inserted = []
+        for src in sources:
+            assert isinstance(src, VRTRasterInputSourceBand)
+            if self.mCore.insertSource(index + len(inserted), src) is not None:
+                src.mVirtualBand = self
+                inserted.append(src)
+        if len(inserted) > 0:
+            self.sourcesInserted(index, inserted)
+        return inserted
+
+    def updatesBlocked(self) -> bool:
+        """
+        Returns True if the parent VRTRaster defers signals, see VRTRaster.blockUpdates()
+        :return: bool
+        """
+        return isinstance(self.mVRT, VRTRaster) and self.mVRT.updatesBlocked()
 
-        if index <= len(self.mSources) and vrtRasterInputSourceBand.source() not in self.sourceFiles():
-            self.mSources.insert(index, vrtRasterInputSourceBand)
-            self.sigSourceInserted.emit(index, vrtRasterInputSourceBand)
+    def sourcesInserted(self, index: int, sources: typing.List[VRTRasterInputSourceBand]):
+        """
+        Emits sigSourcesInserted, or defers it while the updates of the parent VRTRaster are blocked
+        """
+        if self.updatesBlocked():
+            self.mVRT.mPendingSources.setdefault(id(self), set()).update(id(src) for src in sources)
         else:
-            pass
-            # print('DEBUG: index <= len(self.sources)')
+            self.sigSourcesInserted.emit(index, sources)
+
+    def isDirty(self) -> bool:
+        """
+        Returns True if name or sources have been changed since the VRT was saved last
+        :return: bool
+        """
+        return self.mCore.isDirty()
 
     def bandIndex(self) -> int:
         """
@@ -567,9 +612,10 @@ class VRTRasterBand(QObject):
         :return: int
         """
         if isinstance(self.mVRT, VRTRaster):
-            return self.mVRT.mBands.index(self)
-        else:
-            return None
+            for i, band in enumerate(self.mVRT.mBands):
+                if band is self:
+                    return i
+        return None
 
     def removeSource(self, vrtRasterInputSourceBand):
         """
@@ -577,55 +623,47 @@ class VRTRasterBand(QObject):
         :param vrtRasterInputSourceBand: band index| VRTRasterInputSourceBand
         :return: The VRTRasterInputSourceBand that was removed
         """
-        if isinstance(vrtRasterInputSourceBand, str):
-            for sourceBand in self:
-                assert isinstance(sourceBand, VRTRasterInputSourceBand)
-                if sourceBand.source() == vrtRasterInputSourceBand:
-                    vrtRasterInputSourceBand = sourceBand
-                    break
-
-        if isinstance(vrtRasterInputSourceBand, VRTRasterInputSourceBand) and vrtRasterInputSourceBand in self.mSources:
-            i = self.mSources.index(vrtRasterInputSourceBand)
-            self.mSources.remove(vrtRasterInputSourceBand)
-            self.sigSourceRemoved.emit(i, vrtRasterInputSourceBand)
+        removed = self.mCore.removeSource(vrtRasterInputSourceBand)
+        if removed is None:
+            return None
+        index, src = removed
+        if self.updatesBlocked():
+            # the source is only known to listeners if it was not inserted while updates are blocked
+            pending = self.mVRT.mPendingSources.get(id(self), set())
+            if id(src) in pending:
+                pending.discard(id(src))
+                return src
+            index -= len([s for s in self.mSources[:index] if id(s) in pending])
+        self.sigSourceRemoved.emit(index, src)
+        return src
 
     def sourceFiles(self) -> typing.List[str]:
         """
         Returns the files paths of source files
         :return: [list-of-str]
         """
-        files = []
-        for inputSourceBand in self.mSources:
-            assert isinstance(inputSourceBand, VRTRasterInputSourceBand)
-            if inputSourceBand.source() not in files:
-                files.append(inputSourceBand.source())
-        return files
+        return self.mCore.sourceFiles()
 
     def __eq__(self, other):
         if not isinstance(other, VRTRasterBand):
             return False
-
-        if len(self) != len(other):
-            return False
-
-        for A, B in zip(self[:], other[:]):
-            if A != B:
-                return False
-
-        return True
+        return self.mCore == other.mCore
 
     def __repr__(self):
-        infos = ['VirtualBand name="{}"'.format(self.mName)]
-        for i, info in enumerate(self.mSources):
-            assert isinstance(info, VRTRasterInputSourceBand)
-            infos.append('\t{} SourceFileName {} SourceBand {}'.format(i + 1, info.mSource, info.mBandIndex))
-        return '\n'.join(infos)
+        return repr(self.mCore)
 
 
 class VRTRaster(QObject):
+    """
+    Qt adapter of a VirtualRaster. Accepts and returns QGIS types and emits signals on changes.
+    """
     sigSourceBandInserted = pyqtSignal(VRTRasterBand, VRTRasterInputSourceBand)
+    # (virtual band, index of first source, [list-of-VRTRasterInputSourceBand])
+    sigSourceBandsInserted = pyqtSignal(VRTRasterBand, int, list)
     sigSourceBandRemoved = pyqtSignal(VRTRasterBand, VRTRasterInputSourceBand)
     sigBandInserted = pyqtSignal(int, VRTRasterBand)
+    # (index of first band, [list-of-VRTRasterBand]) of a range of inserted bands
+    sigBandsInserted = pyqtSignal(int, list)
     sigBandRemoved = pyqtSignal(int, VRTRasterBand)
     sigCrsChanged = pyqtSignal(QgsCoordinateReferenceSystem)
     sigResolutionChanged = pyqtSignal()
@@ -635,40 +673,102 @@ class VRTRaster(QObject):
 
     def __init__(self, parent=None):
         super(VRTRaster, self).__init__(parent)
+        self.mCore = VirtualRaster()
         self.mBands = []
+        # (wkt, QgsCoordinateReferenceSystem) of the last CRS returned by crs()
         self.mCrs = None
-        self.mResamplingAlg = gdal.GRA_NearestNeighbour
-        self.mMetadata = dict()
-        self.mUL = None
-        self.mResolution = None
-        self.mSize = None
-        self.mNoDataValue = None
-        self.sigSourceBandInserted.connect(self.checkBasicParameters)
+        # number of nested blockUpdates() contexts and the ids of bands and sources inserted meanwhile
+        self.mUpdateBlocks = 0
+        self.mPendingBands: typing.Set[int] = set()
+        self.mPendingSources: typing.Dict[int, typing.Set[int]] = dict()
+        self.sigSourceBandsInserted.connect(lambda band, *args: self.checkBasicParameters(band))
 
-    def checkBasicParameters(self, vrtBand: VRTRasterBand):
+    def virtualRaster(self) -> VirtualRaster:
+        """
+        Returns the Qt-independent VRT definition, which can be pickled and used without QGIS
+        :return: VirtualRaster
+        """
+        return self.mCore
 
-        if len(vrtBand) == 0:
-            return
+    @contextlib.contextmanager
+    def blockUpdates(self):
+        """
+        Context manager to insert many bands and sources without emitting signals for each of them.
+        When the outermost context is left, each contiguous range of inserted bands is announced by a single
+        sigBandsInserted signal, and each contiguous range of sources inserted into existing bands by a single
+        sigSourceBandsInserted signal. The per-item signals sigBandInserted and sigSourceBandInserted are not emitted
+        for insertions made while updates are blocked.
+
+            with vrt.blockUpdates():
+                for file in files:
+                    vrt.insertSourceBand(0, file, 0)
+        """
+        self.mUpdateBlocks += 1
+        try:
+            yield self
+        finally:
+            self.mUpdateBlocks -= 1
+            if self.mUpdateBlocks == 0:
+                self.emitPendingUpdates()
 
-        if not (isinstance(self.crs(), QgsCoordinateReferenceSystem) and
-                isinstance(self.extent(), QgsRectangle) and
-                isinstance(self.resolution(), QSizeF)):
-            lyr = vrtBand[0].toRasterLayer()
-            assert isinstance(lyr, QgsRasterLayer), 'Unable to open {} as QgsRasterLayer'.format(vrtBand[0])
+    def updatesBlocked(self) -> bool:
+        """
+        Returns True if signals on inserted bands and sources are deferred, see blockUpdates()
+        :return: bool
+        """
+        return self.mUpdateBlocks > 0
 
-            if not isinstance(self.mCrs, QgsCoordinateReferenceSystem):
-                self.setCrs(lyr.crs())
+    def emitPendingUpdates(self):
+        """
+        Emits the signals deferred by blockUpdates()
+        """
+        pendingBands, self.mPendingBands = self.mPendingBands, set()
+        pendingSources, self.mPendingSources = self.mPendingSources, dict()
 
-            if not isinstance(self.mResolution, QSizeF):
-                res = resolution(lyr)
-                self.setResolution(res)
+        ranges = []
+        for i, band in enumerate(self.mBands):
+            if id(band) in pendingBands:
+                if len(ranges) > 0 and ranges[-1][0] + len(ranges[-1][1]) == i:
+                    ranges[-1][1].append(band)
+                else:
+                    ranges.append((i, [band]))
+        for i, bands in ranges:
+            self.sigBandsInserted.emit(i, bands)
+
+        for band in self.mBands:
+            if id(band) in pendingBands:
+                if len(band) > 0:
+                    self.sigSourceBandsInserted.emit(band, 0, band[:])
+                continue
+            pending = pendingSources.get(id(band), set())
+            if len(pending) == 0:
+                continue
+            ranges = []
+            for i, src in enumerate(band):
+                if id(src) in pending:
+                    if len(ranges) > 0 and ranges[-1][0] + len(ranges[-1][1]) == i:
+                        ranges[-1][1].append(src)
+                    else:
+                        ranges.append((i, [src]))
+            for i, sources in ranges:
+                band.sigSourcesInserted.emit(i, sources)
 
-            if not isinstance(self.ul(), QgsPointXY):
-                ext = lyr.extent()
-                self.mUL = QgsPointXY(ext.xMinimum(), ext.yMaximum())
+    def checkBasicParameters(self, vrtBand: VRTRasterBand):
+        """
+        Initializes an undefined CRS and raster grid from the first source of a virtual band.
+        The source properties are taken from the source info cache, so no raster layer needs to be opened.
+        :param vrtBand: VRTRasterBand
+        """
+        if len(vrtBand) == 0 or (self.mCore.wkt() is not None and self.mCore.isGridDefined()):
+            return
 
-            if not isinstance(self.size(), QSize):
-                self.setSize(QSize(lyr.width(), lyr.height()))
+        lastWkt, lastResolution = self.mCore.wkt(), self.mCore.resolution()
+        if self.mCore.initGrid(vrtBand[0].sourceInfo()):
+            if lastWkt != self.mCore.wkt():
+                self.sigCrsChanged.emit(self.crs())
+            if lastResolution != self.mCore.resolution():
+                self.sigResolutionChanged.emit()
+            self.sigExtentChanged.emit()
 
     def alignToRasterGrid(self, reference, crop: bool = False):
         """
@@ -679,7 +779,6 @@ class VRTRaster(QObject):
         lyr = qgsRasterLayer(reference)
         assert isinstance(lyr, QgsRasterLayer)
         newCRS = lyr.crs()
-        oldCRS = self.crs()
         newRes = QSizeF(lyr.rasterUnitsPerPixelY(), lyr.rasterUnitsPerPixelY())
         self.setCrs(newCRS)
         self.setResolution(newRes)
@@ -691,7 +790,6 @@ class VRTRaster(QObject):
         else:
             newExtent, px = alignRectangleToGrid(newRes, ulRef, self.extent())
         self.setExtent(newExtent, newCRS, ulRef)
-        s = ""
 
     def alignToGrid(self, pxSize: QSizeF, refPoint: QgsPointXY):
         """
@@ -699,9 +797,11 @@ class VRTRaster(QObject):
         :param pxSize: QSizeF, new pixel resolution
         :param refPoint: QgsPointXY, point int the new grid
         """
-        ext = self.extent()
-        ext2 = alignRectangleToGrid(pxSize, refPoint, ext)
-        self.setExtent(ext2)
+        lastResolution = self.mCore.resolution()
+        if self.mCore.alignToGrid((pxSize.width(), pxSize.height()), (refPoint.x(), refPoint.y())):
+            if lastResolution != self.mCore.resolution():
+                self.sigResolutionChanged.emit()
+            self.sigExtentChanged.emit()
 
     def setResamplingAlg(self, value):
         """
@@ -711,20 +811,7 @@ class VRTRaster(QObject):
             - nearest,bilinear,cubic,cubicspline,lanczos,average,mode
             - None (will set the default value to 'nearest'
         """
-        last = self.mResamplingAlg
-
-        possibleNames = RESAMPLE_ALGS.optionNames()
-        possibleValues = RESAMPLE_ALGS.optionValues()
-
-        if value is None:
-            self.mResamplingAlg = gdal.GRA_NearestNeighbour
-        elif value in possibleNames:
-            self.mResamplingAlg = possibleValues[possibleNames.index(value)]
-        elif value in possibleValues:
-            self.mResamplingAlg = value
-        else:
-            raise Exception('Unknown value "{}"'.format(value))
-        if last != self.mResamplingAlg:
+        if self.mCore.setResamplingAlg(value):
             self.sigResamplingAlgChanged[str].emit(self.resamplingAlg(asString=True))
             self.sigResamplingAlgChanged[int].emit(self.resamplingAlg())
 
@@ -734,21 +821,14 @@ class VRTRaster(QObject):
         :param asString: Set True to return the resampling algorithm as string.
         :return:  gdal.GRA* constant | str with name.
         """
-        if asString:
-            i = RESAMPLE_ALGS.optionValues().index(self.mResamplingAlg)
-
-            return RESAMPLE_ALGS.optionNames()[i]
-        else:
-            return self.mResamplingAlg
+        return self.mCore.resamplingAlg(asString=asString)
 
     def setNoDataValue(self, value):
         """
         Sets the image no data value, which will be applied to each single band
         :param value: float | None
         """
-        assert isinstance(value, (None, float))
-        if self.mNoDataValue != value:
-            self.mNoDataValue = value
+        if self.mCore.setNoDataValue(value):
             self.sigNoDataValueChanged.emit(value)
 
     def noDataValue(self) -> float:
@@ -756,7 +836,7 @@ class VRTRaster(QObject):
         Returns the image no data value
         :return: float
         """
-        return self.mNoDataValue
+        return self.mCore.noDataValue()
 
     def setExtent(self, rectangle: QgsRectangle, crs: QgsCoordinateReferenceSystem = None,
                   referenceGrid: QgsPointXY = None):
@@ -765,47 +845,27 @@ class VRTRaster(QObject):
         :param rectangle: QgsRectangle
         :param crs: QgsCoordinateReferenceSystem of coordinate in rectangle.
         """
-
-        last = self.extent()
-
-        if not isinstance(crs, QgsCoordinateReferenceSystem):
-            crs = self.mCrs
-
-        if isinstance(crs, QgsCoordinateReferenceSystem):
-            assert isinstance(self.mCrs,
-                              QgsCoordinateReferenceSystem), 'use .setCrs() to specific the VRT coordinate reference system first'
-            if crs != self.mCrs:
-                trans = QgsCoordinateTransform()
-                trans.setSourceCrs(crs)
-                trans.setDestinationCrs(self.mCrs)
-                rectangle = transformBoundingBox(rectangle, trans)
-
-                if isinstance(referenceGrid, QgsPointXY):
-                    referenceGrid = trans.transform(referenceGrid)
-
         assert isinstance(rectangle, QgsRectangle)
-        if not (rectangle.isFinite() and rectangle.width() > 0 and rectangle.height() > 0):
-            return
-
-            # align to pixel size
-        if not isinstance(referenceGrid, QgsPointXY):
-            referenceGrid = QgsPointXY(rectangle.xMinimum(), rectangle.yMaximum())
-
-        res = self.resolution()
-        if isinstance(res, QSizeF):
-            extent, px = alignRectangleToGrid(res, referenceGrid, rectangle)
-            self.mUL = QgsPointXY(extent.xMinimum(), extent.yMaximum())
-            self.setSize(px)
-
-            if last != extent:
-                self.sigExtentChanged.emit()
+        wkt = None
+        if isinstance(crs, QgsCoordinateReferenceSystem):
+            assert isinstance(self.crs(), QgsCoordinateReferenceSystem), \
+                'use .setCrs() to specific the VRT coordinate reference system first'
+            if crs != self.crs():
+                wkt = crs.toWkt()
+        if isinstance(referenceGrid, QgsPointXY):
+            referenceGrid = (referenceGrid.x(), referenceGrid.y())
+
+        bounds = (rectangle.xMinimum(), rectangle.yMinimum(), rectangle.xMaximum(), rectangle.yMaximum())
+        if self.mCore.setExtent(bounds, wkt=wkt, referenceGrid=referenceGrid):
+            self.sigExtentChanged.emit()
 
     def size(self) -> QSize:
         """
         Returns the raster size in pixel
         :return: QSize
         """
-        return self.mSize
+        size = self.mCore.size()
+        return None if size is None else QSize(*size)
 
     def setSize(self, size: QSize):
         """
@@ -813,11 +873,7 @@ class VRTRaster(QObject):
         extent
         :param size: QSize, the new raster size
         """
-        assert size.width() > 0
-        assert size.height() > 0
-
-        if self.mSize != size:
-            self.mSize = size
+        if self.mCore.setSize((size.width(), size.height())):
             self.sigExtentChanged.emit()
 
     def ul(self) -> QgsPointXY:
@@ -826,7 +882,8 @@ class VRTRaster(QObject):
 
         :return: QgsPointXY
         """
-        return self.mUL
+        ul = self.mCore.ul()
+        return None if ul is None else QgsPointXY(*ul)
 
     def lr(self) -> QgsPointXY:
         """
@@ -834,85 +891,48 @@ class VRTRaster(QObject):
 
         :return: QgsPointXY
         """
-        size = self.size()
-        res = self.resolution()
-        ul = self.ul()
-
-        if None in [size, res, ul]:
-            return None
-
-        lr = QgsPointXY(ul.x() + size.width() * res.width(),
-                        ul.y() - size.height() * res.height())
-        return lr
+        lr = self.mCore.lr()
+        return None if lr is None else QgsPointXY(*lr)
 
     def outputBounds(self) -> tuple:
         """
         Returns a bounds tuple.
         :return: tuple (xMin, yMin, xMax, yMax)
         """
-        ul = self.ul()
-        lr = self.lr()
-        return (ul.x(), lr.y(), lr.x(), ul.y())
+        return self.mCore.bounds()
 
     def extent(self) -> QgsRectangle:
         """
         Returns the spatial extent
         :return: QgsRectangle
         """
-
-        ul = self.ul()
-        lr = self.lr()
-        if ul is None or lr is None:
-            return None
-        return QgsRectangle(ul.x(), lr.y(), lr.x(), ul.y())
+        bounds = self.mCore.bounds()
+        return None if bounds is None else QgsRectangle(*bounds)
 
     def setResolution(self, resolution, crs: QgsCoordinateReferenceSystem = None):
         """
         Set the VRT resolution.
-        :param resolution: explicit value given as QSizeF(x,y) object or
-                   implicit as 'highest','lowest','average'
+        :param resolution: explicit value given as QSizeF(x,y) object.
+                           Implicit values like 'highest','lowest','average' are not supported yet and ignored.
         """
-        last = self.resolution()
-
-        if resolution is None:
-            resolution = 'average'
-
-        if isinstance(resolution, str):
-            # find source resolutions
-            res = []
-            self.sourceRaster()
-
-
-        else:
-            if isinstance(resolution, QSizeF):
-                assert resolution.width() > 0
-                assert resolution.height() > 0
-
-                if isinstance(self.crs(), QgsCoordinateReferenceSystem) and isinstance(crs,
-                                                                                       QgsCoordinateReferenceSystem):
-                    muSrc = crs.mapUnits()
-                    muDst = self.crs().mapUnits()
-                    if muSrc != muDst:
-                        # convert resolution into target units
-
-                        trans = QgsCoordinateTransform()
-                        trans.setSourceCrs(crs)
-                        trans.setDestinationCrs(self.crs())
-                        ulSrc = trans.transform(self.ul(), direction=QgsCoordinateTransform.ReverseTransform)
-                        lrSrc = QgsPointXY(ulSrc.x() + resolution.width(), ulSrc.y() + resolution.height())
-                        vect = self.ul() - trans.transform(lrSrc)
-
-                        resolution = QSizeF(abs(vect.x()), abs(vect.y()))
-
-                self.mResolution = QSizeF(resolution)
-                # adjust extent
-                s = ""
-
-            elif isinstance(resolution, str):
-                assert resolution in ['average', 'highest', 'lowest']
-                self.mResolution = resolution
-
-        if last != self.mResolution:
+        if not isinstance(resolution, QSizeF):
+            return
+        assert resolution.width() > 0
+        assert resolution.height() > 0
+
+        if isinstance(self.crs(), QgsCoordinateReferenceSystem) and isinstance(crs, QgsCoordinateReferenceSystem):
+            muSrc = crs.mapUnits()
+            muDst = self.crs().mapUnits()
+            if muSrc != muDst:
+                # convert resolution into target units
+                trans = qgsCrsCache().transform(crs, self.crs())
+                ulSrc = trans.transform(self.ul(), direction=QgsCoordinateTransform.ReverseTransform)
+                lrSrc = QgsPointXY(ulSrc.x() + resolution.width(), ulSrc.y() + resolution.height())
+                vect = self.ul() - trans.transform(lrSrc)
+
+                resolution = QSizeF(abs(vect.x()), abs(vect.y()))
+
+        if self.mCore.setResolution((resolution.width(), resolution.height())):
             self.sigResolutionChanged.emit()
 
     def resolution(self) -> QSizeF:
@@ -920,15 +940,8 @@ class VRTRaster(QObject):
         Returns the internal resolution / pixel size
         :return: QSizeF
         """
-        if isinstance(self.mResolution, QSizeF):
-            return self.mResolution
-        elif self.mResolution == 'average':
-            pass
-        elif self.mResolution == 'min':
-            pass
-        elif self.mResolution == 'max':
-            pass
-        return None
+        res = self.mCore.resolution()
+        return None if res is None else QSizeF(*res)
 
     def setCrs(self, crs, warpArgs: dict = None):
         """
@@ -937,86 +950,35 @@ class VRTRaster(QObject):
         :param crs: osr.SpatialReference or QgsCoordinateReferenceSystem
         """
         if isinstance(crs, osr.SpatialReference):
-            auth = '{}:{}'.format(crs.GetAttrValue('AUTHORITY', 0), crs.GetAttrValue('AUTHORITY', 1))
-            crs = QgsCoordinateReferenceSystem(auth)
+            crs = qgsCrsCache().crs(crs)
         assert isinstance(crs, QgsCoordinateReferenceSystem)
         if crs != self.crs():
-            crsOld = self.crs()
-            crsNew = crs
-
-            self.mCrs = crs
-
-            try:
-                if isinstance(crsOld, QgsCoordinateReferenceSystem) and isinstance(self.size(), QSize):
-                    drvVRT = gdal.GetDriverByName('VRT')
-                    id = uuid.uuid4()
-                    tmpSrc = '/vsimem/tmp.{}.src.vrt'.format(id)
-                    tmpDst = '/vsimem/tmp.{}.dst.vrt'.format(id)
-
-                    dsVRTDummySrc = drvVRT.Create(tmpSrc, self.size().width(), self.size().height(), 1,
-                                                  eType=gdal.GDT_Byte)
-                    dsVRTDummySrc.SetProjection(crsOld.toWkt())
-                    dsVRTDummySrc.SetGeoTransform(geotransform(self.ul(), self.resolution()))
-                    dsVRTDummySrc.FlushCache()
-
-                    if not isinstance(warpArgs, dict):
-                        warpArgs = dict()
-
-                    wops = gdal.WarpOptions(dstSRS=crsNew.toWkt(),
-                                            # outputBoundsSRS=self.srs(), #keep same bounds
-                                            # outputBounds=self.outputBounds(),
-                                            format='VRT',
-                                            **warpArgs)
-
-                    dsVRTWarped = gdal.Warp(tmpDst, dsVRTDummySrc, options=wops)
-                    gdal.Unlink(tmpSrc)
-
-                    if not isinstance(dsVRTWarped, gdal.Dataset):
-                        trans = QgsCoordinateTransform()
-                        trans.setSourceCrs(crsOld)
-                        trans.setDestinationCrs(crsNew)
-
-                        ul2 = trans.transform(self.ul())
-                        lr2 = trans.transform(self.lr())
-                        raise Exception(
-                            'Warping failed from \n{} \nto {}'.format(self.crs().description(), crs.description()))
-
-                    gt = dsVRTWarped.GetGeoTransform()
-                    ul = px2geo(QgsPoint(0, 0), gt)
-                    size = QSize(dsVRTWarped.RasterXSize, dsVRTWarped.RasterYSize)
-                    res = resolution(dsVRTWarped)
-                    # clean
-                    dsVRTDummySrc = dsVRTWarped = None
-
-                    gdal.Unlink(tmpDst)
-
-                    # set new image properties
-                    self.mUL = ul
-                    self.mSize = size
-                    self.mResolution = res
-                    self.sigExtentChanged.emit()
-            except Exception as ex:
-                print(ex, file=sys.stderr)
-
-            self.sigCrsChanged.emit(self.mCrs)
+            lastGrid = (self.mCore.ul(), self.mCore.resolution(), self.mCore.size())
+            wkt = crs.toWkt()
+            self.mCore.setWkt(wkt, warpArgs=warpArgs)
+            self.mCrs = (wkt, crs)
+            if lastGrid != (self.mCore.ul(), self.mCore.resolution(), self.mCore.size()):
+                self.sigExtentChanged.emit()
+            self.sigCrsChanged.emit(crs)
 
     def crs(self) -> QgsCoordinateReferenceSystem:
         """
         Returns the raster coordinate reference system / projection system
         :return: QgsCoordinateReferenceSystem
         """
-        return self.mCrs
+        wkt = self.mCore.wkt()
+        if wkt is None:
+            return None
+        if self.mCrs is None or self.mCrs[0] != wkt:
+            self.mCrs = (wkt, qgsCrsCache().crs(wkt))
+        return self.mCrs[1]
 
     def srs(self) -> osr.SpatialReference:
         """
         Returns the raster coordinate reference system / projection system as osr.SpatialReference
         :return: osr.SpatialReference
         """
-        if not isinstance(self.mCrs, QgsCoordinateReferenceSystem):
-            return None
-        srs = osr.SpatialReference()
-        srs.ImportFromWkt(self.mCrs.toWkt())
-        return srs
+        return self.mCore.srs()
 
     def addVirtualBand(self, virtualBand: VRTRasterBand):
         """
@@ -1039,7 +1001,7 @@ class VRTRaster(QObject):
             self.insertVirtualBand(len(self.mBands), VRTRasterBand())
 
         vBand = self.mBands[virtualBandIndex]
-        vBand.addSourceBand(pathSource, sourceBandIndex)
+        vBand.addSource(VRTRasterInputSourceBand(pathSource, sourceBandIndex))
 
     def insertVirtualBand(self, index: int, virtualBand: VRTRasterBand):
         """
@@ -1056,26 +1018,82 @@ class VRTRaster(QObject):
 
         virtualBand.sigSourceInserted.connect(
             lambda _, sourceBand: self.sigSourceBandInserted.emit(virtualBand, sourceBand))
+        virtualBand.sigSourcesInserted.connect(
+            lambda i, sourceBands: self.sigSourceBandsInserted.emit(virtualBand, i, sourceBands))
         virtualBand.sigSourceRemoved.connect(
-            lambda _, sourceBand: self.sigSourceBandInserted.emit(virtualBand, sourceBand))
+            lambda _, sourceBand: self.sigSourceBandRemoved.emit(virtualBand, sourceBand))
 
+        self.mCore.insertBand(index, virtualBand.mCore)
         self.mBands.insert(index, virtualBand)
-        self.checkBasicParameters(virtualBand)
-        self.sigBandInserted.emit(index, virtualBand)
+        if self.updatesBlocked():
+            self.mPendingBands.add(id(virtualBand))
+        else:
+            self.sigBandInserted.emit(index, virtualBand)
+            self.sigBandsInserted.emit(index, [virtualBand])
+            if len(virtualBand) > 0:
+                self.sigSourceBandsInserted.emit(virtualBand, 0, virtualBand[:])
 
         return self[index]
 
+    def insertVirtualBands(self, index: int, virtualBands: typing.List[VRTRasterBand]) -> typing.List[VRTRasterBand]:
+        """
+        Inserts a range of virtual bands and emits a single sigBandsInserted signal
+        :param index: the insert position of the first band
+        :param virtualBands: [list-of-VRTRasterBand]
+        :return: [list-of-VRTRasterBand]
+        """
+        with self.blockUpdates():
+            for i, virtualBand in enumerate(virtualBands):
+                self.insertVirtualBand(index + i, virtualBand)
+        return virtualBands
+
+    def addVirtualBands(self, virtualBands: typing.List[VRTRasterBand]) -> typing.List[VRTRasterBand]:
+        """
+        Appends a range of virtual bands and emits a single sigBandsInserted signal
+        :param virtualBands: [list-of-VRTRasterBand]
+        :return: [list-of-VRTRasterBand]
+        """
+        return self.insertVirtualBands(len(self), virtualBands)
+
+    def insertSources(self, virtualBandIndex: int, sourceBands: typing.List[typing.List[VRTRasterInputSourceBand]],
+                      sourceIndex: int = None) -> typing.List[VRTRasterBand]:
+        """
+        Inserts input sources into consecutive virtual bands. Missing virtual bands are appended.
+        All changes are announced with one signal per range of bands or sources, see blockUpdates().
+        :param virtualBandIndex: index of the first virtual band
+        :param sourceBands: [[list-of-VRTRasterInputSourceBand] for each virtual band]
+        :param sourceIndex: insert position within each virtual band, defaults to the end of each band
+        :return: [list-of-VRTRasterBand] the sources have been inserted in
+        """
+        assert virtualBandIndex <= len(self)
+        with self.blockUpdates():
+            missing = virtualBandIndex + len(sourceBands) - len(self)
+            if missing > 0:
+                self.addVirtualBands([VRTRasterBand() for _ in range(missing)])
+            bands = self.mBands[virtualBandIndex:virtualBandIndex + len(sourceBands)]
+            for vBand, sources in zip(bands, sourceBands):
+                vBand.insertSources(len(vBand) if sourceIndex is None else sourceIndex, sources)
+        return bands
+
     def removeVirtualBands(self, bandsOrIndices):
         assert isinstance(bandsOrIndices, list)
         to_remove = []
         for virtualBand in bandsOrIndices:
             if not isinstance(virtualBand, VRTRasterBand):
                 virtualBand = self.mBands[virtualBand]
-            to_remove.append((self.mBands.index(virtualBand), virtualBand))
+            to_remove.append((virtualBand.bandIndex(), virtualBand))
 
         to_remove = sorted(to_remove, key=lambda t: t[0], reverse=True)
         for index, virtualBand in to_remove:
-            self.mBands.remove(virtualBand)
+            self.mCore.removeBands([index])
+            del self.mBands[index]
+            if self.updatesBlocked():
+                self.mPendingSources.pop(id(virtualBand), None)
+                if id(virtualBand) in self.mPendingBands:
+                    # listeners never got to know this band
+                    self.mPendingBands.discard(id(virtualBand))
+                    continue
+                index -= len([b for b in self.mBands[:index] if id(b) in self.mPendingBands])
             self.sigBandRemoved.emit(index, virtualBand)
 
     def removeInputSource(self, path: str):
@@ -1083,11 +1101,26 @@ class VRTRaster(QObject):
         Removes all bands that relate to a input source image.
         :param path: str, path of input source image
         """
-        assert path in self.sourceRaster()
-        for vBand in self.mBands:
+        assert self.mCore.hasSource(path)
+        for _, src in self.mCore.inputSources(path):
+            vBand = src.virtualBand()
             assert isinstance(vBand, VRTRasterBand)
-            if path in vBand.sourceFiles():
-                vBand.removeSource(path)
+            vBand.removeSource(src)
+
+    def hasSource(self, path: str) -> bool:
+        """
+        Returns True if an input source image is used by any virtual band
+        :param path: str
+        :return: bool
+        """
+        return self.mCore.hasSource(path)
+
+    def sourceCount(self) -> int:
+        """
+        Returns the number of unique input source images
+        :return: int
+        """
+        return self.mCore.sourceCount()
 
     def removeVirtualBand(self, bandOrIndex):
         """
@@ -1096,23 +1129,33 @@ class VRTRaster(QObject):
         """
         self.removeVirtualBands([bandOrIndex])
 
+    def setMaxWorkers(self, maxWorkers: int):
+        """
+        Sets the number of threads used to read the properties of source files
+        :param maxWorkers: int, use 1 to read sources sequentially
+        """
+        self.mCore.setMaxWorkers(maxWorkers)
+
+    def maxWorkers(self) -> int:
+        """
+        Returns the number of threads used to read the properties of source files
+        :return: int
+        """
+        return self.mCore.maxWorkers()
+
     def addFilesAsMosaic(self, files):
         """
         Shortcut to mosaic all input files. All bands will maintain their band position in the virtual file.
         :param files: [list-of-file-paths]
         """
-
-        for file in files:
-            ds = gdal.Open(file)
-            assert isinstance(ds, gdal.Dataset)
-            nb = ds.RasterCount
-            for b in range(nb):
-                if b + 1 > len(self):
-                    # add new virtual band
-                    self.addVirtualBand(VRTRasterBand())
-                vBand = self[b]
-                assert isinstance(vBand, VRTRasterBand)
-                vBand.addSource(VRTRasterInputSourceBand(file, b))
+        files = [f.as_posix() if isinstance(f, pathlib.Path) else f for f in files]
+        sourceBands = []
+        for file, info in zip(files, readSourceInfos(files, maxWorkers=self.maxWorkers())):
+            for b in range(info.bandCount()):
+                if b + 1 > len(sourceBands):
+                    sourceBands.append([])
+                sourceBands[b].append(VRTRasterInputSourceBand(file, b))
+        self.insertSources(0, sourceBands)
         return self
 
     def addFilesAsStack(self, files: list):
@@ -1123,323 +1166,122 @@ class VRTRaster(QObject):
         :return: self
         """
         assert isinstance(files, list)
-        for file in files:
-            ds = gdalDataset(file)
-            assert isinstance(ds, gdal.Dataset), 'Can not open {} as gdal.Dataset'.format(file)
-            nb = ds.RasterCount
-            ds = None
-            for b in range(nb):
+        files = [f.as_posix() if isinstance(f, pathlib.Path) else f for f in files]
+        virtualBands = []
+        for file, info in zip(files, readSourceInfos(files, maxWorkers=self.maxWorkers())):
+            for b in range(info.bandCount()):
                 # each new band is a new virtual band
-                vBand = self.addVirtualBand(VRTRasterBand())
-                assert isinstance(vBand, VRTRasterBand)
+                vBand = VRTRasterBand()
                 vBand.addSource(VRTRasterInputSourceBand(file, b))
-
+                virtualBands.append(vBand)
+        self.addVirtualBands(virtualBands)
         return self
 
-    def sourceRaster(self) -> typing.List[str]:
+    def sourceRaster(self, extent: QgsRectangle = None) -> typing.List[str]:
         """
         Returns the list of source raster files.
+        :param extent: QgsRectangle, optional, to return only sources that intersect this extent in the VRT CRS
         :return: [list-of-str]
         """
-        files = []
-        for vBand in self:
-            assert isinstance(vBand, VRTRasterBand)
-            for file in vBand.sourceFiles():
-                if file not in files:
-                    files.append(file)
-        return files
+        if isinstance(extent, QgsRectangle):
+            return self.mCore.sourceRaster(bounds=(extent.xMinimum(), extent.yMinimum(),
+                                                   extent.xMaximum(), extent.yMaximum()))
+        return self.mCore.sourceRaster()
 
     def fullSourceRasterExtent(self) -> QgsRectangle:
         """
-        Returns a list of (str, QgsRectangle)
-        :return: [(str, QgsRectangle),...]
+        Returns the extent of all source rasters in the VRT CRS
+        :return: QgsRectangle
         """
+        bounds = self.mCore.fullSourceRasterExtent()
+        return None if bounds is None else QgsRectangle(*bounds)
 
-        extent = None
-        crs = self.crs()
-        for src in self.sourceRaster():
-
-            lyr = QgsRasterLayer(src)
-            ext = lyr.extent()
-            trans = QgsCoordinateTransform()
-            trans.setSourceCrs(lyr.crs())
-            trans.setDestinationCrs(self.crs())
-            ext = trans.transform(ext)
-            if not isinstance(extent, QgsRectangle):
-                extent = ext
-            else:
-                extent.combineExtentWith(ext)
-        return extent
+    def sourceFootprints(self) -> core.SourceFootprints:
+        """
+        Returns the footprints of all source rasters in the VRT CRS
+        :return: SourceFootprints
+        """
+        return self.mCore.sourceFootprints()
 
     def loadVRT(self, pathVRT, bandIndex=None):
         """
-        Load the VRT definition in pathVRT and appends it to this VRT
+        Load the VRT definition in pathVRT and appends it to this VRT.
+        The VRT XML is streamed once and each virtual band is inserted with all its sources at once.
         :param pathVRT:
         """
         if pathVRT in [None, '']:
             return
 
-        pathVRT = pathlib.Path(pathVRT)
-
         if bandIndex is None:
             bandIndex = len(self.mBands)
 
-        ds = gdal.Open(pathVRT.as_posix())
-        assert isinstance(ds, gdal.Dataset)
-        assert ds.GetDriver().GetDescription() == 'VRT'
-
-        for b in range(ds.RasterCount):
-            srcBand = ds.GetRasterBand(b + 1)
-            assert isinstance(srcBand, gdal.Band)
-
-            vrtBand = VRTRasterBand(name=srcBand.GetDescription())
+        bands, noData = readVRTBands(pathVRT)
+        if noData is not None:
+            self.setNoDataValue(noData)
 
-            for key, xml in srcBand.GetMetadata(str('vrt_sources')).items():
-                tree = ElementTree.fromstring(xml)
-                srcPath = tree.find('SourceFilename').text
-                srcBandIndex = int(tree.find('SourceBand').text) - 1
-                vrtBand.addSource(VRTRasterInputSourceBand(srcPath, srcBandIndex))
+        self.insertVirtualBands(bandIndex, [VRTRasterBand.fromVirtualBand(band) for band in bands])
 
-            if b == 0:
-                noData = srcBand.GetNoDataValue()
-                if noData is not None:
-                    self.setNoDataValue(noData)
-
-            self.insertVirtualBand(bandIndex, vrtBand)
-
-            bandIndex += 1
+    def isDirty(self) -> bool:
+        """
+        Returns True if bands, grid or CRS have been changed since the VRT was saved last
+        :return: bool
+        """
+        return self.mCore.isDirty()
 
-    def saveVRT(self, pathVRT) -> gdal.Dataset:
+    def saveVRT(self, pathVRT, incremental: bool = True,
+                overviews: str = None, overviewResampling: str = 'AVERAGE',
+                maxSourcesPerVRT: int = None) -> gdal.Dataset:
         """
         Save the VRT to path.
         If source images need to be warped to the final CRS warped VRT image will be created in a folder
         <directory>/<basename>+<warpedImageFolder>/
 
+        The VRT XML is written in a single pass from the source properties (size, geo-transformation, data type,
+        no-data), which are read concurrently, see setMaxWorkers().
+        Saving to the same path again only updates the changed bands, see VirtualRaster.saveVRT.
+
         :param pathVRT: str, path of final VRT.
-        :param warpedImageFolder: basename of folder that is created
-        :return:
-        """
-        """
-        :param pathVRT: 
-        :return:
-        
+        :param incremental: set False to create the VRT and all warped sources from scratch
+        :param overviews: None, core.VRT_OVERVIEWS_SOURCES or core.VRT_OVERVIEWS_BUILD, see VirtualRaster.saveVRT
+        :param overviewResampling: resampling algorithm of the overviews
+        :param maxSourcesPerVRT: int, to write VRTs with more sources as hierarchical VRT of VRTs
+        :return: gdal.Dataset
         """
-
-        sources = self.sourceRaster()
-        assert len(sources) >= 1, 'VRT needs to define at least 1 input source'
+        assert len(self.sourceRaster()) >= 1, 'VRT needs to define at least 1 input source'
 
         pathVRT: pathlib.Path = pathlib.Path(pathVRT)
-
         assert pathVRT.name.endswith('.vrt')
+        assert isinstance(self.extent(), QgsRectangle) and isinstance(self.resolution(), QSizeF), \
+            'VRT raster grid is undefined'
 
-        srcPathLookup = dict()
-        srcNodata = None
-        inMemory = pathVRT.as_posix().startswith('/vsimem/')
-
-        if inMemory:
-            dirWarped = '/vsimem/'
-            # gdal.Mkdir(dirWarped, 1)
-        else:
-            dirWarped = pathVRT.parent / (os.path.splitext(pathVRT.name)[0] + '.WarpedImages')
-            os.makedirs(dirWarped, exist_ok=True)
-
-        dstExtent = self.extent()
-        outputBounds = (dstExtent.xMinimum(), dstExtent.yMinimum(), dstExtent.xMaximum(), dstExtent.yMaximum())
-        outputBoundsSRS = self.srs()
-
-        for i, pathSrc in enumerate(self.sourceRaster()):
-            dsSrc = gdal.Open(pathSrc)
-            assert isinstance(dsSrc, gdal.Dataset)
-            band = dsSrc.GetRasterBand(1)
-            noData = band.GetNoDataValue()
-            if noData and srcNodata is None:
-                srcNodata = noData
-
-            crs = QgsCoordinateReferenceSystem(dsSrc.GetProjection())
-
-            if crs == self.crs():
-                srcPathLookup[pathSrc] = pathSrc
-            else:
-                # reproject, if necessary, based on VRT
-                bn = os.path.basename(pathSrc)
-                warpedFileName = 'warped.{}.{}.vrt'.format(bn, uuid.uuid4())
-                if inMemory:
-                    warpedFileName = dirWarped + warpedFileName
-                else:
-                    warpedFileName = os.path.join(dirWarped, warpedFileName)
-
-                wops = gdal.WarpOptions(format='VRT',
-                                        resampleAlg=self.mResamplingAlg,
-                                        outputBounds=outputBounds,
-                                        outputBoundsSRS=outputBoundsSRS,
-                                        xRes=self.resolution().width(),
-                                        yRes=self.resolution().height(),
-                                        dstSRS=self.mCrs.toWkt())
-
-                tmp = gdal.Warp(warpedFileName, dsSrc, options=wops)
-                assert isinstance(tmp, gdal.Dataset)
-                crs = QgsCoordinateReferenceSystem(tmp.GetProjection())
-                if not crs == self.crs():
-                    s = ""
-
-                srcPathLookup[pathSrc] = warpedFileName
-
-        srcFiles = [srcPathLookup[src] for src in self.sourceRaster()]
-
-        # these need to be set
-        ns = nl = gt = crs = eType = None
-        res = self.resolution()
-        extent = self.extent()
-
-        srs = None
-        if isinstance(self.crs(), QgsCoordinateReferenceSystem):
-            srs = self.crs().toWkt()
-
-        if len(srcFiles) > 0:
-            # 1. build a temporary VRT that describes the spatial proportions of all input sources
-            kwds = {}
-
-            if res is None:
-                res = 'average'
-
-            if isinstance(res, QSizeF):
-                # kwds['resolution'] = 'user'
-                kwds['xRes'] = res.width()
-                kwds['yRes'] = res.height()
-            else:
-                assert res in ['highest', 'lowest', 'average']
-                kwds['resolution'] = res
-
-            if isinstance(extent, QgsRectangle):
-                kwds['outputBounds'] = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
-                pass
-
-            if srs is not None:
-                kwds['outputSRS'] = srs
-
-            kwds['bandList'] = [1 for _ in srcFiles]  # use the first band only.
-            kwds['separate'] = True
-
-            vro = gdal.BuildVRTOptions(**kwds)
-
-            pathTemplateVRT = '/vsimem/template.{}.vrt'.format(uuid.uuid4())
-            dsVRTDst = gdal.BuildVRT(pathTemplateVRT, srcFiles, options=vro)
-            dsVRTDst.FlushCache()
-            assert isinstance(dsVRTDst, gdal.Dataset)
-            assert isinstance(dsVRTDst.GetFileList(), list)
-            if not dsVRTDst.RasterCount == len(srcFiles):
-                ds0 = gdal.Open(srcFiles[0])
-                res0 = resolution(ds0)
-                pUL = px2geo(QPoint(0, 0), ds0.GetGeoTransform())
-                pLR = px2geo(QPoint(ds0.RasterXSize, ds0.RasterYSize), ds0.GetGeoTransform())
-                ex0 = QgsRectangle(pUL, pLR)
-
-                if not (self.extent().contains(ex0) or self.extent().intersects(ex0)):
-                    s = ""
-                lyr2 = QgsRasterLayer(srcFiles[0])
-                assert lyr2.isValid()
-                s = ""
-
-            assert dsVRTDst.RasterCount == len(srcFiles)
-            ns, nl = dsVRTDst.RasterXSize, dsVRTDst.RasterYSize
-            gt = dsVRTDst.GetGeoTransform()
-
-            SOURCE_TEMPLATES = dict()
-            for i, srcFile in enumerate(srcFiles):
-                band = dsVRTDst.GetRasterBand(i + 1)
-                if not isinstance(band, gdal.Band):
-                    s = ""
-                assert isinstance(band, gdal.Band)
-                if i == 0:
-                    eType = band.DataType
-                vrt_sources = dsVRTDst.GetRasterBand(i + 1).GetMetadata(str('vrt_sources'))
-                assert len(vrt_sources) == 1
-                srcXML = vrt_sources['source_0']
-                assert os.path.basename(srcFile) + '</SourceFilename>' in srcXML
-                assert '<SourceBand>1</SourceBand>' in srcXML
-                SOURCE_TEMPLATES[srcFile] = srcXML
-            gdal.Unlink(pathTemplateVRT)
-            # drvVRT.Delete(pathInMEMVRT)
-
-        else:
-            # special case: no source files defined
-            ns = nl = 1  # this is the minimum size
-            if isinstance(extent, QgsRectangle):
-                x0 = extent.xMinimum()
-                y1 = extent.yMaximum()
-            else:
-                x0 = 0
-                y1 = 0
-
-            if isinstance(res, QSizeF):
-                resx = res.width()
-                resy = res.height()
-            else:
-                resx = 1
-                resy = 1
-
-            gt = (x0, resx, 0, y1, 0, -resy)
-            eType = gdal.GDT_Float32
-
-        # 2. build final VRT from scratch
-        drvVRT = gdal.GetDriverByName('VRT')
-        assert isinstance(drvVRT, gdal.Driver)
-        dsVRTDst = drvVRT.Create(pathVRT.as_posix(), ns, nl, 0, eType=eType)
-        assert isinstance(dsVRTDst, gdal.Dataset)
-        # 2.1. set general properties
-
-        if srs is not None:
-            dsVRTDst.SetProjection(srs)
-        dsVRTDst.SetGeoTransform(gt)
-
-        # 2.2. add virtual bands
-        for i, vBand in enumerate(self.mBands):
-            assert isinstance(vBand, VRTRasterBand)
-            assert dsVRTDst.AddBand(eType, options=['subClass=VRTSourcedRasterBand']) == 0
-            vrtBandDst = dsVRTDst.GetRasterBand(i + 1)
-            assert isinstance(vrtBandDst, gdal.Band)
-            vrtBandDst.SetDescription(vBand.name())
-            md = {}
-            # add all input sources for this virtual band
-            for iSrc, sourceInfo in enumerate(vBand.mSources):
-                assert isinstance(sourceInfo, VRTRasterInputSourceBand)
-                bandIndex = sourceInfo.mBandIndex
-                xml = SOURCE_TEMPLATES[srcPathLookup[sourceInfo.mSource]]
-                xml = re.sub('<SourceBand>1</SourceBand>', '<SourceBand>{}</SourceBand>'.format(bandIndex + 1), xml)
-                md['source_{}'.format(iSrc)] = xml
-            vrtBandDst.SetMetadata(md, 'vrt_sources')
-
-        assert dsVRTDst.RasterCount == len(self.mBands)
-        dsVRTDst.FlushCache()
-        # dsVRTDst = None
+        self.mCore.saveVRT(pathVRT, incremental=incremental, overviews=overviews,
+                           overviewResampling=overviewResampling, maxSourcesPerVRT=maxSourcesPerVRT)
 
         # check if we get what we like to get
         dsCheck = gdal.Open(pathVRT.as_posix())
         assert isinstance(dsCheck, gdal.Dataset)
+        assert dsCheck.RasterCount == len(self.mBands)
 
         return dsCheck
 
+    def saveTileIndex(self, pathIndex, layerName: str = core.GTI_LAYER_NAME) -> str:
+        """
+        Saves the mosaic as GDAL raster tile index (GTI) GeoPackage, see VirtualRaster.saveTileIndex
+        :param pathIndex: str, path of the GeoPackage, e.g. "mosaic.gti.gpkg"
+        :param layerName: name of the tile index layer
+        :return: str, path of the GeoPackage
+        """
+        assert isinstance(self.extent(), QgsRectangle) and isinstance(self.resolution(), QSizeF), \
+            'VRT raster grid is undefined'
+        return self.mCore.saveTileIndex(pathIndex, layerName=layerName)
+
     def __eq__(self, other):
         if not isinstance(other, VRTRaster):
             return False
-        if not (self.size() == other.size() and
-                self.crs() == other.crs() and
-                self.resolution() == other.resolution() and
-                self.noDataValue() == other.noDataValue() and
-                len(self) == len(other)):
-            return False
-        for bA, bB in zip(self[:], other[:]):
-            if bA != bB:
-                return False
-        return True
+        return self.mCore == other.mCore
 
     def __repr__(self):
-
-        info = ['VirtualRasterBuilder: {} bands, {} source files'.format(
-            len(self.mBands), len(self.sourceRaster()))]
-        for vBand in self.mBands:
-            info.append(str(vBand))
-        return '\n'.join(info)
+        return repr(self.mCore)
 
     def __len__(self):
         return len(self.mBands)
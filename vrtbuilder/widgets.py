@@ -25,6 +25,8 @@ import os
 import typing
 import re
 import enum
+import sys
+import time
 from .externals.qps.maptools import SpatialExtentMapTool
 from .externals.qps.models import TreeModel, TreeNode, TreeView
 from osgeo import gdal
@@ -32,7 +34,7 @@ from qgis.PyQt.QtGui import *
 from qgis.PyQt.QtCore import *
 from qgis.PyQt.QtWidgets import *
 from qgis.PyQt.QtXml import QDomDocument, QDomElement
-from qgis.core import QgsRasterLayer, QgsMapLayer, QgsVectorLayer, \
+from qgis.core import QgsApplication, QgsTask, QgsRasterLayer, QgsMapLayer, QgsVectorLayer, \
     QgsCoordinateReferenceSystem, QgsUnitTypes, QgsRectangle, QgsCoordinateTransform, \
     QgsPointXY, QgsWkbTypes, QgsProject, \
     QgsGeometry, QgsMapLayerStore
@@ -41,7 +43,11 @@ from qgis.gui import QgsMapCanvas, QgsFileWidget, QgsRubberBand, QgisInterface,
     QgsStatusBar
 
 from vrtbuilder import DIR_UI, __version__, URL_REPOSITORY, URL_ISSUETRACKER, URL_HOMEPAGE
-from .virtualrasters import VRTRaster, VRTRasterBand, VRTRasterInputSourceBand, RESAMPLE_ALGS, resolution
+from .virtualrasters import VRTRaster, VRTRasterBand, VRTRasterInputSourceBand, RESAMPLE_ALGS, resolution, \
+    qgsCrsCache
+from .core import RasterSourceInfo, readSourceInfos, sourceInfo
+from .scan import expandSources
+from .materialize import materialize, MaterializeProgress
 from .externals.qps.utils import loadUi, SpatialExtent, SpatialPoint, qgsRasterLayer, qgsRasterLayers, qgsMapLayer
 from .externals.qps.maptools import MapTools
 
@@ -55,6 +61,13 @@ LUT_FILEXTENSIONS = {}
 MDK_BANDLIST = 'hub.vrtbuilder/bandlist'
 MDK_INDICES = 'hub.vrtbuilder/vrt.indices'
 
+# max. number of QgsRasterLayers kept open by a SourceRasterModel
+RASTER_LAYER_CACHE_SIZE = 64
+# number of source files from which on addSourceFiles reads them in a background task
+SOURCE_IMPORT_TASK_THRESHOLD = 100
+# number of source files a SourceRasterLoadingTask returns at once
+SOURCE_IMPORT_BLOCK_SIZE = 250
+
 for i in range(gdal.GetDriverCount()):
     drv = gdal.GetDriver(i)
     assert isinstance(drv, gdal.Driver)
@@ -173,15 +186,13 @@ class VRTRasterNode(TreeNode):
         assert isinstance(vrtRaster, VRTRaster)
         super().__init__()
         self.mVRTRaster = vrtRaster
-        self.mVRTRaster.sigBandInserted.connect(self.onBandInserted)
+        self.mVRTRaster.sigBandsInserted.connect(self.onBandsInserted)
         self.mVRTRaster.sigBandRemoved.connect(self.onBandRemoved)
 
-    def onBandInserted(self, index: int, vrtRasterBand):
-        assert isinstance(vrtRasterBand, VRTRasterBand)
-        i = vrtRasterBand.bandIndex()
-        assert i == index
-        node = VRTRasterBandNode(vrtRasterBand)
-        self.insertChildNodes(i, node)
+    def onBandsInserted(self, index: int, vrtRasterBands: list):
+        assert vrtRasterBands[0].bandIndex() == index
+        nodes = [VRTRasterBandNode(vrtRasterBand) for vrtRasterBand in vrtRasterBands]
+        self.insertChildNodes(index, nodes)
 
     def onBandRemoved(self, index: int):
         self.removeChildNodes(self.mChildren[index])
@@ -197,19 +208,17 @@ class VRTRasterBandNode(TreeNode):
         self.setIcon(QIcon(":/vrtbuilder/mIconVirtualRaster.svg"))
 
         virtualBand.sigNameChanged.connect(self.setName)
-        virtualBand.sigSourceInserted.connect(lambda _, src: self.onSourceInserted(src))
+        virtualBand.sigSourcesInserted.connect(self.onSourcesInserted)
         virtualBand.sigSourceRemoved.connect(self.onSourceRemoved)
 
-        for src in self.mVirtualBand:
-            self.onSourceInserted(src)
-
-    def onSourceInserted(self, inputSource: VRTRasterInputSourceBand):
-        assert isinstance(inputSource, VRTRasterInputSourceBand)
-        assert inputSource.virtualBand() == self.mVirtualBand
-        i = self.mVirtualBand.mSources.index(inputSource)
+        self.onSourcesInserted(0, self.mVirtualBand[:])
 
-        node = VRTRasterInputSourceBandNode(self, inputSource)
-        self.insertChildNodes(i, node)
+    def onSourcesInserted(self, index: int, inputSources: list):
+        if len(inputSources) == 0:
+            return
+        assert inputSources[0].virtualBand() is self.mVirtualBand
+        nodes = [VRTRasterInputSourceBandNode(self, inputSource) for inputSource in inputSources]
+        self.insertChildNodes(index, nodes)
 
     def onSourceRemoved(self, row: int, inputSource: VRTRasterInputSourceBand):
         assert isinstance(inputSource, VRTRasterInputSourceBand)
@@ -340,54 +349,191 @@ class VRTRasterPreviewMapCanvas(QgsMapCanvas):
         self.refresh()
 
 
+class RasterLayerCache(object):
+    """
+    A least-recently-used cache of QgsRasterLayers, so that layers are created on demand only
+    and released when not used for a while
+    """
+
+    def __init__(self, maxSize: int = RASTER_LAYER_CACHE_SIZE):
+        assert maxSize > 0
+        self.mMaxSize = maxSize
+        self.mLayers: typing.Dict[str, QgsRasterLayer] = OrderedDict()
+
+    def __len__(self):
+        return len(self.mLayers)
+
+    def __contains__(self, path: str):
+        return path in self.mLayers
+
+    def layer(self, path: str) -> typing.Optional[QgsRasterLayer]:
+        """
+        Returns the QgsRasterLayer of a source file, if possible from the cache
+        :param path: str
+        :return: QgsRasterLayer or None, if the source can not be opened
+        """
+        lyr = self.mLayers.pop(path, None)
+        if lyr is None:
+            lyr = QgsRasterLayer(path, os.path.basename(path), 'gdal')
+            if not lyr.isValid():
+                return None
+        self.mLayers[path] = lyr
+        while len(self.mLayers) > self.mMaxSize:
+            self.mLayers.popitem(last=False)
+        return lyr
+
+    def remove(self, path: str):
+        self.mLayers.pop(path, None)
+
+    def clear(self):
+        self.mLayers.clear()
+
+
 class SourceRasterFileNode(TreeNode):
+    """
+    A raster source file. Its child nodes (path, CRS and bands) are created on demand by fetch().
+    """
 
-    def __init__(self, mapLayer: QgsRasterLayer):
+    def __init__(self, source, layerCache: RasterLayerCache = None):
+        """
+        :param source: RasterSourceInfo | QgsRasterLayer
+        :param layerCache: RasterLayerCache to create the QgsRasterLayer from, if requested
+        """
+        mapLayer = None
+        if isinstance(source, QgsRasterLayer):
+            assert source.dataProvider().name() == 'gdal'
+            mapLayer = source
+            source = sourceInfo(mapLayer.source())
+        assert isinstance(source, RasterSourceInfo)
 
-        name = mapLayer.name()
-        if name == '':
-            name = os.path.basename(mapLayer.source())
+        name = os.path.basename(source.path)
+        if isinstance(mapLayer, QgsRasterLayer) and mapLayer.name() != '':
+            name = mapLayer.name()
 
         super().__init__(name=name)
-        assert isinstance(mapLayer, QgsRasterLayer)
-        assert mapLayer.dataProvider().name() == 'gdal'
         self.setIcon(QIcon(":/vrtbuilder/mIconRaster.svg"))
+        self.mInfo: RasterSourceInfo = source
+        self.mPath: str = source.path
+        # a QgsRasterLayer that was given explicitly, other layers are taken from the layer cache
         self.mRasterLayer: QgsRasterLayer = mapLayer
-        self.mPath: str = mapLayer.source()
+        if layerCache is None:
+            layerCache = RasterLayerCache()
+        self.mLayerCache: RasterLayerCache = layerCache
+        self.mFetched: bool = False
+
+        self.srcNode = None
+        self.crsNode = None
+        self.bandNode = None
+
+    def canFetchMore(self) -> bool:
+        return self.mFetched is False
+
+    def hasChildren(self) -> bool:
+        return self.mFetched is False or len(self.mChildren) > 0
+
+    def fetch(self):
+        if self.mFetched:
+            return
+        self.mFetched = True
 
         self.srcNode = TreeNode(name='Path')
-        self.srcNode.setValues(mapLayer.source())
+        self.srcNode.setValues(self.mPath)
 
         self.crsNode = TreeNode(name='CRS')
-
-        crs: QgsCoordinateReferenceSystem = self.mRasterLayer.crs()
+        crs = qgsCrsCache().crs(self.mInfo.wkt)
         authInfo = f'{crs.description()} {crs.authid()}'
-        # self.crsNode.setIcon(QIcon(':/images/themes/default/propertyicons/CRS.svg'))
         self.crsNode.setValues(authInfo)
         self.crsNode.setToolTip(crs.toWkt())
+
         self.bandNode = SourceRasterBandGroupNode(name='Bands')
-        # self.bandNode = TreeNode(name='Bands')
-        inputSourceNodes = []
-        for b in range(self.mRasterLayer.bandCount()):
-            bandName = self.mRasterLayer.bandName(b + 1)
-            inputSource = VRTRasterInputSourceBand(self.mPath, b, bandName=bandName)
-            inputSource.mBandName = bandName
-            inputSource.mNoData = self.mRasterLayer.dataProvider().sourceNoDataValue(b + 1)
-            inputSourceNodes.append(SourceRasterBandNode(inputSource))
-        self.bandNode.appendChildNodes(inputSourceNodes)
+        self.bandNode.appendChildNodes([SourceRasterBandNode(src) for src in self.sourceBands()])
         self.appendChildNodes([self.srcNode, self.crsNode, self.bandNode])
 
-        s = ""
-        s = ""
-
     def source(self) -> str:
         return self.mPath
 
+    def sourceInfo(self) -> RasterSourceInfo:
+        return self.mInfo
+
     def sourceBands(self) -> typing.List[VRTRasterInputSourceBand]:
-        return [n.mSrcBand for n in self.bandNode.mChildren if isinstance(n, SourceRasterBandNode)]
+        """
+        Returns the source bands, without the need to fetch the band nodes or to open the source
+        :return: [list-of-VRTRasterInputSourceBand]
+        """
+        sourceBands = []
+        for b in range(self.mInfo.bandCount()):
+            bandName = f'Band {b + 1}'
+            if self.mInfo.bandNames[b] not in [None, '']:
+                bandName += f': {self.mInfo.bandNames[b]}'
+            inputSource = VRTRasterInputSourceBand(self.mPath, b, bandName=bandName)
+            inputSource.mNoData = self.mInfo.noDataValues[b]
+            sourceBands.append(inputSource)
+        return sourceBands
 
     def rasterLayer(self) -> QgsRasterLayer:
-        return self.mRasterLayer
+        if isinstance(self.mRasterLayer, QgsRasterLayer):
+            return self.mRasterLayer
+        return self.mLayerCache.layer(self.mPath)
+
+
+class SourceRasterLoadingTask(QgsTask):
+    """
+    Reads the properties of raster source files in worker threads and returns them in blocks,
+    which can be added with SourceRasterModel.addSourceInfos. Directories are searched for raster files first.
+    """
+    sigSourcesLoaded = pyqtSignal(list)
+    sigMessage = pyqtSignal(str, bool)
+
+    def __init__(self,
+                 files: typing.List[str],
+                 description: str = 'Load raster sources',
+                 callback=None,
+                 block_size: int = SOURCE_IMPORT_BLOCK_SIZE,
+                 maxWorkers: int = None):
+
+        super().__init__(description=description)
+        self.mFiles = [f.as_posix() if isinstance(f, pathlib.Path) else f for f in files]
+        self.mCallback = callback
+        self.mResultBlockSize = block_size
+        self.mMaxWorkers = maxWorkers
+        self.mNumProcessed = 0
+        self.mNumLoaded = 0
+        self.mDuration = 0.0
+
+    def run(self):
+        t0 = time.time()
+        self.mFiles = expandSources(self.mFiles)
+        n = len(self.mFiles)
+        for i in range(0, n, self.mResultBlockSize):
+            block = self.mFiles[i:i + self.mResultBlockSize]
+            result_block = []
+            for path, info in zip(block, readSourceInfos(block, maxWorkers=self.mMaxWorkers, raiseErrors=False)):
+                if isinstance(info, RasterSourceInfo):
+                    result_block.append(info)
+                else:
+                    self.sigMessage.emit('Unable to open {}'.format(path), True)
+
+            self.mNumProcessed += len(block)
+            self.mNumLoaded += len(result_block)
+            self.mDuration = time.time() - t0
+            if len(result_block) > 0:
+                self.sigSourcesLoaded.emit(result_block)
+            self.setProgress(100 * self.mNumProcessed / n)
+            if self.isCanceled():
+                return False
+        return True
+
+    def throughput(self) -> float:
+        """
+        Returns the number of files processed per second
+        :return: float
+        """
+        return self.mNumProcessed / self.mDuration if self.mDuration > 0 else 0.0
+
+    def finished(self, result):
+
+        if self.mCallback is not None:
+            self.mCallback(result, self)
 
 
 class SourceRasterFilterModel(QSortFilterProxyModel):
@@ -483,25 +629,36 @@ class SourceRasterModel(TreeModel):
     sigSourcesAdded = pyqtSignal()
     sigSourcesRemoved = pyqtSignal()
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, lazy: bool = True):
+        """
+        :param parent: QObject
+        :param lazy: bool, set False to create QgsRasterLayers and band nodes immediately when adding sources.
+                     By default, file nodes are created from the cached source properties, band nodes are fetched
+                     on expand and QgsRasterLayers are created on demand, see RasterLayerCache.
+        """
         super().__init__(parent)
         self.setColumnNames(['File/Band', 'Value/Description'])
+        self.mLazy: bool = lazy
+        self.mLayerCache: RasterLayerCache = RasterLayerCache()
+        # {source path: SourceRasterFileNode}
+        self.mFileNodes: typing.Dict[str, SourceRasterFileNode] = dict()
 
     def __len__(self):
-        return len(self.rasterSources())
+        return len(self.mFileNodes)
 
     def __iter__(self):
         return iter(self.rasterSources())
 
     def __contains__(self, file):
-        return pathlib.Path(file).resolve().as_posix() in self.rasterSources()
+        return pathlib.Path(file).resolve().as_posix() in self.mFileNodes
 
     def rasterSources(self) -> typing.List[str]:
-        return [pathlib.Path(l.source()).as_posix() for l in self.rasterLayers()]
+        return [n.source() for n in self.rootNode() if isinstance(n, SourceRasterFileNode)]
 
     def rasterLayers(self) -> list:
         """
         Returns the list of QgsRasterLayers behind all input sources.
+        Note that this creates a QgsRasterLayer for each source, prefer file2layer() to get single layers.
         :return: [list-of-QgsRasterLayers]
         """
         return [n.rasterLayer() for n in self.rootNode() if isinstance(n, SourceRasterFileNode)]
@@ -511,23 +668,61 @@ class SourceRasterModel(TreeModel):
 
     def addSources(self, rasterSources):
         assert isinstance(rasterSources, list)
-        existingSources = self.rasterSources()
 
-        newLayers = qgsRasterLayers(rasterSources)
-
-        newLayers = [l for l in newLayers if isinstance(l, QgsRasterLayer) and
-                     pathlib.Path(l.source()).as_posix() not in existingSources]
-
-        if len(newLayers) > 0:
-            newNodes = [SourceRasterFileNode(lyr) for lyr in newLayers]
+        paths = []
+        layers = []
+        for source in rasterSources:
+            if isinstance(source, QUrl):
+                source = url2path(source)
+            if isinstance(source, pathlib.Path):
+                source = source.as_posix()
+            if isinstance(source, str) and self.mLazy:
+                paths.append(source)
+            elif source is not None:
+                layers.append(source)
+        paths = expandSources(paths)
+        layers = expandSources(layers)
+
+        infos = [info for info in readSourceInfos(paths, raiseErrors=False) if isinstance(info, RasterSourceInfo)]
+        self.addSourceInfos(infos, layers=layers)
+
+    def addSourceInfos(self, infos: typing.List[RasterSourceInfo], layers: list = None):
+        """
+        Adds raster sources from their properties, e.g. as read by a SourceRasterLoadingTask
+        :param infos: [list-of-RasterSourceInfo]
+        :param layers: optional list of QgsRasterLayers or other sources to be opened as QgsRasterLayer
+        """
+        layers = [] if layers is None else list(layers)
+        newNodes = []
+        for info in infos:
+            assert isinstance(info, RasterSourceInfo)
+            if info.bandCount() > 0:
+                newNodes.append(SourceRasterFileNode(info, layerCache=self.mLayerCache))
+            else:
+                # a container of sub-datasets, e.g. HDF, which needs to be resolved by QGIS
+                layers.append(info.path)
+
+        for lyr in qgsRasterLayers(layers):
+            if isinstance(lyr, QgsRasterLayer) and lyr.dataProvider().name() == 'gdal' and lyr.bandCount() > 0:
+                newNodes.append(SourceRasterFileNode(lyr, layerCache=self.mLayerCache))
+
+        unique = dict()
+        for node in newNodes:
+            key = pathlib.Path(node.source()).as_posix()
+            if key not in self.mFileNodes and key not in unique:
+                unique[key] = node
+        newNodes = list(unique.values())
+
+        if len(newNodes) > 0:
+            if not self.mLazy:
+                for node in newNodes:
+                    node.fetch()
+            self.mFileNodes.update(unique)
             self.rootNode().appendChildNodes(newNodes)
             self.sigSourcesAdded.emit()
 
     def file2node(self, file: str) -> SourceRasterFileNode:
-        for node in self.mRootNode.childNodes():
-            if isinstance(node, SourceRasterFileNode) and node.mPath == file:
-                return node
-        return None
+        return self.mFileNodes.get(pathlib.Path(file).as_posix())
 
     def file2layer(self, file: str) -> QgsRasterLayer:
         node = self.file2node(file)
@@ -539,10 +734,12 @@ class SourceRasterModel(TreeModel):
     def removeFiles(self, listOfFiles):
         assert isinstance(listOfFiles, list)
 
-        toRemove = [n for n in self.rootNode().childNodes() \
-                    if isinstance(n, SourceRasterFileNode) and n.source() in listOfFiles]
+        toRemove = [n for n in (self.file2node(f) for f in listOfFiles) if isinstance(n, SourceRasterFileNode)]
 
         if len(toRemove) > 0:
+            for node in toRemove:
+                self.mFileNodes.pop(pathlib.Path(node.source()).as_posix(), None)
+                self.mLayerCache.remove(node.source())
             self.rootNode().removeChildNodes(toRemove)
             self.sigSourcesRemoved.emit()
 
@@ -717,12 +914,8 @@ class VRTSelectionModel(QItemSelectionModel):
                 ext = lyr.extent()
                 assert isinstance(ext, QgsRectangle)
 
-                trans = QgsCoordinateTransform()
-                trans.setSourceCrs(lyr.crs())
-                trans.setDestinationCrs(crs)
-                ext = trans.transform(ext)
-                assert isinstance(ext, QgsRectangle)
-                if ext.contains(point):
+                ext = qgsCrsCache().transformRectangle(ext, lyr.crs(), crs)
+                if isinstance(ext, QgsRectangle) and ext.contains(point):
                     newSelection.append(lyr)
 
             oldSelection = self.selectedSourceLayers()
@@ -986,41 +1179,31 @@ class VRTRasterTreeModel(TreeModel):
         else:
             raise NotImplementedError('Unknown DropMode: "{}"'.format(self.mDropMode))
 
-        # ensure that we start with a VRTRasterBandNode
-        parentNode = self.idx2node(parentIndex)
-        if isinstance(parentNode, VRTRasterInputSourceBandNode):
-            parentNode = parentNode.parentNode()
-        elif isinstance(parentNode, VRTRasterNode):
-            # 1. set the last VirtualBand as first input node
-            vBand = VRTRasterBand()
-            self.mVRTRaster.addVirtualBand(vBand)
-            parentNode = self.mRootNode.findChildNodes(VRTRasterBandNode, recursive=False)[-1]
-
-        assert isinstance(parentNode, VRTRasterBandNode)
-
-        # this is the first virtual band to insert sources in
-        vBand = parentNode.mVirtualBand
-        assert isinstance(vBand, VRTRasterBand)
         if row < 0:
             row = 0
 
-        # add the source bands to the VRT
-        for bands in sourceBands:
-            iSrc = row
-            for src in bands:
-                assert isinstance(src, VRTRasterInputSourceBand)
-                if len(vBand) == 0 and re.search(r'Band \d+$', vBand.name(), re.I):
-                    vBand.setName(src.name())
-                vBand.insertSource(iSrc, src)
-                iSrc += 1
+        # add all source bands to the VRT at once, so that the tree gets one insert per band range
+        with self.mVRTRaster.blockUpdates():
+            # ensure that we start with a VRTRasterBand
+            parentNode = self.idx2node(parentIndex)
+            if isinstance(parentNode, VRTRasterInputSourceBandNode):
+                parentNode = parentNode.parentNode()
+            if isinstance(parentNode, VRTRasterBandNode):
+                vBand = parentNode.mVirtualBand
+            else:
+                # 1. set the last VirtualBand as first input node
+                vBand = self.mVRTRaster.addVirtualBand(VRTRasterBand())
 
-            if bands != sourceBands[-1]:
-                # add a new virtual band if the recent vBand is the last one
-                if vBand == self.mVRTRaster.mBands[-1]:
-                    self.mVRTRaster.addVirtualBand(VRTRasterBand())
+            # this is the first virtual band to insert sources in
+            assert isinstance(vBand, VRTRasterBand)
+            bandIndex = vBand.bandIndex()
+            usedBands = set(id(b) for b in self.mVRTRaster if len(b) > 0)
+            vBands = self.mVRTRaster.insertSources(bandIndex, sourceBands, sourceIndex=row)
 
-                # go to next virtual band
-                vBand = self.mVRTRaster.mBands[self.mVRTRaster.mBands.index(vBand) + 1]
+            # name formerly empty virtual bands by their first source band
+            for vBand, bands in zip(vBands, sourceBands):
+                if id(vBand) not in usedBands and len(bands) > 0 and re.search(r'Band \d+$', vBand.name(), re.I):
+                    vBand.setName(bands[0].name())
 
         return True
 
@@ -1119,11 +1302,20 @@ class VRTBuilderWidget(QMainWindow):
 
         self.progressBar = QProgressBar()
         self.sBar.addPermanentWidget(self.progressBar, QgsStatusBar.AnchorLeft)
+        self.btnCancelSourceImport = QToolButton()
+        self.btnCancelSourceImport.setText('Cancel')
+        self.btnCancelSourceImport.setToolTip('Stop loading source files')
+        self.btnCancelSourceImport.clicked.connect(self.cancelSourceImport)
+        self.btnCancelSourceImport.setVisible(False)
+        self.sBar.addPermanentWidget(self.btnCancelSourceImport, QgsStatusBar.AnchorLeft)
+        # {id(task): SourceRasterLoadingTask} of running source imports
+        self.mSourceImportTasks: typing.Dict[int, SourceRasterLoadingTask] = dict()
         self.sBar.addPermanentWidget(self.buttonBox)
         self.previewMap: QgsMapCanvas
         assert isinstance(self.previewMap, QgsMapCanvas)
 
         self.mSourceFileModel = SourceRasterModel(parent=self.treeViewSourceFiles)
+        self.mPreviewLayers: typing.List[QgsRasterLayer] = []
         self.mSourceFileModel.sigSourcesRemoved.connect(self.buildButtonMenus)
         self.mSourceFileModel.sigSourcesAdded.connect(self.buildButtonMenus)
         self.mSourceFileModel.rowsInserted.connect(self.onRowsInsertedTEST)
@@ -1166,9 +1358,9 @@ class VRTBuilderWidget(QMainWindow):
         self.mVRTRaster.sigCrsChanged.connect(self.updateSummary)
         # self.mVRTRaster.sigSourceBandInserted.connect(self.onVRTSourceBandAdded)
 
-        self.mVRTRaster.sigSourceBandInserted.connect(self.onSourceFilesChanged)
+        self.mVRTRaster.sigSourceBandsInserted.connect(self.onSourceFilesChanged)
         self.mVRTRaster.sigSourceBandRemoved.connect(self.onSourceFilesChanged)
-        self.mVRTRaster.sigBandInserted.connect(self.updateSummary)
+        self.mVRTRaster.sigBandsInserted.connect(self.updateSummary)
         self.mVRTRaster.sigBandRemoved.connect(self.updateSummary)
         self.mVRTRaster.sigBandRemoved.connect(self.validateInputs)
         self.mVRTRaster.sigExtentChanged.connect(self.updateSummary)
@@ -1480,8 +1672,10 @@ class VRTBuilderWidget(QMainWindow):
         assert isinstance(spatialExtent, SpatialExtent), 'Got {} instead SpatialExtent'.format(str(spatialExtent))
         if not isinstance(self.mVRTRaster.crs(), QgsCoordinateReferenceSystem):
             self.mVRTRaster.setCrs(spatialExtent.crs())
-        spatialExtent = spatialExtent.toCrs(self.mVRTRaster.crs())
-        self.mVRTRaster.setExtent(spatialExtent)
+        crs = self.mVRTRaster.crs()
+        extent = qgsCrsCache().transformRectangle(spatialExtent, spatialExtent.crs(), crs)
+        if isinstance(extent, QgsRectangle):
+            self.mVRTRaster.setExtent(SpatialExtent(crs, extent))
 
         self.validateInputs()
 
@@ -1657,7 +1851,7 @@ class VRTBuilderWidget(QMainWindow):
 
     def validateInputs(self, *args):
 
-        isValid = len(self.mVRTRaster.sourceRaster()) > 0
+        isValid = self.mVRTRaster.sourceCount() > 0
         if not self.cbBoundsFromSourceFiles.isEnabled():
             for tb in [self.tbBoundsXMin, self.tbBoundsXMax, self.tbBoundsYMin, self.tbBoundsYMax]:
                 state, _, _ = tb.validator().validate(tb.text(), 0)
@@ -1691,6 +1885,7 @@ class VRTBuilderWidget(QMainWindow):
         _settings.setValue('PATH_SAVE', self.mQgsFileWidget.filePath())
 
         _settings.setValue('AUTOMATIC_BOUNDS', self.cbBoundsFromSourceFiles.isChecked())
+        _settings.setValue('CLOUD_OPTIMIZED', self.cbCloudOptimized.isChecked())
 
     def restoreLastSettings(self):
 
@@ -1699,21 +1894,21 @@ class VRTBuilderWidget(QMainWindow):
         from os.path import expanduser
         self.mQgsFileWidget.setFilePath(_settings.value('PATH_SAVE', os.path.join(expanduser('~'), 'output.vrt')))
         self.cbBoundsFromSourceFiles.setChecked(bool(_settings.value('AUTOMATIC_BOUNDS', True)))
+        self.cbCloudOptimized.setChecked(_settings.value('CLOUD_OPTIMIZED', False, type=bool))
 
     def resetMap(self, *args):
 
         lyrs = []
 
-        LUT = dict()
-        for layer in self.mSourceFileModel.rasterLayers():
-            LUT[layer.source()] = layer
-
-        for file in self.mVRTRaster.sourceRaster():
-            if file in LUT.keys():
-                lyr = LUT[file]
-                if lyr not in lyrs:
+        # show only sources that intersect the VRT extent
+        for file in self.mVRTRaster.sourceRaster(extent=self.mVRTRaster.extent()):
+            if file in self.mSourceFileModel:
+                lyr = self.mSourceFileModel.file2layer(file)
+                if isinstance(lyr, QgsRasterLayer) and lyr not in lyrs:
                     lyrs.append(lyr)
 
+        # keep the preview layers alive, even if the layer cache releases them
+        self.mPreviewLayers = lyrs
         if lyrs != self.previewMap.layers():
             self.previewMap.setLayers(lyrs)
 
@@ -1754,8 +1949,11 @@ class VRTBuilderWidget(QMainWindow):
         for idx in indices:
             treeView.setExpanded(idx, expand)
 
-    def _saveFileCallback(self, percent, x, path):
-        self.progressBar.setValue(int(percent * 100))
+    def _saveFileCallback(self, progress: MaterializeProgress):
+        self.progressBar.setValue(int(progress.fraction() * 100))
+        self.sBar.showMessage('Save {}: {}'.format(progress.path, progress.summary()))
+        # repaint the progress, but do not handle user input while saving
+        QApplication.processEvents(QEventLoop.ExcludeUserInputEvents)
 
     def outputPath(self) -> str:
 
@@ -1784,18 +1982,16 @@ class VRTBuilderWidget(QMainWindow):
             if ext in LUT_FILEXTENSIONS.keys():
                 drv = LUT_FILEXTENSIONS[ext]
             else:
-                drv = gdal.GetDriverByName('VRT')
-
-            co = []
-            if drv == 'ENVI':
-                if ext in ['.bsq', '.bip', '.bil']:
-                    co.append('INTERLEAVE={}'.format(ext[1:].upper()))
-
-            options = gdal.TranslateOptions(format=str(drv), creationOptions=co,
-                                            callback=self._saveFileCallback, callback_data=path)
+                drv = 'VRT'
+            if drv == 'GTiff' and self.cbCloudOptimized.isChecked():
+                drv = 'COG'
 
             self.sBar.showMessage('Save {}...'.format(path), 2000)
-            dsDst = gdal.Translate(path, pathVrt, options=options)
+            try:
+                result = materialize(pathVrt, path, format=drv, progress=self._saveFileCallback)
+                dsDst = gdal.Open(path) if not result.canceled else None
+            except Exception as ex:
+                print(ex, file=sys.stderr)
             self.fullProgress()
 
         else:
@@ -1840,18 +2036,74 @@ class VRTBuilderWidget(QMainWindow):
 
         self.addSourceFiles([file])
 
-    def addSourceFiles(self, files):
+    def addSourceFiles(self, files, background: bool = None) -> typing.Optional[SourceRasterLoadingTask]:
         """
         Adds a list of source files to the source file list.
-        :param files: list-of-file-paths
+        :param files: list-of-file-paths, directories are searched for raster files
+        :param background: set True to read the source files in a SourceRasterLoadingTask, which adds them
+                           block-wise to the source file list. Defaults to True for large numbers of files
+                           (see SOURCE_IMPORT_TASK_THRESHOLD) and directories.
+        :return: the SourceRasterLoadingTask, if started
         """
-        self.mSourceFileModel.addSources(files)
+        paths = [f.as_posix() if isinstance(f, pathlib.Path) else f for f in files]
+        if background is None:
+            background = len(paths) >= SOURCE_IMPORT_TASK_THRESHOLD or \
+                         any(isinstance(p, str) and os.path.isdir(p) for p in paths)
+        others = [f for f in paths if not isinstance(f, str)]
+        paths = [f for f in paths if isinstance(f, str)]
+        if not background or not self.mSourceFileModel.mLazy:
+            self.mSourceFileModel.addSources(paths + others)
+            return None
+        if len(others) > 0:
+            self.mSourceFileModel.addSources(others)
+
+        task = SourceRasterLoadingTask(paths, callback=self.onSourceImportFinished)
+        # connect bound methods only, so that signals of the task thread are queued into the GUI thread
+        task.sigSourcesLoaded.connect(self.onSourcesLoaded)
+        task.sigMessage.connect(self.onSourceImportMessage)
+        task.progressChanged.connect(self.onSourceImportProgress)
+        self.mSourceImportTasks[id(task)] = task
+        self.btnCancelSourceImport.setVisible(True)
+        self.sBar.showMessage('Load {} source files...'.format(len(paths)))
+        QgsApplication.taskManager().addTask(task)
+        return task
+
+    def cancelSourceImport(self):
+        """
+        Cancels running SourceRasterLoadingTasks. Sources that have already been read are kept.
+        """
+        for task in list(self.mSourceImportTasks.values()):
+            task.cancel()
+
+    def onSourcesLoaded(self, infos: list):
+        self.mSourceFileModel.addSourceInfos(infos)
+        processed = sum(t.mNumProcessed for t in self.mSourceImportTasks.values())
+        total = sum(len(t.mFiles) for t in self.mSourceImportTasks.values())
+        throughput = sum(t.throughput() for t in self.mSourceImportTasks.values())
+        self.sBar.showMessage('Loaded {}/{} source files ({:0.1f} files/s)'.format(processed, total, throughput))
+
+    def onSourceImportMessage(self, msg: str, is_error: bool):
+        if is_error:
+            print(msg, file=sys.stderr)
+
+    def onSourceImportProgress(self, progress: float):
+        self.progressBar.setValue(int(progress))
+
+    def onSourceImportFinished(self, result: bool, task: SourceRasterLoadingTask):
+        self.mSourceImportTasks.pop(id(task), None)
+        if len(self.mSourceImportTasks) > 0:
+            return
+        self.btnCancelSourceImport.setVisible(False)
+        self.progressBar.setValue(0)
+        status = 'Loaded' if result else 'Canceled after'
+        self.sBar.showMessage('{} {} source files in {:0.1f}s ({:0.1f} files/s)'.format(
+            status, task.mNumProcessed, task.mDuration, task.throughput()), 5000)
 
     def updateSummary(self):
         """
         Updates (almost) all information visible to the user
         """
-        self.tbSourceFileCount.setText('{}'.format(len(self.mVRTRaster.sourceRaster())))
+        self.tbSourceFileCount.setText('{}'.format(self.mVRTRaster.sourceCount()))
         self.tbVRTBandCount.setText('{}'.format(len(self.mVRTRaster)))
         assert isinstance(self.previewMap, VRTRasterPreviewMapCanvas)
         crs = self.mVRTRaster.crs()